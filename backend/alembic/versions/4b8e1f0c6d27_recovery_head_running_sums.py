@@ -0,0 +1,40 @@
+"""recovery head running sums + raw prediction scores
+
+Revision ID: 4b8e1f0c6d27
+Revises: 7c2d9b41e8a3
+Create Date: 2026-10-19 14:03:51.527310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b8e1f0c6d27'
+down_revision: Union[str, Sequence[str], None] = '7c2d9b41e8a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+HEAD_SUMS = ('n', 'sum_r', 'sum_rr', 'sum_e', 'sum_re')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for col in HEAD_SUMS:
+        op.add_column('user_recovery_heads', sa.Column(col, sa.Float(), nullable=False, server_default='0'))
+    op.add_column('user_recovery_heads', sa.Column('fitted_through', sa.Date(), nullable=True))
+    op.add_column('recovery_predictions', sa.Column('raw_score', sa.Float(), nullable=True))
+    op.add_column('recovery_predictions', sa.Column('calib_raw', sa.Float(), nullable=True))
+    op.add_column('recovery_predictions', sa.Column('calib_rating', sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('recovery_predictions', 'calib_rating')
+    op.drop_column('recovery_predictions', 'calib_raw')
+    op.drop_column('recovery_predictions', 'raw_score')
+    op.drop_column('user_recovery_heads', 'fitted_through')
+    for col in reversed(HEAD_SUMS):
+        op.drop_column('user_recovery_heads', col)
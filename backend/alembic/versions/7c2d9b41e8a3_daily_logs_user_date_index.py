@@ -0,0 +1,28 @@
+"""daily_logs (user_id, date) index
+
+Revision ID: 7c2d9b41e8a3
+Revises: 1e4f3a95cf1a
+Create Date: 2026-10-19 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c2d9b41e8a3'
+down_revision: Union[str, Sequence[str], None] = '1e4f3a95cf1a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('idx_daily_logs_user_date', 'daily_logs', ['user_id', 'date'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_daily_logs_user_date', table_name='daily_logs')
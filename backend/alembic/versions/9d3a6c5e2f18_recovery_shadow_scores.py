@@ -0,0 +1,39 @@
+"""recovery_shadow_scores: paired active / candidate scores
+
+Revision ID: 9d3a6c5e2f18
+Revises: 4b8e1f0c6d27
+Create Date: 2026-10-19 18:12:07.402113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d3a6c5e2f18'
+down_revision: Union[str, Sequence[str], None] = '4b8e1f0c6d27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'recovery_shadow_scores',
+        sa.Column('user_id', sa.String(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('date', sa.Date(), primary_key=True),
+        sa.Column('active_version', sa.String(), primary_key=True),
+        sa.Column('candidate_version', sa.String(), primary_key=True),
+        sa.Column('mode', sa.String(), nullable=False),
+        sa.Column('served', sa.String(), nullable=False),
+        sa.Column('active_raw', sa.Float(), nullable=False),
+        sa.Column('candidate_raw', sa.Float(), nullable=False),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('recovery_shadow_scores')
@@ -0,0 +1,44 @@
+"""recovery heads keyed by model version
+
+Revision ID: b6e2d8f4a1c3
+Revises: 9d3a6c5e2f18
+Create Date: 2026-10-19 21:40:12.118604
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6e2d8f4a1c3'
+down_revision: Union[str, Sequence[str], None] = '9d3a6c5e2f18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # existing heads predate versioning: model_version '' (see app/utils/heads.py)
+    op.add_column('user_recovery_heads',
+                  sa.Column('model_version', sa.String(), nullable=False, server_default=''))
+    op.drop_constraint('user_recovery_heads_pkey', 'user_recovery_heads', type_='primary')
+    op.create_primary_key('user_recovery_heads_pkey', 'user_recovery_heads', ['user_id', 'model_version'])
+    op.add_column('recovery_predictions', sa.Column('model_version', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('recovery_predictions', 'model_version')
+    # keep one head per user: the legacy row, else the most recently updated one
+    op.execute("""
+        DELETE FROM user_recovery_heads h
+        USING user_recovery_heads k
+        WHERE h.user_id = k.user_id AND h.model_version <> k.model_version
+          AND (k.model_version = '' OR (h.model_version <> '' AND
+               (k.updated_at, k.model_version) > (h.updated_at, h.model_version)))
+    """)
+    op.drop_constraint('user_recovery_heads_pkey', 'user_recovery_heads', type_='primary')
+    op.drop_column('user_recovery_heads', 'model_version')
+    op.create_primary_key('user_recovery_heads_pkey', 'user_recovery_heads', ['user_id'])
@@ -8,7 +8,7 @@ from app.routers import user, auth, daily_log, splits, rules_templates, recovery
 from app.database import engine, SessionLocal
 from app.routers.analytics import router as analytics_router
 from app.routers import user_meta
-from app.routers import digests, ping
+from app.routers import digests, ping, export
 from datetime import datetime
 from starlette.middleware.cors import CORSMiddleware
 from fastapi.middleware.cors import CORSMiddleware
@@ -26,6 +26,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 Base.metadata.create_all(bind=engine)
@@ -159,4 +160,5 @@ app.include_router(analytics_router)
 app.include_router(recovery.router)
 app.include_router(user_meta.router)
 app.include_router(digests.router)
+app.include_router(export.router)
 app.include_router(ping.router, prefix="")
\ No newline at end of file
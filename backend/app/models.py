@@ -106,6 +106,10 @@ class DailyLog(Base):
     )
     split_template = relationship("SplitTemplate")
 
+    __table_args__ = (
+        Index("idx_daily_logs_user_date", "user_id", "date"),
+    )
+
 
 class RuleTemplate(Base):
     __tablename__  = "rule_templates"
@@ -128,8 +132,17 @@ class UserRecoveryHead(Base):
     __tablename__ = "user_recovery_heads"
 
     user_id   = Column(String, ForeignKey("users.id"), primary_key=True)
+    # model version whose raw scores the head is fitted on; '' = from before versioning
+    model_version = Column(String, primary_key=True, default="", server_default="")
     bias      = Column(Float,  nullable=False)      # scalar offset ˆε̄
     slope     = Column(Float,  nullable=False, default=1.0)  # optional multiplicative term
+    # running sums the (slope, bias) fit is solved from — see app/utils/heads.py
+    n         = Column(Float,  nullable=False, default=0.0, server_default="0")
+    sum_r     = Column(Float,  nullable=False, default=0.0, server_default="0")
+    sum_rr    = Column(Float,  nullable=False, default=0.0, server_default="0")
+    sum_e     = Column(Float,  nullable=False, default=0.0, server_default="0")
+    sum_re    = Column(Float,  nullable=False, default=0.0, server_default="0")
+    fitted_through = Column(Date, nullable=True)    # last day the nightly fit covered
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 # app/models.py
@@ -142,6 +155,11 @@ class RecoveryPrediction(Base):
     )
     date  = Column(Date, primary_key=True)
     score = Column(Float, nullable=False)
+    raw_score = Column(Float, nullable=True)       # global model, before the user head
+    model_version = Column(String, nullable=True)  # the model raw_score came from
+    # (raw, rating) pair currently folded into the user's head, if any
+    calib_raw    = Column(Float, nullable=True)
+    calib_rating = Column(Float, nullable=True)
     created_at = Column(
         TIMESTAMP(timezone=True),
         server_default=func.now(),
@@ -149,4 +167,22 @@ class RecoveryPrediction(Base):
     )
     __table_args__ = (
         Index("idx_recovery_predictions_user_date", "user_id", "date"),
+    )
+
+
+class RecoveryShadowScore(Base):
+    """Active vs. candidate raw scores for one scored day (see app/utils/candidate.py)."""
+    __tablename__ = "recovery_shadow_scores"
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    date = Column(Date, primary_key=True)
+    active_version = Column(String, primary_key=True)
+    candidate_version = Column(String, primary_key=True)
+    mode = Column(String, nullable=False)          # "shadow" | "ab"
+    served = Column(String, nullable=False)        # which model's score the user got
+    active_raw = Column(Float, nullable=False)
+    candidate_raw = Column(Float, nullable=False)
+    created_at = Column(
+        TIMESTAMP(timezone=True),
+        server_default=func.now(),
+        nullable=False,
     )
\ No newline at end of file
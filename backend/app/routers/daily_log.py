@@ -4,15 +4,21 @@ from io import BytesIO
 import pandas as pd
 from sqlalchemy.orm import Session
 from datetime import date, datetime, timedelta
-from typing import List
+from typing import List, Literal, Optional
+import base64
 from app.database import SessionLocal
-from app.models import DailyLog, SplitSession, SplitTemplate
+from app.models import DailyLog, RecoveryPrediction, SplitSession, SplitTemplate
 from app.schemas import DailyLogCreate, DailyLogOut
 from app.routers.auth import get_current_user
 from app.routers.recovery import predict as predict_recovery_score
+from app.utils import heads
+from app.utils.context import preprocessor
+from app.utils.features import ROLL_FEATS, ROLL_WINDOW, affected_features
 from fastapi import Request
+from fastapi.encoders import jsonable_encoder
 import json
 import logging
+import threading
 logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=["daily-log"])
@@ -94,30 +100,105 @@ def upsert_daily_log(
           .filter_by(user_id=current_user.id, date=payload.date)
           .first()
     )
+    is_new = obj is None
     if obj:
+        changed = {k for k, v in data.items() if getattr(obj, k) != v}
         for k, v in data.items():
             setattr(obj, k, v)
     else:
+        changed = set(data)
         obj = DailyLog(user_id=current_user.id, **data)
         db.add(obj)
     db.commit()
     db.refresh(obj)
 
+    # only re-score when a model input moved; rolling means carry the edit
+    # (or a newly inserted day) into the next ROLL_WINDOW - 1 logged days
+    touched = affected_features(changed, preprocessor.feature_names_in_)
+    days = [obj.date] if touched else []
+    if is_new or touched & set(ROLL_FEATS):
+        days += _following_scored_days(db, current_user.id, obj.date)
+    days = _claim(current_user.id, days)
+    rating_logged = "recovery_rating" in changed
+
+    if days or rating_logged:
+        background_tasks.add_task(
+          _predict_and_calibrate,
+          db,
+          current_user,
+          days,
+          obj.date,
+          rating_logged,
+          obj.recovery_rating,
+        )
+
+    return obj
+
+
+# (user, day) re-scores queued but not started; a second edit before the
+# task runs rides on the queued one instead of scheduling another
+_queued = set()
+_queued_lock = threading.Lock()
+
+
+def _claim(user_id: str, days: List[date]) -> List[date]:
+    with _queued_lock:
+        fresh = [d for d in dict.fromkeys(days) if (user_id, d) not in _queued]
+        _queued.update((user_id, d) for d in fresh)
+    return fresh
+
+
+def _following_scored_days(db: Session, user_id: str, day: date) -> List[date]:
+    """The next ROLL_WINDOW - 1 logged days after `day` that already have a prediction."""
+    nxt = (
+        db.query(DailyLog.date)
+          .filter(DailyLog.user_id == user_id, DailyLog.date > day)
+          .order_by(DailyLog.date.asc())
+          .limit(ROLL_WINDOW - 1)
+          .subquery()
+    )
+    rows = (
+        db.query(RecoveryPrediction.date)
+          .join(nxt, nxt.c.date == RecoveryPrediction.date)
+          .filter(RecoveryPrediction.user_id == user_id)
+          .order_by(RecoveryPrediction.date)
+          .all()
+    )
+    return [r.date for r in rows]
+
+
+def _predict_request(user, day: date) -> Request:
     fake_req = Request(scope={"type": "http"})
     fake_req._body = json.dumps({
-      "user_id": str(current_user.id),
-      "date":    str(obj.date),
+      "user_id": str(user.id),
+      "date":    str(day),
     }).encode()
+    return fake_req
 
-    background_tasks.add_task(
-      predict_recovery_score,
-      fake_req,
-      False,      # debug=False
-      db,
-      current_user
-    )
 
-    return obj
+async def _predict_and_calibrate(db, user, days, rating_day, rating_logged, rating):
+    """Re-score `days` (oldest first), then fold a newly logged rating into the user's head."""
+    pending = sorted(days)
+    try:
+        while pending:
+            day = pending.pop(0)
+            with _queued_lock:
+                _queued.discard((user.id, day))
+            try:
+                await predict_recovery_score(_predict_request(user, day), False, db, user)
+            except HTTPException as e:
+                logger.info("re-score of %s for %s skipped: %s", day, user.id, e.detail)
+            except Exception:
+                logger.exception("re-score of %s for %s failed", day, user.id)
+                db.rollback()
+    finally:
+        # days never reached must not stay claimed, or _claim() skips them for good
+        with _queued_lock:
+            _queued.difference_update((user.id, d) for d in pending)
+    update = heads.observe_rating(db, user.id, rating_day, rating) if rating_logged else None
+    if update:
+        db.commit()
+        heads.cache.put(user.id, *update)
 
 @router.get("/daily-log", response_model=DailyLogOut)
 def get_daily_log(
@@ -163,6 +244,80 @@ def get_history(
     logger.info(f"[GET /daily-log/history] → found {len(logs)} logs: {found_dates}")
     return logs
 
+# columns a client may project from /daily-log/history/page
+HISTORY_FIELDS = [f for f in DailyLogOut.model_fields if f != "user_id"]
+HISTORY_MAX_LIMIT = 1000
+# stored as Integer but typed bool on DailyLogOut; the paged responses match it
+HISTORY_BOOL_FIELDS = {"trained"}
+
+def _history_column(col: str, values: list) -> list:
+    if col in HISTORY_BOOL_FIELDS:
+        return [None if v is None else bool(v) for v in values]
+    return values
+
+def _encode_cursor(d: date) -> str:
+    return base64.urlsafe_b64encode(d.isoformat().encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> date:
+    try:
+        pad = "=" * (-len(cursor) % 4)
+        return date.fromisoformat(base64.urlsafe_b64decode(cursor + pad).decode())
+    except Exception:
+        raise HTTPException(400, "Invalid cursor")
+
+@router.get("/daily-log/history/page")
+def get_history_page(
+    start: Optional[date] = Query(None, description="YYYY-MM-DD (inclusive, default: first log)"),
+    end:   Optional[date] = Query(None, description="YYYY-MM-DD (inclusive, default: last log)"),
+    cursor: Optional[str] = Query(None, description="`next_cursor` from the previous page"),
+    limit: int = Query(366, ge=1, le=HISTORY_MAX_LIMIT),
+    fields: Optional[str] = Query(None, description="Comma-separated columns, e.g. date,sleep_quality,hrv"),
+    format: Literal["rows", "columnar"] = Query("rows", description="`columnar` returns {column: [values]}"),
+    current_user=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Keyset-paginated daily-log history over any range, ordered by date.
+
+    Pages are `limit` rows long; pass `next_cursor` back as `cursor` until it
+    is null.  `fields` projects only the columns a chart needs (`date` is
+    always included) and `format=columnar` sends one array per column instead
+    of one object per row.
+    """
+    if fields:
+        cols = [c.strip() for c in fields.split(",") if c.strip()]
+        unknown = [c for c in cols if c not in HISTORY_FIELDS]
+        if unknown:
+            raise HTTPException(400, f"Unknown field(s): {', '.join(unknown)}")
+        if "date" not in cols:
+            cols.insert(0, "date")
+    else:
+        cols = HISTORY_FIELDS
+
+    q = (
+        db.query(*[getattr(DailyLog, c) for c in cols])
+          .filter(DailyLog.user_id == current_user.id)
+    )
+    if start:
+        q = q.filter(DailyLog.date >= start)
+    if end:
+        q = q.filter(DailyLog.date <= end)
+    if cursor:
+        q = q.filter(DailyLog.date > _decode_cursor(cursor))
+
+    # one extra row tells us whether there is another page
+    rows = q.order_by(DailyLog.date.asc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = _encode_cursor(rows[-1].date) if has_more else None
+
+    data = {c: _history_column(c, [getattr(r, c) for r in rows]) for c in cols}
+    if format == "columnar":
+        return jsonable_encoder({"columns": data, "count": len(rows), "next_cursor": next_cursor})
+
+    items = [dict(zip(cols, r)) for r in zip(*data.values())]
+    return jsonable_encoder({"items": items, "count": len(rows), "next_cursor": next_cursor})
+
 @router.post("/daily-log/bulk-import", status_code=201)
 async def bulk_import_logs(
     file: UploadFile = File(...),
@@ -286,6 +441,10 @@ async def bulk_import_logs(
                         db=db,
                         me=current_user
                     )
+                    update = heads.observe_rating(db, current_user.id, date_value, log_data["recovery_rating"])
+                    if update:
+                        db.commit()
+                        heads.cache.put(current_user.id, *update)
                 except Exception as rec_e:
                     # log and keep going
                     print(f"⚠️ Recovery prediction failed on row {idx}: {rec_e}")
@@ -0,0 +1,196 @@
+# app/routers/export.py
+import csv
+import io
+import json
+import zlib
+from datetime import date
+from typing import Callable, Dict, Iterator, List, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from app.database import SessionLocal
+from app.models import DailyLog, RecoveryPrediction, DailyDigest, User
+from app.routers.auth import get_current_user
+from app.routers.daily_log import FRIENDLY_HDRS
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+CHUNK_ROWS = 1000
+
+# ── per-dataset column specs ─────────────────────────────────────────────────
+# logs use the same friendly headers as the import template so an export can
+# be fed straight back into /daily-log/bulk-import.
+
+def _log_row(r) -> Dict:
+    out = {}
+    for header, col in FRIENDLY_HDRS.items():
+        v = r[col]
+        if col == "trained":
+            v = "Y" if v else "N"
+        elif col == "macros":
+            v = json.dumps(v) if v else None
+        elif col == "soreness":
+            # the importer reads a JSON list and keeps the first element
+            v = json.dumps([v]) if v is not None else None
+        elif col == "date":
+            v = v.isoformat()
+        out[header] = v
+    return out
+
+DATASETS = {
+    "logs": {
+        "model": DailyLog,
+        "columns": list(dict.fromkeys(FRIENDLY_HDRS.values())),
+        "headers": list(FRIENDLY_HDRS),
+        "row": _log_row,
+    },
+    "predictions": {
+        "model": RecoveryPrediction,
+        "columns": ["date", "score", "created_at"],
+        "headers": ["date", "score", "created_at"],
+        "row": lambda r: {
+            "date": r["date"].isoformat(),
+            "score": r["score"],
+            "created_at": r["created_at"].isoformat() if r["created_at"] else None,
+        },
+    },
+    "digests": {
+        "model": DailyDigest,
+        "columns": ["date", "alerts", "micro_tips"],
+        "headers": ["date", "alerts", "micro_tips"],
+        "row": lambda r: {
+            "date": r["date"].isoformat(),
+            "alerts": json.dumps(r["alerts"]),
+            "micro_tips": json.dumps(r["micro_tips"]),
+        },
+    },
+}
+
+MEDIA = {
+    "csv":     ("text/csv", "csv"),
+    "jsonl":   ("application/x-ndjson", "jsonl"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def _stream_rows(spec: dict, user_id: str, start: Optional[date], end: Optional[date]) -> Iterator[List[Dict]]:
+    """
+    Yield chunks of formatted rows from a server-side cursor.
+
+    Opens its own session: the request-scoped one may already be closed
+    while the response body is still being streamed.
+    """
+    model = spec["model"]
+    stmt = (
+        select(*[getattr(model, c) for c in spec["columns"]])
+        .where(model.user_id == user_id)
+        .order_by(model.date.asc())
+    )
+    if start:
+        stmt = stmt.where(model.date >= start)
+    if end:
+        stmt = stmt.where(model.date <= end)
+
+    db = SessionLocal()
+    try:
+        result = db.execute(stmt.execution_options(stream_results=True, yield_per=CHUNK_ROWS))
+        for part in result.mappings().partitions():
+            yield [spec["row"](r) for r in part]
+    finally:
+        db.close()
+
+
+def _encode_csv(headers: List[str], chunks: Iterator[List[Dict]]) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=headers)
+    writer.writeheader()
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buf.getvalue().encode()
+        buf.seek(0); buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode()
+
+
+def _encode_jsonl(headers: List[str], chunks: Iterator[List[Dict]]) -> Iterator[bytes]:
+    for rows in chunks:
+        yield "".join(json.dumps(r, default=str) + "\n" for r in rows).encode()
+
+
+def _encode_parquet(headers: List[str], chunks: Iterator[List[Dict]]) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = io.BytesIO()
+    schema = pa.schema([(h, pa.string()) for h in headers])
+    writer = pq.ParquetWriter(sink, schema)
+
+    def drain() -> bytes:
+        data = sink.getvalue()
+        sink.seek(0); sink.truncate()
+        return data
+
+    try:
+        for rows in chunks:
+            # one row group per chunk, values as strings so the schema is stable
+            cols = {h: [None if r[h] is None else str(r[h]) for r in rows] for h in headers}
+            writer.write_table(pa.table(cols, schema=schema))
+            yield drain()
+    finally:
+        writer.close()
+    yield drain()
+
+
+ENCODERS: Dict[str, Callable] = {
+    "csv": _encode_csv,
+    "jsonl": _encode_jsonl,
+    "parquet": _encode_parquet,
+}
+
+
+def _gzip(stream: Iterator[bytes]) -> Iterator[bytes]:
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)   # wbits=31 → gzip container
+    for block in stream:
+        out = z.compress(block)
+        if out:
+            yield out
+    yield z.flush()
+
+
+@router.get("/{dataset}", summary="Stream the user's full history as CSV / JSONL / Parquet")
+def export_history(
+    dataset: Literal["logs", "predictions", "digests"],
+    format: Literal["csv", "jsonl", "parquet"] = Query("csv"),
+    gzip: bool = Query(False, description="gzip-compress the stream"),
+    start: Optional[date] = Query(None, description="YYYY-MM-DD (inclusive)"),
+    end: Optional[date] = Query(None, description="YYYY-MM-DD (inclusive)"),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Streams rows straight from a server-side cursor into the encoder, so
+    memory stays flat regardless of history length.  `logs` exports use the
+    import template's headers and round-trip through /daily-log/bulk-import.
+    """
+    if format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(501, "Parquet export needs pyarrow installed on the server")
+
+    spec = DATASETS[dataset]
+    chunks = _stream_rows(spec, current_user.id, start, end)
+    body = ENCODERS[format](spec["headers"], chunks)
+
+    media_type, ext = MEDIA[format]
+    filename = f"recovertrack_{dataset}.{ext}"
+    if gzip:
+        body = _gzip(body)
+        media_type, filename = "application/gzip", filename + ".gz"
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
@@ -6,20 +6,35 @@ import pandas as pd
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy import func
 from sqlalchemy.orm import Session
-from fastapi.responses import JSONResponse
-from app.schemas import RecoveryPredictRequest, RecoveryPredictResponse, RecoveryPredictionOut
+from fastapi.responses import JSONResponse, Response
+from app.schemas import (
+    RecoveryPredictRequest,
+    RecoveryPredictResponse,
+    RecoveryPredictionOut,
+    RecoveryForecastRequest,
+    RecoveryForecastResponse,
+)
 from app.database import get_db
-from app.models import DailyLog
+from app.models import DailyLog, SplitSession, SplitTemplate
 from app.routers.auth import get_current_user
 
 from app.utils.context import (
-    predict_recovery,
     apply_user_head,
-    GLOBAL_MEAN,
     preprocessor,
     ALL_MUSCLES,
-    build_daily_context,
+    ACTIVE,
+    MODEL_VERSION,
+)
+from app.utils.features import (
+    USER_COLUMNS,
+    ROLL_WINDOW,
+    dataset_rows,
+    features_for_day,
+    log_history,
+    model_features,
+    model_input,
 )
+from app.utils import candidate, heads, history_cache, prediction_cache
 from pydantic import ValidationError
 from sqlalchemy.dialects.postgresql import insert
 from app.models import RecoveryPrediction
@@ -35,6 +50,9 @@ supabase: Client = create_client(_url, _key)
 
 router = APIRouter(prefix="/recovery", tags=["recovery"])
 
+EPS = 0.10               # share of the personal head in the served score
+FORECAST_MAX_DAYS = 14
+
 def resolve_template_info(db: Session, tpl_id: str, session_name: str):
     """
     Returns (split_type:str, muscle_groups:list[str])
@@ -57,6 +75,16 @@ def resolve_template_info(db: Session, tpl_id: str, session_name: str):
     return tpl.type, muscles
 
 
+def _cached_raw(model, X: pd.DataFrame):
+    """(cache key, raw score) of `model` on X, from prediction_cache when seen before."""
+    pkey = prediction_cache.key(model.version, X)
+    raw = prediction_cache.get(pkey)
+    if raw is None:
+        raw = model.predict(X)
+        prediction_cache.put(pkey, raw)
+    return pkey, raw
+
+
 @router.post("/predict", response_model=RecoveryPredictResponse)
 async def predict(
     request: Request,
@@ -91,16 +119,12 @@ async def predict(
     up_to = req.date or date.today()
 
 
-    # 3) core day‐of metrics (fills zeros/defaults if no log exists)
-    ctx = build_daily_context(me, up_to, db)
-
+    # 3) the scored day must have a morning check-in
     today_log = (
     db.query(DailyLog)
       .filter(DailyLog.user_id == me.id, DailyLog.date == up_to)
       .first()
     )
-    if today_log and today_log.water_intake_l is not None:
-        ctx["water_intake_l"] = today_log.water_intake_l
 
     minimal = ("sleep_start", "sleep_end", "sleep_quality")
 
@@ -109,7 +133,7 @@ async def predict(
         # *or* return 200 with {"predicted_recovery_rating": None}
         raise HTTPException(422, "No morning check-in yet")
 
-    # 4) compute 3-day rolling averages for soreness, stress, sleep_quality
+    # 4) the last ROLL_WINDOW logs up to the scored day feed the rolling means
     recent = (
       db.query(DailyLog)
         .filter(
@@ -117,67 +141,22 @@ async def predict(
           DailyLog.date <= up_to
         )
         .order_by(DailyLog.date.desc())
-        .limit(3)
+        .limit(ROLL_WINDOW)
         .all()
     )
-    df_hist = pd.DataFrame([{
-      "soreness":   l.soreness or 0,
-      "stress":     l.stress   or 0,
-      "sleep_quality": l.sleep_quality or 0
-    } for l in recent])
-    ctx["soreness_roll3"]       = df_hist["soreness"].mean() if "soreness" in df_hist else 0.0
-    ctx["stress_roll3"]         = df_hist["stress"].mean() if "stress" in df_hist else 0.0
-    ctx["sleep_quality_roll3"]  = df_hist["sleep_quality"].mean() if "sleep_quality" in df_hist else 0.0
-
-    # 5) day-of-week & month features
-    dow = up_to.weekday()
-    moy = up_to.month - 1
-    ctx["dow_sin"] = np.sin(2*np.pi * dow/7)
-    ctx["dow_cos"] = np.cos(2*np.pi * dow/7)
-    ctx["moy_sin"] = np.sin(2*np.pi * moy/12)
-    ctx["moy_cos"] = np.cos(2*np.pi * moy/12)
-
-    # 6) static user attributes
-    ctx["age"]    = me.age or 0
-    ctx["height"] = me.height or 0
-    ctx["weight"] = me.weight or 0
 
+    # 5) split type & muscle groups of today's session
     tpl_type, muscles = resolve_template_info(
-    db,
-    ctx.get("split_template_id") or getattr(
-        db.query(DailyLog)
-           .filter(DailyLog.user_id==me.id, DailyLog.date==up_to)
-           .first(), "split_template_id", None),
-    ctx.get("split")
+        db, today_log.split_template_id, today_log.split
     )
 
-    ctx["split_type"] = tpl_type or ""
-
-    # 7) categorical features
-    ctx["sex"]            = me.sex or ""
-    ctx["goal"]           = me.goal or ""
-    ctx["activity_level"] = me.activity_level or ""
-
-    # 8) muscle-group flags
-    # ---------------------------------------------------------
-    log_muscles = getattr(today_log, "muscle_groups", None)
-
-    # 2) if the log didn’t store them, fall back to the session's muscles
-    muscles_today = log_muscles or muscles        # ‘muscles’ came from resolve_template_info
+    # 6) raw rows → shared feature pipeline (identical to training)
+    history = log_history(recent, me, up_to, tpl_type, muscles)
+    feats = features_for_day(history, ALL_MUSCLES)
+    ctx = feats.iloc[0].astype(object).where(feats.iloc[0].notna(), None).to_dict()
 
-    for m in ALL_MUSCLES:                         # list used during model training
-        ctx[m] = 1 if muscles_today and m in muscles_today else 0
-
-    # 9) user_bias fallback
-    avg = db.query(func.avg(DailyLog.recovery_rating)) \
-            .filter(DailyLog.user_id==me.id) \
-            .scalar()
-    ctx["user_bias"] = float(avg if avg is not None else GLOBAL_MEAN or 0.0)
-
-    # 10) assemble the DataFrame in the exact order your preprocessor expects:
-    in_cols = list(preprocessor.feature_names_in_)   # these are the  input columns
-    row = [ctx.get(c, 0) for c in in_cols]
-    df_pred = pd.DataFrame([row], columns=in_cols)
+    # 7) assemble the DataFrame in the exact order your preprocessor expects:
+    df_pred = model_input(feats, preprocessor.feature_names_in_)
 
     if debug:
         print("\n─── RECOVERY DEBUG ─────────────────────────────────────────")
@@ -188,34 +167,143 @@ async def predict(
         print(df_pred.to_string(index=False))
         print("──────────────────────────────────────────────────────────────\n")
 
-    # 11) predict!  (objective + tiny personalization ε)
-    raw_score   = predict_recovery(df_pred)
+    # 8) predict!  (objective + tiny personalization ε)
+    served = candidate.route(me.id)
+    # unchanged input row for this model version → reuse the score
+    pkey, active_raw = _cached_raw(ACTIVE, df_pred)
+    raw_score = active_raw
+    if served == "candidate":
+        # A/B: the user gets the candidate's score, but raw_score keeps the
+        # active model's — heads are calibrated on it (observe_rating)
+        cand = candidate.get()
+        ckey, raw_score = _cached_raw(cand, cand.model_input(history))
+        pkey = (ckey, pkey)
     personal_sc = apply_user_head(me.id, raw_score, db)
-    EPS = 0.10
     score = (1 - EPS) * raw_score + EPS * personal_sc
-    stmt = insert(RecoveryPrediction).values(
-        user_id=me.id,
-        date=up_to,
-        score=score
-    ).on_conflict_do_update(
-        index_elements=['user_id', 'date'],
-        set_=dict(score=score, created_at=func.now())
-    )
-    db.execute(stmt)
-    db.commit()
+
+    # every served request is a comparison pair, cached score or not
+    if served == "candidate":
+        candidate.log_pair_later(served, active_raw, raw_score, me.id, up_to, MODEL_VERSION)
+    elif served:
+        # the candidate scores the same history off the request path
+        candidate.score_other_later(served, raw_score, candidate.get(), history, me.id, up_to, MODEL_VERSION)
+
+    # same model, same input, same head as what this worker last stored → nothing to write
+    if not prediction_cache.already_written(me.id, up_to, pkey, score):
+        stmt = insert(RecoveryPrediction).values(
+            user_id=me.id,
+            date=up_to,
+            score=score,
+            raw_score=active_raw,
+            model_version=MODEL_VERSION,
+        ).on_conflict_do_update(
+            index_elements=['user_id', 'date'],
+            set_=dict(score=score, raw_score=active_raw, created_at=func.now(),
+                      **heads.rescored(MODEL_VERSION))
+        )
+        db.execute(stmt)
+        db.commit()
+        prediction_cache.mark_written(me.id, up_to, pkey, score)
+        history_cache.invalidate(me.id, up_to)
 
     if debug:
         # return the raw context and the DF that went to the preprocessor
         return {
         "predicted_recovery_rating": score,
         "raw_global_score":          raw_score,
+        "served_by":                 served or "active",
         "ctx":                       ctx,
-        "model_input":               df_pred.to_dict(orient="list"),
+        "model_input":               df_pred.astype(object).where(df_pred.notna(), None).to_dict(orient="list"),
     }
     return RecoveryPredictResponse(predicted_recovery_rating=score)
 
+@router.post("/forecast", response_model=RecoveryForecastResponse)
+def forecast(
+    req: RecoveryForecastRequest,
+    db: Session = Depends(get_db),
+    me = Depends(get_current_user),
+):
+    """
+    What-if recovery for a planned schedule: `days` are consecutive days from
+    `start`, each with the planned session, sleep, nutrition, …  The plan is
+    appended to the user's last logs before `start`, so the rolling means run
+    forward through it, and every day is scored in one batched call to the
+    active model.  Nothing is stored.
+    """
+    if me.id != req.user_id:
+        raise HTTPException(403, "can only forecast your own recovery")
+    if not 1 <= len(req.days) <= FORECAST_MAX_DAYS:
+        raise HTTPException(422, f"plan 1–{FORECAST_MAX_DAYS} days")
+    start = req.start or date.today()
+    plan_dates = [start + timedelta(days=i) for i in range(len(req.days))]
+
+    # sessions as /daily-log resolves them: a named one must be in the
+    # template, a trained day without one rotates through it by weekday
+    tpl_id = req.split_template_id or me.split_template_id
+    tpl = db.query(SplitTemplate).filter_by(id=tpl_id).first() if tpl_id else None
+    sessions = (
+        db.query(SplitSession)
+          .filter_by(template_id=tpl.id)
+          .order_by(SplitSession.id)
+          .all()
+    ) if tpl else []
+    by_name = {s.name.lower(): s for s in sessions}
+    planned_sessions = []
+    for d, day in zip(plan_dates, req.days):
+        sess = None
+        if day.split and tpl:
+            sess = by_name.get(day.split.strip().lower())
+            if sess is None:
+                raise HTTPException(400, f"Session '{day.split}' not in template")
+        elif day.trained and sessions:
+            sess = sessions[d.weekday() % len(sessions)]
+        planned_sessions.append(sess)
+
+    # the previous ROLL_WINDOW - 1 logs feed the first planned day's rolling means
+    recent = (
+      db.query(DailyLog)
+        .filter(DailyLog.user_id == me.id, DailyLog.date < start)
+        .order_by(DailyLog.date.desc())
+        .limit(ROLL_WINDOW - 1)
+        .all()
+    )
+    user_attrs = {c: getattr(me, c) for c in USER_COLUMNS}
+    past = log_history(recent, me)
+    planned = [
+        {
+            **day.model_dump(exclude={"split", "trained"}),
+            "trained": int(bool(day.trained)),
+            "user_id": me.id,
+            "date": d,
+            **user_attrs,
+            "split_type": tpl.type if sess else "",
+            "muscle_groups": sess.muscle_groups if sess else [],
+        }
+        for d, day, sess in zip(plan_dates, req.days, planned_sessions)
+    ]
+    feats = model_features(dataset_rows(pd.concat([past, pd.DataFrame(planned)], ignore_index=True)), ALL_MUSCLES)
+    X = model_input(feats.iloc[len(past):], preprocessor.feature_names_in_)
+
+    raw = ACTIVE.predict_many(X)
+    scores = (1 - EPS) * raw + EPS * apply_user_head(me.id, raw, db)
+
+    return RecoveryForecastResponse(
+        model_version=MODEL_VERSION,
+        days=[
+            {
+                "date": d,
+                "predicted_recovery_rating": float(sc),
+                "raw_global_score": float(r),
+                "split": sess.name if sess else None,
+            }
+            for d, sc, r, sess in zip(plan_dates, scores, raw, planned_sessions)
+        ],
+    )
+
 @router.get( "/history",response_model=list[RecoveryPredictionOut],)
-def recovery_history(start: date = Query(..., description="Start date of the history window (YYYY-MM-DD)"),
+def recovery_history(
+    request: Request,
+    start: date = Query(..., description="Start date of the history window (YYYY-MM-DD)"),
     days: int = Query(
         30,
         ge=1,
@@ -227,18 +315,34 @@ def recovery_history(start: date = Query(..., description="Start date of the his
     """
     Returns all recovery predictions for the current user
     between `start` and `start + days - 1` (inclusive), ordered by date.
+
+    Windows are cached per user until a new prediction is upserted, and every
+    response carries an ETag: send it back as `If-None-Match` to get a 304.
     """
     since = start
     until = start + timedelta(days=days - 1)
-
-    rows = (
-        db.query(RecoveryPrediction)
-          .filter(
-              RecoveryPrediction.user_id == me.id,
-              RecoveryPrediction.date >= since,
-              RecoveryPrediction.date <= until,
-          )
-          .order_by(RecoveryPrediction.date)
-          .all()
-    )
-    return rows
\ No newline at end of file
+    window = (since, until)
+
+    cached = history_cache.get(me.id, window)
+    if cached:
+        etag, rows = cached
+    else:
+        rows = [
+            {"user_id": r.user_id, "date": r.date.isoformat(), "score": r.score}
+            for r in (
+                db.query(RecoveryPrediction)
+                  .filter(
+                      RecoveryPrediction.user_id == me.id,
+                      RecoveryPrediction.date >= since,
+                      RecoveryPrediction.date <= until,
+                  )
+                  .order_by(RecoveryPrediction.date)
+                  .all()
+            )
+        ]
+        etag = history_cache.put(me.id, window, rows)
+
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if history_cache.etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=rows, headers=headers)
\ No newline at end of file
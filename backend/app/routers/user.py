@@ -6,6 +6,7 @@ from app.database import SessionLocal
 from app.models import User, DailyLog, SplitTemplate
 from app.schemas import UserOut, UserUpdate
 from app.utils.nutrition import compute_nutrition_profile
+from app.utils import prediction_cache
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -90,4 +91,5 @@ def delete_profile(
     # delete all user-related data first if you want to cascade manually:
     db.delete(user)
     db.commit()
+    prediction_cache.forget(current_user.id)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
@@ -25,7 +25,28 @@ class SplitTemplateOut(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
-class DailyLogBase(BaseModel):
+class LogFieldRanges(BaseModel):
+    """Range checks shared by every payload that carries daily-log fields."""
+
+    @field_validator("soreness", check_fields=False)
+    def validate_soreness_range(cls, v):
+        if v is not None and not (1 <= v <= 5):
+            raise ValueError("`soreness` must be between 1 and 5")
+        return v
+
+    @field_validator("recovery_rating", check_fields=False)
+    def validate_recovery_range(cls, v):
+        if v is not None and not (0 <= v <= 100):
+            raise ValueError("`recovery_rating` must be between 0 and 100")
+        return v
+
+    @field_validator("water_intake_l", check_fields=False)
+    def validate_water_nonnegative(cls, v):
+        if v is not None and v < 0:
+            raise ValueError("`water_intake_l` must be non-negative")
+        return v
+
+class DailyLogBase(LogFieldRanges):
     date: Date
     trained: Optional[bool] = None
     # which session from the split template (inferred if trained)
@@ -53,24 +74,6 @@ class DailyLogBase(BaseModel):
     recovery_rating: Optional[int] = None  # 0–100
     water_intake_l: Optional[float] = None # litres
 
-    @field_validator("soreness")
-    def validate_soreness_range(cls, v):
-        if v is not None and not (1 <= v <= 5):
-            raise ValueError("`soreness` must be between 1 and 5")
-        return v
-
-    @field_validator("recovery_rating")
-    def validate_recovery_range(cls, v):
-        if v is not None and not (0 <= v <= 100):
-            raise ValueError("`recovery_rating` must be between 0 and 100")
-        return v
-
-    @field_validator("water_intake_l")
-    def validate_water_nonnegative(cls, v):
-        if v is not None and v < 0:
-            raise ValueError("`water_intake_l` must be non-negative")
-        return v
-
     @model_validator(mode="before")
     def check_workout_fields(cls, values: Dict[str, Any]) -> Dict[str, Any]:
         # only validate on raw dict input
@@ -237,6 +240,41 @@ class RecoveryPredictResponse(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
+class RecoveryForecastDay(LogFieldRanges):
+    """One planned day; anything left out is scored as not logged."""
+    trained: Optional[bool] = None
+    split: Optional[str] = None                # session name in the template
+    sleep_start: Optional[str] = None          # "23:30"
+    sleep_end: Optional[str] = None            # "06:30"
+    sleep_quality: Optional[int] = None
+    resting_hr: Optional[int] = None
+    hrv: Optional[float] = None
+    soreness: Optional[int] = None
+    stress: Optional[int] = None
+    motivation: Optional[int] = None
+    total_sets: Optional[int] = None
+    failure_sets: Optional[int] = None
+    total_rir: Optional[int] = None
+    calories: Optional[int] = None
+    macros: Optional[Dict[str, int]] = None
+    water_intake_l: Optional[float] = None
+
+class RecoveryForecastRequest(BaseModel):
+    user_id: str
+    start: Optional[Date] = None               # first planned day; default today
+    split_template_id: Optional[str] = None    # default: the user's template
+    days: List[RecoveryForecastDay]            # consecutive days from `start`
+
+class RecoveryForecastDayOut(BaseModel):
+    date: Date
+    predicted_recovery_rating: float
+    raw_global_score: float
+    split: Optional[str] = None
+
+class RecoveryForecastResponse(BaseModel):
+    model_version: str
+    days: List[RecoveryForecastDayOut]
+
 class RecoveryPredictionOut(BaseModel):
     user_id: str
     date:    Date
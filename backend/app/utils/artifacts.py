@@ -0,0 +1,58 @@
+# app/utils/artifacts.py
+"""
+Read side of the content-addressed model store (scripts/model_store.py
+writes it).
+
+    models/
+      objects/3f/3f2a…e9        one blob per distinct artifact, named by sha256
+      2026-06-28/manifest.json  filename → sha256, plus metrics / features /
+                                training-data hash for that version
+      latest -> 2026-06-28
+
+A version directory holds only its manifest; identical artifacts across
+versions share one object.  Directories without a manifest (written before
+the store existed) still resolve to the plain files inside them.
+"""
+import json
+from pathlib import Path
+from typing import Optional
+
+MANIFEST = "manifest.json"
+
+
+def objects_dir(version_dir: Path) -> Path:
+    # parent of the un-resolved path, so models/latest → models/objects
+    return Path(version_dir).parent / "objects"
+
+
+def object_path(objects: Path, digest: str) -> Path:
+    return objects / digest[:2] / digest
+
+
+def read_manifest(version_dir: Path) -> Optional[dict]:
+    p = Path(version_dir) / MANIFEST
+    if not p.exists():
+        return None
+    return json.loads(p.read_text())
+
+
+def artifact_path(version_dir: Path, filename: str) -> Optional[Path]:
+    """Where `filename` of this version lives on disk, or None if it has no such artifact."""
+    manifest = read_manifest(version_dir)
+    if manifest is None:
+        p = Path(version_dir) / filename
+        return p if p.exists() else None
+    entry = manifest["files"].get(filename)
+    if entry is None:
+        return None
+    p = object_path(objects_dir(version_dir), entry["sha256"])
+    return p if p.exists() else None
+
+
+def version_of(version_dir: Path) -> Optional[str]:
+    """The version a directory (or the `latest` link) points at; None if it doesn't exist."""
+    version_dir = Path(version_dir)
+    manifest = read_manifest(version_dir)
+    if manifest is not None:
+        return manifest["version"]
+    return version_dir.resolve().name if version_dir.exists() else None
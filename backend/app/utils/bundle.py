@@ -0,0 +1,188 @@
+# app/utils/bundle.py
+"""
+Single-file recovery model bundle: everything /recovery/predict needs, read
+with one open + mmap.
+
+    0   b"RCVBNDL\\0"                 magic
+    8   u32 format version, u32 0
+    16  u64 header length
+    24  header (UTF-8 JSON): meta, preprocessor layout, array table
+    …   arrays, each at a 64-byte aligned offset, raw little-endian
+
+The arrays (MLP weights, imputer medians, scaler mean / scale) are used in
+place as views of a private (copy-on-write) mapping, so every uvicorn worker
+on a host reads the same page-cache pages instead of holding its own copy.
+Never rewrite a bundle in place while something has it mapped; the model
+store only ever adds new files.
+
+The preprocessor is stored as its fitted parameters, not a pickle, and
+BundlePreprocessor reproduces the training ColumnTransformer
+(median impute → standardise | one-hot, unknown ignored) in NumPy.
+
+A reduced-precision variant (recovery_model.float16.bundle) holds the same
+model with float16 MLP weights; its header records its validation MAE next
+to the float32 model's, so serving can refuse a variant that lost accuracy.
+"""
+import json
+import mmap
+import struct
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+BUNDLE_FILE = "recovery_model.bundle"
+PRECISIONS = {"float32": "<f4", "float16": "<f2"}
+MAGIC = b"RCVBNDL\0"
+FORMAT_VERSION = 1
+ALIGN = 64
+_PREAMBLE = struct.Struct("<8sIIQ")
+
+
+def _aligned(n: int) -> int:
+    return -(-n // ALIGN) * ALIGN
+
+
+def _cat_list(values) -> list:
+    """categories_ → JSON: missing (NaN / None) becomes null."""
+    return [None if pd.isna(v) else (v.item() if isinstance(v, np.generic) else v) for v in values]
+
+
+def bundle_file(precision: str = "float32") -> str:
+    """recovery_model.bundle, or recovery_model.<precision>.bundle for a variant."""
+    return BUNDLE_FILE if precision == "float32" else f"recovery_model.{precision}.bundle"
+
+
+def write_bundle(path: Path, preproc, state: Dict, all_muscles, y_mean: float, y_std: float,
+                 global_mean: float, trained_through: Optional[str] = None,
+                 precision: str = "float32", validation: Optional[Dict] = None):
+    """
+    Pack a fitted ColumnTransformer + MLP state dict + scalars into one file.
+    `precision` sets the MLP weight dtype; `validation` (e.g. val_mae,
+    val_mae_float32) is stored in the header as is.
+    """
+    num = preproc.named_transformers_["num"]
+    impute, scale = num.named_steps["impute"], num.named_steps["scale"]
+    cat = preproc.named_transformers_["cat"]
+    num_cols, cat_cols = list(preproc.transformers_[0][2]), list(preproc.transformers_[1][2])
+
+    arrays = {
+        "impute.statistics": np.asarray(impute.statistics_, dtype="<f8"),
+        "scale.mean": np.asarray(scale.mean_, dtype="<f8"),
+        "scale.scale": np.asarray(scale.scale_, dtype="<f8"),
+    }
+    for k, v in state.items():
+        arrays[f"mlp.{k}"] = v.detach().cpu().float().numpy().astype(PRECISIONS[precision])
+
+    header = {
+        "format": FORMAT_VERSION,
+        "meta": {
+            "all_muscles": list(all_muscles),
+            "y_mean": float(y_mean), "y_std": float(y_std), "global_mean": float(global_mean),
+            "trained_through": trained_through,
+            "precision": precision,
+            "validation": validation or {},
+            "hidden": int(state["net.0.weight"].shape[0]),
+            "in_dim": int(state["net.0.weight"].shape[1]),
+        },
+        "preprocessor": {
+            "feature_names_in": list(preproc.feature_names_in_),
+            "numeric": num_cols,
+            "categorical": cat_cols,
+            "categories": [_cat_list(c) for c in cat.categories_],
+        },
+    }
+    # offsets depend on the header length and vice versa: grow the data start until the header fits
+    rel = {}
+    end = 0
+    for name, a in arrays.items():
+        rel[name] = end
+        end = _aligned(end + a.nbytes)
+    data_start = ALIGN
+    while True:
+        header["arrays"] = {
+            name: {"dtype": a.dtype.str, "shape": list(a.shape), "offset": data_start + rel[name]}
+            for name, a in arrays.items()
+        }
+        blob = json.dumps(header).encode()
+        if _PREAMBLE.size + len(blob) <= data_start:
+            break
+        data_start = _aligned(_PREAMBLE.size + len(blob))
+
+    path = Path(path)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, 0, len(blob)))
+        f.write(blob)
+        for name, a in arrays.items():
+            f.seek(header["arrays"][name]["offset"])
+            f.write(np.ascontiguousarray(a).tobytes())
+    tmp.replace(path)
+
+
+class BundlePreprocessor:
+    """transform() / feature_names_in_ of the training ColumnTransformer, from stored parameters."""
+
+    def __init__(self, layout: dict, statistics: np.ndarray, mean: np.ndarray, scale: np.ndarray):
+        self.feature_names_in_ = np.asarray(layout["feature_names_in"], dtype=object)
+        self.numeric = layout["numeric"]
+        self.categorical = layout["categorical"]
+        # SimpleImputer drops all-missing columns (NaN median) before scaling
+        self._keep = ~np.isnan(statistics)
+        self._fill = statistics
+        self._mean, self._scale = mean, scale
+        self._cats = []
+        for cats in layout["categories"]:
+            known = [c for c in cats if c is not None]
+            missing_at = cats.index(None) if None in cats else -1
+            self._cats.append((pd.Index(known), missing_at, len(cats)))
+        self.n_features_out = int(self._keep.sum()) + sum(n for _, _, n in self._cats)
+
+    def transform(self, df: pd.DataFrame) -> np.ndarray:
+        X = df[self.numeric].to_numpy(dtype=np.float64, na_value=np.nan)
+        X = np.where(np.isnan(X), self._fill, X)[:, self._keep]
+        parts = [(X - self._mean) / self._scale]
+        for col, (known, missing_at, width) in zip(self.categorical, self._cats):
+            values = df[col].to_numpy(dtype=object)
+            codes = known.get_indexer(values)                    # -1: unknown or missing
+            if missing_at >= 0:
+                # like OneHotEncoder: a fitted NaN category matches NaN only; None stays unknown
+                is_nan = pd.isna(values) & np.not_equal(values, None)
+                codes = np.where(is_nan, missing_at, codes)
+            onehot = np.zeros((len(values), width))
+            hit = codes >= 0
+            onehot[np.flatnonzero(hit), codes[hit]] = 1.0
+            parts.append(onehot)
+        return np.hstack(parts)
+
+
+class Bundle:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        magic, version, _, hlen = _PREAMBLE.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a recovery model bundle")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{self.path}: bundle format {version}, expected {FORMAT_VERSION}")
+        header = json.loads(self._mm[_PREAMBLE.size:_PREAMBLE.size + hlen])
+        self.arrays = {
+            name: np.ndarray(tuple(e["shape"]), dtype=np.dtype(e["dtype"]), buffer=self._mm, offset=e["offset"])
+            for name, e in header["arrays"].items()
+        }
+        self.meta = header["meta"]
+        self.preprocessor = BundlePreprocessor(
+            header["preprocessor"],
+            self.arrays["impute.statistics"], self.arrays["scale.mean"], self.arrays["scale.scale"],
+        )
+
+    def state_dict(self) -> dict:
+        """MLP weights as tensors sharing the mapping (load with assign=True to keep it that way)."""
+        import torch
+        return {k[len("mlp."):]: torch.from_numpy(a) for k, a in self.arrays.items() if k.startswith("mlp.")}
+
+
+def load_bundle(path: Path) -> Bundle:
+    return Bundle(path)
@@ -0,0 +1,155 @@
+# app/utils/candidate.py
+"""
+Candidate model served next to the active one, to validate a retrain on
+live traffic before `models/latest` is flipped to it.
+
+    RECOVERY_CANDIDATE           version under models/ (e.g. 2026-07-05) or a
+                                 directory path; unset = off
+    RECOVERY_CANDIDATE_MODE      shadow (default): users always get the active
+                                 model's score; a fraction of requests is also
+                                 scored by the candidate
+                                 ab: a fraction of *users* (stable hash of the
+                                 user id) is served the candidate's score; the
+                                 active model scores them in the background
+    RECOVERY_CANDIDATE_FRACTION  share of requests (shadow, default 1.0) or of
+                                 users (ab, default 0.1)
+
+The model that is not served runs on a small worker pool after the response
+has its score, so it adds no latency; when the pool's queue is full, pairs
+are dropped rather than queued.  Every pair lands in recovery_shadow_scores
+(scripts/compare_candidate.py scores both against the ratings users log).
+
+Heads are fitted on the active model's raw scores and are applied to
+whichever model served the request.  So in ab mode the active model also
+scores candidate-served requests up front: recovery_predictions.raw_score
+(what observe_rating calibrates on) always holds the active model's score.
+"""
+import hashlib
+import logging
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CANDIDATE = os.getenv("RECOVERY_CANDIDATE", "").strip()
+MODE = os.getenv("RECOVERY_CANDIDATE_MODE", "shadow").strip().lower()
+FRACTION = float(os.getenv("RECOVERY_CANDIDATE_FRACTION", "1.0" if MODE == "shadow" else "0.1"))
+WORKERS = int(os.getenv("RECOVERY_CANDIDATE_WORKERS", "1"))
+MAX_PENDING = int(os.getenv("RECOVERY_CANDIDATE_MAX_PENDING", "256"))
+
+_model = None
+_load_lock = threading.Lock()
+_pool: Optional[ThreadPoolExecutor] = None
+_pending = threading.BoundedSemaphore(MAX_PENDING)
+dropped = 0
+
+
+def _candidate_dir(name: str) -> Path:
+    from app.utils.context import LATEST_DIR
+    p = Path(name)
+    return p if p.is_dir() else LATEST_DIR.parent / name
+
+
+def get():
+    """The candidate ServingModel, loaded on first use; None when off or not loadable."""
+    global _model, _pool
+    if not CANDIDATE or MODE not in ("shadow", "ab"):
+        return None
+    if _model is None:
+        with _load_lock:
+            if _model is None:
+                from app.utils.artifacts import version_of
+                from app.utils.context import ServingModel
+                d = _candidate_dir(CANDIDATE)
+                try:
+                    _model = ServingModel([d], version_of(d) or d.name)
+                except FileNotFoundError:
+                    logger.exception("candidate model %s could not be loaded; candidate scoring off", d)
+                    _model = False
+                    return None
+                _pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="candidate")
+                logger.info("candidate model %s loaded (%s, fraction %.2f)", _model.version, MODE, FRACTION)
+    return _model or None
+
+
+def _bucket(user_id: str) -> float:
+    """Stable [0, 1) per user and candidate, so a user stays in one A/B arm."""
+    h = hashlib.sha1(f"{CANDIDATE}:{user_id}".encode()).digest()
+    return int.from_bytes(h[:8], "big") / 2 ** 64
+
+
+def route(user_id: str) -> Optional[str]:
+    """Which model serves this request: "active", "candidate", or None when no pair is logged."""
+    if get() is None:
+        return None
+    if MODE == "ab":
+        return "candidate" if _bucket(user_id) < FRACTION else "active"
+    return "active" if random.random() < FRACTION else None
+
+
+def _later(fn, user_id: str, day: date):
+    """Run `fn` on the candidate pool; dropped when MAX_PENDING jobs are already queued."""
+    global dropped
+    if not _pending.acquire(blocking=False):
+        dropped += 1
+        return
+
+    def run():
+        try:
+            fn()
+        except Exception:
+            logger.exception("candidate scoring failed for %s on %s", user_id, day)
+        finally:
+            _pending.release()
+
+    _pool.submit(run)
+
+
+def score_other_later(served: str, served_raw: float, other, history: pd.DataFrame,
+                      user_id: str, day: date, active_version: str):
+    """Score `history` with the model that was not served and log the pair, off the request path."""
+    cand = get()
+
+    def run():
+        other_raw = other.predict(other.model_input(history))
+        active_raw, candidate_raw = (served_raw, other_raw) if served == "active" else (other_raw, served_raw)
+        _log_pair(user_id, day, active_version, cand.version, served, active_raw, candidate_raw)
+
+    _later(run, user_id, day)
+
+
+def log_pair_later(served: str, active_raw: float, candidate_raw: float,
+                   user_id: str, day: date, active_version: str):
+    """Log a pair whose scores are both known already, off the request path."""
+    cand = get()
+    _later(lambda: _log_pair(user_id, day, active_version, cand.version, served, active_raw, candidate_raw),
+           user_id, day)
+
+
+def _log_pair(user_id, day, active_version, candidate_version, served, active_raw, candidate_raw):
+    from sqlalchemy import func
+    from sqlalchemy.dialects.postgresql import insert
+    from app.database import SessionLocal
+    from app.models import RecoveryShadowScore
+
+    values = dict(active_raw=active_raw, candidate_raw=candidate_raw, served=served, mode=MODE)
+    stmt = insert(RecoveryShadowScore).values(
+        user_id=user_id, date=day,
+        active_version=active_version, candidate_version=candidate_version, **values,
+    ).on_conflict_do_update(
+        index_elements=["user_id", "date", "active_version", "candidate_version"],
+        set_=dict(values, created_at=func.now()),
+    )
+    db = SessionLocal()
+    try:
+        db.execute(stmt)
+        db.commit()
+    finally:
+        db.close()
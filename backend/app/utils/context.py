@@ -4,6 +4,11 @@ from datetime import date, timedelta
 from typing import Dict, Any
 from sqlalchemy.orm import Session
 from app.models import DailyLog, User
+from app.utils.features import sleep_hours_one, DEFAULT_MAINTENANCE_KCAL, features_for_day, model_input
+from app.utils import heads, inference
+from app.utils.artifacts import artifact_path, version_of
+from app.utils.bundle import bundle_file, load_bundle
+from app.utils.onnx_model import ONNX_FILE, OnnxPredictor
 import joblib
 import torch
 from torch import nn
@@ -11,15 +16,26 @@ import numpy as np
 import pandas as pd
 from pathlib import Path
 import os
+import logging
+
+logger = logging.getLogger(__name__)
 
 BASE = Path(__file__).resolve().parent.parent
 LATEST_DIR = BASE.parent / "models" / "latest"
 FALLBACK_DIR = BASE
-
-def try_load(name, ext):
-    for base in [LATEST_DIR, FALLBACK_DIR]:
-        path = base / f"{name}.{ext}"
-        if path.exists():
+# registry version the artifacts below were loaded from
+MODEL_VERSION = version_of(LATEST_DIR) or "fallback"
+# float16 serves recovery_model.float16.bundle when its validation MAE is
+# within RECOVERY_PRECISION_TOLERANCE (MAE points) of the float32 model's
+PRECISION = os.getenv("RECOVERY_PRECISION", "float32").strip().lower()
+PRECISION_TOLERANCE = float(os.getenv("RECOVERY_PRECISION_TOLERANCE", "0.05"))
+# onnx: score through recovery_model.onnx with ONNX Runtime when the version has one
+BACKEND = os.getenv("RECOVERY_BACKEND", "torch").strip().lower()
+
+def try_load(name, ext, dirs=None):
+    for base in dirs or [LATEST_DIR, FALLBACK_DIR]:
+        path = artifact_path(base, f"{name}.{ext}")
+        if path is not None:
             if ext == "pkl":
                 with open(path, "rb") as f:
                     return joblib.load(f)
@@ -27,10 +43,8 @@ def try_load(name, ext):
                 return joblib.load(path)
             elif ext == "pt":
                 return torch.load(path, map_location=_device)
-    raise FileNotFoundError(f"Could not find {name}.{ext} in latest/ or fallback dir")
+    raise FileNotFoundError(f"Could not find {name}.{ext} in {', '.join(str(d) for d in dirs or [LATEST_DIR, FALLBACK_DIR])}")
 
-# Set up model and preprocessor
-preprocessor = try_load("recovery_preproc_with_user_bias", "joblib")
 class MLP(nn.Module):
     def __init__(self, in_dim, hidden=32):
         super().__init__()
@@ -43,40 +57,136 @@ class MLP(nn.Module):
     def forward(self, x): return self.net(x).squeeze(1)
 
 _device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+# thread pools and CPU pinning for this worker, before any model is loaded
+inference.configure()
+
+def find_artifact(filename: str, dirs=None):
+    """`filename` from the first dir holding a model; None if that model has no such file."""
+    for base in dirs or [LATEST_DIR, FALLBACK_DIR]:
+        path = artifact_path(base, filename)
+        if path is not None:
+            return path
+        if artifact_path(base, "recovery_mlp_with_user_bias.pt") is not None:
+            return None
+    return None
+
+def find_bundle(dirs=None, precision: str = "float32"):
+    """The packed bundle of the first dir holding a model; None if that model predates bundles."""
+    return find_artifact(bundle_file(precision), dirs)
+
+class ServingModel:
+    """
+    One model version loaded for scoring: preprocessor, MLP, muscle
+    vocabulary and target scaling.  The active model lives in this module;
+    app/utils/candidate.py loads a second one next to it.
+    """
 
-num_pipe = preprocessor.named_transformers_['num']
-num_dim = num_pipe.named_steps['scale'].n_features_in_
-cat_enc = preprocessor.named_transformers_['cat']
-cat_dim = sum(len(cats) for cats in cat_enc.categories_)
-_in_dim = num_dim + cat_dim
-
-_model = MLP(_in_dim, hidden=32).to(_device)
-_model.load_state_dict(try_load("recovery_mlp_with_user_bias", "pt"))
-_model.eval()
-
-GLOBAL_MEAN = try_load("recovery_global_mean", "pkl")
-ALL_MUSCLES = try_load("recovery_all_muscles", "pkl")
-Y_MEAN = try_load("recovery_y_mean", "pkl")
-Y_STD  = try_load("recovery_y_std", "pkl")
+    def __init__(self, dirs, version: str, precision: str = PRECISION, backend: str = BACKEND):
+        self.version = version
+        self.precision = "float32"
+        bundle_path = find_bundle(dirs)
+        if bundle_path is not None:
+            # one open + mmap; weights stay views of the shared mapping (assign=True)
+            bundle = self._variant(dirs, precision) or load_bundle(bundle_path)
+            self.precision = bundle.meta.get("precision", "float32")
+            self.preprocessor = bundle.preprocessor
+            model = MLP(bundle.meta["in_dim"], hidden=bundle.meta["hidden"])
+            model.load_state_dict(bundle.state_dict(), assign=True)
+            self.model = model.to(_device)
+            self.global_mean = bundle.meta["global_mean"]
+            self.all_muscles = bundle.meta["all_muscles"]
+            self.y_mean = bundle.meta["y_mean"]
+            self.y_std = bundle.meta["y_std"]
+        else:
+            self.preprocessor = try_load("recovery_preproc_with_user_bias", "joblib", dirs)
+            num_pipe = self.preprocessor.named_transformers_['num']
+            num_dim = num_pipe.named_steps['scale'].n_features_in_
+            cat_enc = self.preprocessor.named_transformers_['cat']
+            cat_dim = sum(len(cats) for cats in cat_enc.categories_)
+
+            state = try_load("recovery_mlp_with_user_bias", "pt", dirs)
+            # hidden width comes from the weights, so tuned models load without code changes
+            self.model = MLP(num_dim + cat_dim, hidden=state["net.0.weight"].shape[0]).to(_device)
+            self.model.load_state_dict(state)
+
+            self.global_mean = try_load("recovery_global_mean", "pkl", dirs)
+            self.all_muscles = try_load("recovery_all_muscles", "pkl", dirs)
+            self.y_mean = try_load("recovery_y_mean", "pkl", dirs)
+            self.y_std = try_load("recovery_y_std", "pkl", dirs)
+        self.model.eval()
+        self._dtype = torch.float16 if self.precision == "float16" else torch.float32
+        self.onnx = self._onnx(dirs) if backend == "onnx" else None
+
+    def _onnx(self, dirs):
+        path = find_artifact(ONNX_FILE, dirs)
+        if path is None:
+            logger.warning("no %s for %s; serving with torch", ONNX_FILE, self.version)
+            return None
+        try:
+            return OnnxPredictor(path, intra_threads=inference.INTRA)
+        except ImportError:
+            logger.warning("onnxruntime is not installed; serving with torch")
+            return None
+
+    def _variant(self, dirs, precision: str):
+        """The reduced-precision bundle, if asked for and within tolerance of float32."""
+        if precision == "float32":
+            return None
+        path = find_bundle(dirs, precision)
+        if path is None:
+            logger.warning("no %s bundle for %s; serving float32", precision, self.version)
+            return None
+        bundle = load_bundle(path)
+        v = bundle.meta.get("validation", {})
+        mae, ref = v.get("val_mae"), v.get("val_mae_float32")
+        if mae is None or ref is None or mae - ref > PRECISION_TOLERANCE:
+            logger.warning("%s bundle for %s: VAL MAE %s vs %s float32 exceeds ±%.3f; serving float32",
+                           precision, self.version, mae, ref, PRECISION_TOLERANCE)
+            return None
+        return bundle
+
+    def model_input(self, history: pd.DataFrame) -> pd.DataFrame:
+        """One user's raw rows up to the scored day → this model's input row."""
+        return model_input(features_for_day(history, self.all_muscles), self.preprocessor.feature_names_in_)
+
+    def predict_many(self, df: pd.DataFrame) -> np.ndarray:
+        """Raw scores for every row of `df`, in one forward pass."""
+        if self.onnx is not None:
+            return self.onnx.predict(df)
+        X = self.preprocessor.transform(df)
+        t = torch.tensor(X, dtype=self._dtype, device=_device)
+        with torch.no_grad():
+            out_norm = self.model(t).float().cpu().numpy().astype(np.float64)
+        # convert back to the original 0–100 scale:
+        return out_norm * self.y_std + self.y_mean
+
+    def predict(self, df: pd.DataFrame) -> float:
+        return float(self.predict_many(df)[0])
+
+ACTIVE = ServingModel([LATEST_DIR, FALLBACK_DIR], MODEL_VERSION)
+# heads are fitted per model version; serve the ones fitted on this model's scores
+heads.cache.use_version(MODEL_VERSION)
+preprocessor = ACTIVE.preprocessor
+_model = ACTIVE.model
+GLOBAL_MEAN = ACTIVE.global_mean
+ALL_MUSCLES = ACTIVE.all_muscles
+Y_MEAN = ACTIVE.y_mean
+Y_STD  = ACTIVE.y_std
 
 def predict_recovery(df: pd.DataFrame) -> float:
-    X = preprocessor.transform(df)
-    t = torch.tensor(X, dtype=torch.float32, device=_device)
-    with torch.no_grad():
-        out_norm = _model(t).cpu().numpy().item()
-    # convert back to the original 0–100 scale:
-    return float(out_norm * Y_STD + Y_MEAN)
+    return ACTIVE.predict(df)
 
 def apply_user_head(user_id: str, raw_score: float, db: Session) -> float:
     """
     Adjust the global prediction with the user's learned bias / slope.
-    Falls back to raw_score if no row exists yet.
+    Falls back to raw_score if no row exists yet.  Heads come from the
+    in-process cache (app.utils.heads.cache) for MODEL_VERSION, not a
+    query per call.
     """
-    from app.models import UserRecoveryHead
-
-    head = db.query(UserRecoveryHead).filter_by(user_id=user_id).first()
+    head = heads.cache.get(db, user_id)
     if head:
-        return head.slope * raw_score + head.bias
+        slope, bias = head
+        return slope * raw_score + bias
     return raw_score
 
 def build_daily_context(user: User, up_to: date, db: Session) -> Dict[str, Any]:
@@ -109,21 +219,8 @@ def build_daily_context(user: User, up_to: date, db: Session) -> Dict[str, Any]:
         "water_intake_l": log.water_intake_l or 0.0,
     }
 
-    # Compute sleep hours
-    if log.sleep_start and log.sleep_end:
-        try:
-            sh, sm = map(int, log.sleep_start.split(":"))
-            eh, em = map(int, log.sleep_end.split(":"))
-            # raw difference in minutes
-            delta = (eh * 60 + em) - (sh * 60 + sm)
-            # if negative, you crossed midnight → add 24h
-            if delta < 0:
-                delta += 24 * 60
-            ctx["sleep_h"] = delta / 60.0
-        except ValueError:
-            ctx["sleep_h"] = 0.0
-    else:
-        ctx["sleep_h"] = 0.0
+    # Compute sleep hours (same definition the recovery model uses)
+    ctx["sleep_h"] = sleep_hours_one(log.sleep_start, log.sleep_end) or 0.0
 
     # Avoid divide-by-zero when no sets
     sets_for_calc = ctx["total_sets"] if ctx["total_sets"] > 0 else 1
@@ -131,7 +228,7 @@ def build_daily_context(user: User, up_to: date, db: Session) -> Dict[str, Any]:
     ctx["avg_rir"]    = ctx["total_rir"] / sets_for_calc
 
     # Calorie deficit vs. maintenance
-    maintenance = user.maintenance_calories or 1
+    maintenance = user.maintenance_calories or DEFAULT_MAINTENANCE_KCAL
     ctx["cal_deficit_pct"] = (ctx["calories"] - maintenance) / maintenance
 
     # Macros as percentage of targets
@@ -196,16 +293,7 @@ def build_weekly_context(user: User, up_to: date, db: Session) -> Dict[str, Any]
             trained_count += 1
 
         # Sleep accumulation
-        if l.sleep_start and l.sleep_end:
-            try:
-                sh, sm = map(int, l.sleep_start.split(":"))
-                eh, em = map(int, l.sleep_end.split(":"))
-                delta = (eh * 60 + em) - (sh * 60 + sm)
-                if delta < 0:
-                    delta += 24 * 60
-                sleep_h_sum += delta / 60.0
-            except ValueError:
-                pass
+        sleep_h_sum += sleep_hours_one(l.sleep_start, l.sleep_end) or 0.0
 
         sleep_quality_sum += (l.sleep_quality or 0)
 
@@ -219,7 +307,7 @@ def build_weekly_context(user: User, up_to: date, db: Session) -> Dict[str, Any]
     avg_stress = sum(l.stress or 0 for l in days) / (stress_days or 1)
     avg_soreness = sum(soreness_vals) / len(soreness_vals) if soreness_vals else 0.0
     avg_deficit_pct = sum(
-            ((l.calories or 0) - (user.maintenance_calories or 1)) / (user.maintenance_calories or 1)
+            ((l.calories or 0) - (user.maintenance_calories or DEFAULT_MAINTENANCE_KCAL)) / (user.maintenance_calories or DEFAULT_MAINTENANCE_KCAL)
             for l in days if l.calories is not None
         ) / (cal_days or 1)
 
@@ -296,16 +384,7 @@ def build_monthly_context(user: User, month: str, db: Session) -> Dict[str, Any]
     for l in days:
         if l.trained:
             trained_count += 1
-        if l.sleep_start and l.sleep_end:
-            try:
-                sh, sm = map(int, l.sleep_start.split(":"))
-                eh, em = map(int, l.sleep_end.split(":"))
-                delta = (eh * 60 + em) - (sh * 60 + sm)
-                if delta < 0:
-                    delta += 24 * 60
-                sleep_h_sum += delta / 60.0
-            except ValueError:
-                pass
+        sleep_h_sum += sleep_hours_one(l.sleep_start, l.sleep_end) or 0.0
         sleep_quality_sum += (l.sleep_quality or 0)
 
         sleep_quality_sum += (l.sleep_quality or 0)
@@ -359,7 +438,7 @@ def build_monthly_context(user: User, month: str, db: Session) -> Dict[str, Any]
     avg_stress  = sum(l.stress or 0 for l in days) / (stress_days or 1)
     avg_soreness = sum(soreness_vals) / len(soreness_vals) if soreness_vals else 0.0
     avg_deficit_pct = sum(
-        ((l.calories or 0) - (user.maintenance_calories or 1)) / (user.maintenance_calories or 1)
+        ((l.calories or 0) - (user.maintenance_calories or DEFAULT_MAINTENANCE_KCAL)) / (user.maintenance_calories or DEFAULT_MAINTENANCE_KCAL)
         for l in days if l.calories is not None
     ) / (cal_days or 1)
 
@@ -0,0 +1,309 @@
+# app/utils/features.py
+"""
+Recovery-model feature definitions — the one place they live.
+
+Two stages, both vectorised over a DataFrame so the exact same code runs for
+a whole training set and for the single row scored by /recovery/predict:
+
+  dataset_rows(raw)        raw log + user + split columns → the stored
+                           dataset schema (sleep_h, cal_deficit_pct, macro %,
+                           …).  Used by update_dataset, extract_recovery_dataset
+                           and the serving path.
+
+  model_features(rows, …)  dataset rows → model inputs: 3-log rolling means,
+                           cyclical day-of-week / month, muscle-group flags.
+                           Used by train_recovery_lr, rescore_recovery and
+                           /recovery/predict.
+
+Missing measurements stay NaN all the way through; the fitted preprocessor's
+median imputer is what fills them, at training and at serving time alike.
+"""
+import json
+import re
+from functools import lru_cache
+from typing import Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_MAINTENANCE_KCAL = 2000
+MACROS = ("protein", "carbs", "fat")
+ROLL_SOURCES = ("soreness", "stress", "sleep_quality")
+ROLL_WINDOW = 3
+
+BASE_NUM_FEATS = [
+    "sleep_h", "sleep_quality", "resting_hr", "hrv",
+    "total_sets", "failure_sets", "total_rir",
+    "cal_deficit_pct", "protein_pct", "carbs_pct", "fat_pct",
+    "stress", "motivation", "water_intake_l", "age", "height", "weight",
+]
+ROLL_FEATS = [f"{f}_roll{ROLL_WINDOW}" for f in ROLL_SOURCES]
+CYCLIC_FEATS = ["dow_sin", "dow_cos", "moy_sin", "moy_cos"]
+CAT_FEATS = ["sex", "goal", "activity_level", "split_type"]
+
+# columns of the stored training set (recovery_dataset/ and the legacy CSV)
+DATASET_COLUMNS = [
+    "user_id", "date",
+    "sleep_h", "sleep_quality", "resting_hr", "hrv",
+    "trained", "total_sets", "failure_sets", "total_rir",
+    "cal_deficit_pct", "protein_pct", "carbs_pct", "fat_pct",
+    "stress", "motivation", "soreness", "water_intake_l",
+    "split_type", "muscle_groups",
+    "age", "sex", "height", "weight", "goal", "activity_level",
+    "recovery_rating",
+]
+# column types dataset_rows() produces; muscle_groups is the JSON-encoded list
+_DATASET_STR = {"user_id", "split_type", "muscle_groups", "sex", "goal", "activity_level"}
+DATASET_DTYPES = {
+    c: "datetime64[ns]" if c == "date" else "int64" if c == "trained"
+       else "string" if c in _DATASET_STR else "float64"
+    for c in DATASET_COLUMNS
+}
+
+# raw columns dataset_rows() reads; anything absent is treated as missing
+LOG_COLUMNS = [
+    "user_id", "date", "trained", "total_sets", "failure_sets", "total_rir",
+    "sleep_start", "sleep_end", "sleep_quality", "resting_hr", "hrv",
+    "calories", "macros", "stress", "motivation", "soreness",
+    "water_intake_l", "recovery_rating",
+]
+USER_COLUMNS = ["age", "sex", "height", "weight", "goal", "activity_level",
+                "maintenance_calories", "macro_targets"]
+SPLIT_COLUMNS = ["split_type", "muscle_groups"]
+
+# model inputs each editable daily-log field feeds: the day's own features
+# and, for ROLL_SOURCES, the rolling means of the next ROLL_WINDOW - 1 logged
+# days.  MUSCLE_FLAGS stands for the per-muscle columns.  Fields not listed
+# (weight, weight_unit, trained, recovery_rating, …) feed no model input.
+MUSCLE_FLAGS = "<muscle flags>"
+LOG_FIELD_FEATURES = {
+    "sleep_start":       ["sleep_h"],
+    "sleep_end":         ["sleep_h"],
+    "sleep_quality":     ["sleep_quality", f"sleep_quality_roll{ROLL_WINDOW}"],
+    "soreness":          [f"soreness_roll{ROLL_WINDOW}"],
+    "stress":            ["stress", f"stress_roll{ROLL_WINDOW}"],
+    "resting_hr":        ["resting_hr"],
+    "hrv":               ["hrv"],
+    "total_sets":        ["total_sets"],
+    "failure_sets":      ["failure_sets"],
+    "total_rir":         ["total_rir"],
+    "motivation":        ["motivation"],
+    "water_intake_l":    ["water_intake_l"],
+    "calories":          ["cal_deficit_pct"],
+    "macros":            [f"{k}_pct" for k in MACROS],
+    "split":             ["split_type", MUSCLE_FLAGS],
+    "split_template_id": ["split_type", MUSCLE_FLAGS],
+}
+
+
+def numeric_features(all_muscles: Iterable[str]) -> List[str]:
+    return BASE_NUM_FEATS + ROLL_FEATS + CYCLIC_FEATS + list(all_muscles)
+
+
+def affected_features(fields: Iterable[str], feature_names: Iterable[str]) -> set:
+    """The inputs among `feature_names` (a preprocessor's feature_names_in_) that edits to `fields` can move."""
+    feature_names = set(feature_names)
+    muscles = feature_names - set(BASE_NUM_FEATS + ROLL_FEATS + CYCLIC_FEATS + CAT_FEATS)
+    out = set()
+    for f in fields:
+        for feat in LOG_FIELD_FEATURES.get(f, ()):
+            out |= muscles if feat == MUSCLE_FLAGS else {feat}
+    return out & feature_names
+
+
+# ── primitives ───────────────────────────────────────────────────────────────
+
+_HHMM = r"^(\d{1,2}):(\d{2})$"
+
+def _minutes(hhmm: pd.Series) -> pd.Series:
+    hm = hhmm.astype(object).where(hhmm.notna(), "").astype(str).str.extract(_HHMM)
+    return hm[0].astype(float) * 60 + hm[1].astype(float)
+
+
+def sleep_hours(start: pd.Series, end: pd.Series) -> pd.Series:
+    """'HH:MM' → hours slept, wrapping past midnight; NaN when either side is missing."""
+    delta = _minutes(end) - _minutes(start)
+    return delta.where(delta >= 0, delta + 24 * 60) / 60.0
+
+
+def sleep_hours_one(start: Optional[str], end: Optional[str]) -> Optional[float]:
+    """Scalar twin of sleep_hours() for per-log callers (rules, digests)."""
+    if not isinstance(start, str) or not isinstance(end, str):
+        return None
+    ms, me = re.match(_HHMM, start), re.match(_HHMM, end)
+    if not ms or not me:
+        return None
+    delta = (int(me[1]) * 60 + int(me[2])) - (int(ms[1]) * 60 + int(ms[2]))
+    return (delta + 24 * 60 if delta < 0 else delta) / 60.0
+
+
+def _num(s: pd.Series) -> pd.Series:
+    return pd.to_numeric(s, errors="coerce")
+
+
+def _dict_col(s: pd.Series) -> pd.Series:
+    return s.map(lambda d: d if isinstance(d, dict) else {})
+
+
+def _muscle_list(m) -> list:
+    if isinstance(m, str):
+        try:
+            m = json.loads(m)
+        except ValueError:
+            return []
+    return list(m) if isinstance(m, (list, tuple)) else []
+
+
+# ── muscle groups as bitmasks ────────────────────────────────────────────────
+# Bit i of a mask is set when the session trains all_muscles[i].  Every
+# distinct session (one JSON list) is parsed once per vocabulary; the flag
+# columns are then a single shift-and-mask over the whole frame.
+
+def _muscle_key(m) -> Optional[str]:
+    if isinstance(m, str):
+        return m
+    return None if m is None or (isinstance(m, float) and np.isnan(m)) else json.dumps(_muscle_list(m))
+
+
+@lru_cache(maxsize=4096)
+def _session_mask(vocab: tuple, key: str) -> int:
+    bit = {m: i for i, m in enumerate(vocab)}
+    mask = 0
+    for m in _muscle_list(key):
+        if m in bit:
+            mask |= 1 << bit[m]
+    return mask
+
+
+def muscle_vocabulary(groups: pd.Series) -> List[str]:
+    """Sorted set of muscles named anywhere in `groups` (JSON strings or lists)."""
+    keys = pd.unique(groups.map(_muscle_key).dropna())
+    return sorted({m for k in keys for m in _muscle_list(k)})
+
+
+def muscle_masks(groups: pd.Series, all_muscles: Iterable[str]) -> np.ndarray:
+    """uint64 bitmask per row over `all_muscles` (0 when nothing is trained)."""
+    vocab = tuple(all_muscles)
+    if len(vocab) > 64:
+        raise ValueError(f"{len(vocab)} muscles do not fit a 64-bit mask")
+    codes, uniques = pd.factorize(groups.map(_muscle_key))
+    table = np.fromiter((_session_mask(vocab, k) for k in uniques), dtype=np.uint64, count=len(uniques))
+    return np.append(table, np.uint64(0))[codes]      # code -1 (missing) → last slot → 0
+
+
+def expand_muscles(masks: np.ndarray, n_muscles: int) -> np.ndarray:
+    """(rows,) bitmasks → (rows, n_muscles) 0/1 flags."""
+    shifts = np.arange(n_muscles, dtype=np.uint64)
+    return ((masks[:, None] >> shifts) & np.uint64(1)).astype(np.int64)
+
+
+# ── stage 1: raw rows → dataset rows ─────────────────────────────────────────
+
+def dataset_rows(raw: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normalise raw joined rows (LOG_COLUMNS + USER_COLUMNS + SPLIT_COLUMNS,
+    missing ones allowed) into DATASET_COLUMNS.
+    """
+    raw = raw.reindex(columns=list(dict.fromkeys(list(raw.columns) + LOG_COLUMNS + USER_COLUMNS + SPLIT_COLUMNS)))
+    out = pd.DataFrame(index=raw.index)
+    out["user_id"] = raw["user_id"]
+    out["date"] = pd.to_datetime(raw["date"])
+
+    out["sleep_h"] = sleep_hours(raw["sleep_start"], raw["sleep_end"])
+    for c in ("sleep_quality", "resting_hr", "hrv", "total_sets", "failure_sets", "total_rir",
+              "stress", "motivation", "soreness", "water_intake_l", "recovery_rating"):
+        out[c] = _num(raw[c])
+    out["trained"] = _num(raw["trained"]).fillna(0).astype(bool).astype(int)
+
+    maint = _num(raw["maintenance_calories"]).replace(0, np.nan).fillna(DEFAULT_MAINTENANCE_KCAL)
+    out["cal_deficit_pct"] = (_num(raw["calories"]) - maint) / maint
+
+    # macro % of target; NaN when nothing was logged or there is no target
+    macros, targets = _dict_col(raw["macros"]), _dict_col(raw["macro_targets"])
+    for k in MACROS:
+        actual = _num(macros.str.get(k)).replace(0, np.nan)
+        target = _num(targets.str.get(k)).replace(0, np.nan)
+        out[f"{k}_pct"] = actual / target * 100
+
+    out["split_type"] = raw["split_type"].astype(object).where(raw["split_type"].notna(), "")
+    codes, uniques = pd.factorize(raw["muscle_groups"].map(_muscle_key))
+    normalised = np.array([json.dumps(_muscle_list(k)) for k in uniques] + ["[]"], dtype=object)
+    out["muscle_groups"] = normalised[codes]
+
+    for c in ("age", "height", "weight"):
+        out[c] = _num(raw[c])
+    for c in ("sex", "goal", "activity_level"):
+        out[c] = raw[c]
+    return out[DATASET_COLUMNS]
+
+
+# ── stage 2: dataset rows → model inputs ─────────────────────────────────────
+
+def model_features(rows: pd.DataFrame, all_muscles: Iterable[str]) -> pd.DataFrame:
+    """
+    Add rolling, calendar and muscle-flag features.  Rolling means run over
+    each user's previous ROLL_WINDOW logged rows (by date), so callers must
+    pass those rows along with the ones they want scored.  Row order and
+    index are preserved.
+    """
+    all_muscles = list(all_muscles)
+    df = rows.copy()
+    df["date"] = pd.to_datetime(df["date"])
+
+    order = df.sort_values(["user_id", "date"], kind="stable").index
+    srt = df.loc[order]
+    g = srt.groupby("user_id", sort=False)
+    for src, name in zip(ROLL_SOURCES, ROLL_FEATS):
+        rolled = g[src].transform(lambda x: _num(x).rolling(ROLL_WINDOW, min_periods=1).mean())
+        df[name] = rolled.reindex(df.index)
+
+    dow = df["date"].dt.dayofweek
+    moy = df["date"].dt.month - 1
+    df["dow_sin"] = np.sin(2 * np.pi * dow / 7)
+    df["dow_cos"] = np.cos(2 * np.pi * dow / 7)
+    df["moy_sin"] = np.sin(2 * np.pi * moy / 12)
+    df["moy_cos"] = np.cos(2 * np.pi * moy / 12)
+
+    flags = expand_muscles(muscle_masks(df["muscle_groups"], all_muscles), len(all_muscles))
+    df = pd.concat([df.drop(columns=[m for m in all_muscles if m in df]),
+                    pd.DataFrame(flags, index=df.index, columns=all_muscles)], axis=1)
+
+    for c in CAT_FEATS:
+        df[c] = df[c].astype(object).where(df[c].notna(), "")
+    return df
+
+
+def model_input(features: pd.DataFrame, in_cols: Iterable[str]) -> pd.DataFrame:
+    """Columns in the order the fitted preprocessor expects (absent → NaN)."""
+    return features.reindex(columns=list(in_cols))
+
+
+def features_for_day(history: pd.DataFrame, all_muscles: Iterable[str]) -> pd.DataFrame:
+    """
+    Serving entry point: `history` holds one user's raw rows up to and
+    including the scored day (at least the last ROLL_WINDOW logs).  Returns
+    the scored day's feature row as a 1-row frame.
+    """
+    feats = model_features(dataset_rows(history), all_muscles)
+    last = feats["date"].idxmax()
+    return feats.loc[[last]]
+
+
+def log_history(logs: Iterable, user, scored_day=None, split_type: str = "",
+                muscle_groups: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Raw rows for features_for_day() / dataset_rows() from DailyLog and User
+    objects, as the recovery router builds them.  Split info is attached to
+    the log of `scored_day` only; earlier logs feed nothing but the rolling
+    means.
+    """
+    user_attrs = {c: getattr(user, c) for c in USER_COLUMNS}
+    return pd.DataFrame([
+        {
+            **{c: getattr(l, c) for c in LOG_COLUMNS},
+            **user_attrs,
+            "split_type":    split_type if l.date == scored_day else "",
+            "muscle_groups": muscle_groups if l.date == scored_day else [],
+        }
+        for l in logs
+    ], columns=LOG_COLUMNS + USER_COLUMNS + SPLIT_COLUMNS)
@@ -0,0 +1,270 @@
+# app/utils/heads.py
+"""
+Per-user calibration heads:  personal = slope · raw + bias.
+
+Each user's head is a ridge fit of their logged `recovery_rating` on the
+global model's raw score, shrunk toward the global model (slope 1, bias 0):
+
+    e = rating − raw ≈ α · (raw − c) + β          slope = 1 + α
+    minimise Σ (e − α(raw − c) − β)² + λα·α² + λβ·β²    bias  = β − α·c
+
+with c the global mean rating and λα = K_SLOPE · scale², λβ = K_BIAS, so a
+user needs roughly K_BIAS ratings before their offset counts fully, and
+more before their slope moves.  The fit only needs five running sums per
+user (n, Σraw, Σraw², Σe, Σraw·e), which is what makes both paths cheap:
+
+  fit_heads()      nightly, every user at once with grouped NumPy sums
+  observe_rating() online, whenever a rating is logged for a scored day
+
+A head only makes sense for the model whose raw scores it was fitted on,
+so heads are keyed by (user_id, model_version): the nightly upsert writes
+the new version's heads next to the old ones, and a worker reads the heads
+of the version it serves until it loads the new model.  Rows with
+model_version '' predate versioning and are used for users the served
+version has no head for yet.
+
+Serving reads heads through `cache` (HeadCache), not one query per
+prediction.
+"""
+import os
+import threading
+import time
+from datetime import date
+from typing import Dict, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+
+K_BIAS  = float(os.getenv("RECOVERY_HEAD_K_BIAS", "5"))
+K_SLOPE = float(os.getenv("RECOVERY_HEAD_K_SLOPE", "20"))
+CACHE_CHECK_S = float(os.getenv("RECOVERY_HEAD_CACHE_CHECK", "300"))
+STATS = ("n", "sum_r", "sum_rr", "sum_e", "sum_re")
+LEGACY_VERSION = ""                  # heads written before they were keyed by model version
+
+
+def solve(n, sum_r, sum_rr, sum_e, sum_re, center: float, scale: float):
+    """Vectorised 2×2 ridge solve → (slope, bias) arrays."""
+    n, sum_r, sum_rr, sum_e, sum_re = (np.asarray(a, dtype=float) for a in (n, sum_r, sum_rr, sum_e, sum_re))
+    # centre raw on c: Σc, Σc², Σc·e from the uncentred sums
+    s_c = sum_r - n * center
+    s_cc = sum_rr - 2 * center * sum_r + n * center ** 2
+    s_ce = sum_re - center * sum_e
+
+    a00 = s_cc + K_SLOPE * scale ** 2
+    a11 = n + K_BIAS
+    det = a00 * a11 - s_c ** 2            # > 0: both priors are strictly positive
+    alpha = (s_ce * a11 - s_c * sum_e) / det
+    beta = (a00 * sum_e - s_c * s_ce) / det
+    return 1.0 + alpha, beta - alpha * center
+
+
+def fit_heads(user_ids, raw, rating, center: float, scale: float) -> pd.DataFrame:
+    """
+    One head per user from aligned arrays of (user, raw score, rating),
+    computed with bincount group sums — no per-user Python loop.
+    """
+    raw = np.asarray(raw, dtype=float)
+    e = np.asarray(rating, dtype=float) - raw
+    codes, users = pd.factorize(np.asarray(user_ids))
+    k = len(users)
+    sums = {
+        "n":      np.bincount(codes, minlength=k).astype(float),
+        "sum_r":  np.bincount(codes, weights=raw, minlength=k),
+        "sum_rr": np.bincount(codes, weights=raw * raw, minlength=k),
+        "sum_e":  np.bincount(codes, weights=e, minlength=k),
+        "sum_re": np.bincount(codes, weights=raw * e, minlength=k),
+    }
+    slope, bias = solve(*(sums[s] for s in STATS), center=center, scale=scale)
+    return pd.DataFrame({"user_id": users, "bias": bias, "slope": slope, **sums})
+
+
+class HeadUpdate(NamedTuple):
+    """A head observe_rating() changed; cache.put(user_id, *update) once committed."""
+    slope: float
+    bias: float
+    version: str
+
+
+def observe_rating(db: Session, user_id: str, day: date, rating: Optional[float]) -> Optional[HeadUpdate]:
+    """
+    Fold a newly logged (or edited) rating for `day` into the user's head.
+
+    Needs the raw score stored with that day's prediction; the pair goes
+    into the head of the model version that produced it (the legacy head
+    for predictions stored before versions were).  The (raw, rating)
+    pair folded in is remembered on the prediction, so editing a rating
+    swaps the old pair out instead of counting the day twice.  Days the
+    nightly fit already covered (≤ fitted_through) are left to it, and so
+    are heads with a learned (slope, bias) but no sums yet.
+
+    Does not commit and does not touch the cache: returns the new head (or
+    None when nothing changed) for the caller to put() into `cache` after
+    its commit succeeds, so a rolled-back update is never served.
+    """
+    from app.models import RecoveryPrediction, UserRecoveryHead
+    from app.utils.context import GLOBAL_MEAN, Y_STD
+
+    pred = db.get(RecoveryPrediction, (user_id, day))
+    if pred is None or pred.raw_score is None:
+        return None
+    version = pred.model_version or LEGACY_VERSION
+    head = db.get(UserRecoveryHead, (user_id, version))
+    if head is None:
+        head = UserRecoveryHead(user_id=user_id, model_version=version, slope=1.0, bias=0.0,
+                                **{s: 0.0 for s in STATS})
+        db.add(head)
+    if head.fitted_through is not None and day <= head.fitted_through:
+        return None
+    if head.fitted_through is None and not head.n and (head.slope, head.bias) != (1.0, 0.0):
+        # fitted before the running sums existed (migration 4b8e1f0c6d27): re-solving
+        # from this one rating would discard the learned head; wait for the nightly fit
+        return None
+
+    def add(sign: float, r: float, y: float):
+        e = y - r
+        head.n += sign
+        head.sum_r += sign * r
+        head.sum_rr += sign * r * r
+        head.sum_e += sign * e
+        head.sum_re += sign * r * e
+
+    if pred.calib_raw is not None and pred.calib_rating is not None:
+        add(-1.0, pred.calib_raw, pred.calib_rating)
+    if rating is not None:
+        add(+1.0, pred.raw_score, float(rating))
+        pred.calib_raw, pred.calib_rating = pred.raw_score, float(rating)
+    else:
+        pred.calib_raw = pred.calib_rating = None
+
+    slope, bias = solve(*(getattr(head, s) for s in STATS), center=GLOBAL_MEAN, scale=Y_STD)
+    head.slope, head.bias = float(slope), float(bias)
+    return HeadUpdate(head.slope, head.bias, version)
+
+
+def rescored(version: str) -> dict:
+    """
+    ON CONFLICT updates for a prediction re-scored by `version`.  The
+    (raw, rating) pair already folded in belongs to the head of the version
+    that stored it, so it is dropped when another version takes the day
+    over; observe_rating() then folds the next rating into the new head.
+    """
+    from sqlalchemy import case
+    from app.models import RecoveryPrediction as P
+    same = P.model_version == version
+    return {
+        "model_version": version,
+        "calib_raw": case((same, P.calib_raw), else_=None),
+        "calib_rating": case((same, P.calib_rating), else_=None),
+    }
+
+
+class HeadCache:
+    """
+    Every user's (slope, bias) in two float32 arrays plus an id → row index.
+
+    Holds the heads of one model version (`version`, set by
+    app/utils/context.py to the version it serves), falling back to the
+    legacy row per user.  Loaded with one query on first use.  Heads
+    written by another process (the nightly upsert, other workers' online
+    updates) are noticed by a cheap count / max(updated_at) /
+    max(fitted_through) / sum(n) probe over those rows, run at most every
+    CACHE_CHECK_S seconds, which reloads the arrays when it changes.
+    Online updates in this process are applied in place via put().
+    """
+
+    def __init__(self, version: str = LEGACY_VERSION):
+        self.version = version
+        self._lock = threading.Lock()
+        self._index: Dict[str, int] = {}
+        self._versioned: Set[str] = set()    # users whose row is `version`'s, not the legacy one
+        self._slope = np.empty(0, dtype=np.float32)
+        self._bias = np.empty(0, dtype=np.float32)
+        self._size = 0
+        self._stamp = None           # _probe() at load
+        self._checked_at = 0.0
+
+    def __len__(self):
+        return self._size
+
+    def use_version(self, version: str):
+        """Serve `version`'s heads from now on; reloads on the next get() if it changed."""
+        if version != self.version:
+            self.version = version
+            self.clear()
+
+    def _versions(self):
+        from app.models import UserRecoveryHead
+        return UserRecoveryHead.model_version.in_({self.version, LEGACY_VERSION})
+
+    def _probe(self, db: Session):
+        from sqlalchemy import func, select
+        from app.models import UserRecoveryHead
+        # updated_at alone is not enough: writers outside the ORM may not set it
+        H = UserRecoveryHead
+        return tuple(db.execute(
+            select(func.count(), func.max(H.updated_at), func.max(H.fitted_through), func.sum(H.n))
+            .where(self._versions())
+        ).one())
+
+    def load(self, db: Session):
+        from sqlalchemy import select
+        from app.models import UserRecoveryHead
+        H = UserRecoveryHead
+        stamp = self._probe(db)
+        # legacy rows first, so the served version's head wins where both exist
+        rows = db.execute(
+            select(H.user_id, H.slope, H.bias, H.model_version).where(self._versions())
+            .order_by(H.model_version != LEGACY_VERSION)
+        ).all()
+        heads = {uid: (s, b) for uid, s, b, _ in rows}
+        versioned = {uid for uid, _, _, v in rows if v == self.version}
+        index = {uid: i for i, uid in enumerate(heads)}
+        slope = np.fromiter((h[0] for h in heads.values()), dtype=np.float32, count=len(heads))
+        bias = np.fromiter((h[1] for h in heads.values()), dtype=np.float32, count=len(heads))
+        with self._lock:
+            self._index, self._slope, self._bias, self._size = index, slope, bias, len(heads)
+            self._versioned = versioned
+            self._stamp, self._checked_at = stamp, time.monotonic()
+
+    def _fresh(self, db: Session):
+        if self._stamp is None:
+            self.load(db)
+        elif time.monotonic() - self._checked_at > CACHE_CHECK_S:
+            self._checked_at = time.monotonic()
+            if self._probe(db) != self._stamp:
+                self.load(db)
+
+    def get(self, db: Session, user_id: str) -> Optional[Tuple[float, float]]:
+        self._fresh(db)
+        with self._lock:
+            i = self._index.get(user_id)
+            if i is None:
+                return None
+            return float(self._slope[i]), float(self._bias[i])
+
+    def put(self, user_id: str, slope: float, bias: float, version: str):
+        with self._lock:
+            if self._stamp is None:
+                return                      # not loaded yet; the first get() will read it
+            if version == self.version:
+                self._versioned.add(user_id)
+            elif version != LEGACY_VERSION or user_id in self._versioned:
+                return                      # a head this cache does not serve
+            i = self._index.get(user_id)
+            if i is None:
+                i = self._size
+                if i == len(self._slope):   # grow geometrically
+                    cap = max(16, 2 * i)
+                    self._slope = np.resize(self._slope, cap)
+                    self._bias = np.resize(self._bias, cap)
+                self._index[user_id] = i
+                self._size += 1
+            self._slope[i], self._bias[i] = slope, bias
+
+    def clear(self):
+        with self._lock:
+            self._index, self._versioned, self._size, self._stamp = {}, set(), 0, None
+
+
+cache = HeadCache()
@@ -0,0 +1,90 @@
+# app/utils/history_cache.py
+"""
+Per-user, in-process cache for /recovery/history windows.
+
+Scores only change when a prediction is upserted, so each (user, since, until)
+window is cached together with an ETag computed from its rows.  Writers call
+`invalidate(user_id)` after upserting a prediction, which drops every cached
+window for that user.
+
+The cache lives in the worker process.  Writes made by another uvicorn worker
+or by an offline job (e.g. scripts/rescore_recovery.py) are picked up once the
+entry's TTL expires — set RECOVERY_HISTORY_CACHE_TTL (seconds) to tune it.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import List, Optional, Tuple
+
+TTL_S        = float(os.getenv("RECOVERY_HISTORY_CACHE_TTL", "60"))
+MAX_USERS    = int(os.getenv("RECOVERY_HISTORY_CACHE_USERS", "10000"))
+MAX_WINDOWS  = 8   # per user: calendar month, trends range, dashboard …
+
+Window = Tuple[date, date]
+Entry  = Tuple[str, List[dict], float]   # (etag, rows, stored_at)
+
+_lock = threading.Lock()
+_users: "OrderedDict[str, OrderedDict[Window, Entry]]" = OrderedDict()
+
+
+def make_etag(rows: List[dict]) -> str:
+    payload = json.dumps(rows, default=str, separators=(",", ":")).encode()
+    return '"' + hashlib.sha1(payload).hexdigest() + '"'
+
+
+def get(user_id: str, window: Window) -> Optional[Tuple[str, List[dict]]]:
+    with _lock:
+        windows = _users.get(user_id)
+        if not windows or window not in windows:
+            return None
+        etag, rows, stored_at = windows[window]
+        if time.monotonic() - stored_at > TTL_S:
+            del windows[window]
+            return None
+        _users.move_to_end(user_id)
+        windows.move_to_end(window)
+        return etag, rows
+
+
+def put(user_id: str, window: Window, rows: List[dict]) -> str:
+    etag = make_etag(rows)
+    with _lock:
+        windows = _users.setdefault(user_id, OrderedDict())
+        windows[window] = (etag, rows, time.monotonic())
+        windows.move_to_end(window)
+        while len(windows) > MAX_WINDOWS:
+            windows.popitem(last=False)
+        _users.move_to_end(user_id)
+        while len(_users) > MAX_USERS:
+            _users.popitem(last=False)
+    return etag
+
+
+def invalidate(user_id: str, day: Optional[date] = None) -> None:
+    """
+    Drop cached windows for `user_id`.  When `day` is given only windows that
+    contain it are dropped; otherwise every window for the user goes.
+    """
+    with _lock:
+        windows = _users.get(user_id)
+        if not windows:
+            return
+        if day is None:
+            del _users[user_id]
+            return
+        for w in [w for w in windows if w[0] <= day <= w[1]]:
+            del windows[w]
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return etag in tags
+
@@ -0,0 +1,116 @@
+# app/utils/inference.py
+"""
+CPU concurrency for recovery-model inference, applied once per worker
+process before the model is loaded (app/utils/context.py calls configure()).
+
+A forward pass of the 32-hidden MLP is a few microseconds of work, far too
+small to split across threads.  With torch's defaults every uvicorn worker
+starts an intra-op pool as wide as the machine, so N workers on N cores run
+N² spinning threads that mostly context-switch.  Defaults here: one intra-op
+and one inter-op thread per worker; concurrency comes from the workers.
+
+    RECOVERY_TORCH_THREADS          intra-op threads per worker (default 1;
+                                    0 = leave torch's default)
+    RECOVERY_TORCH_INTEROP_THREADS  inter-op threads per worker (default 1;
+                                    0 = leave torch's default)
+    RECOVERY_CPU_AFFINITY           unset / "off": no pinning
+                                    "auto": split the CPUs this process may
+                                      use into slots of
+                                      RECOVERY_CPUS_PER_WORKER cores; each
+                                      worker claims a free slot (a lock file
+                                      per slot, held for the worker's life)
+                                    "0-3,8": pin to exactly these CPUs
+    RECOVERY_CPUS_PER_WORKER        slot width for "auto" (default: the
+                                    intra-op thread count)
+
+Pinning is Linux-only (os.sched_setaffinity) and is skipped elsewhere.  When
+every slot is taken (more workers than slots) the worker runs unpinned.
+"""
+import fcntl
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import List, Optional
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+INTRA = int(os.getenv("RECOVERY_TORCH_THREADS", "1"))
+INTER = int(os.getenv("RECOVERY_TORCH_INTEROP_THREADS", "1"))
+AFFINITY = os.getenv("RECOVERY_CPU_AFFINITY", "").strip().lower()
+CPUS_PER_WORKER = int(os.getenv("RECOVERY_CPUS_PER_WORKER", "0")) or max(INTRA, 1)
+SLOT_DIR = Path(os.getenv("RECOVERY_CPU_SLOT_DIR", tempfile.gettempdir()))
+
+_configured = False
+_slot_fd: Optional[int] = None           # open for the process lifetime: the lock is the claim
+
+
+def parse_cpus(spec: str) -> List[int]:
+    """'0-3,8' → [0, 1, 2, 3, 8]"""
+    cpus = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        lo, _, hi = part.partition("-")
+        cpus.update(range(int(lo), int(hi or lo) + 1))
+    return sorted(cpus)
+
+
+def set_threads(intra: int, inter: int):
+    """torch CPU thread pools; inter-op can only be set before any parallel work runs."""
+    if intra > 0:
+        torch.set_num_threads(intra)
+    if inter > 0 and torch.get_num_interop_threads() != inter:
+        try:
+            torch.set_num_interop_threads(inter)
+        except RuntimeError:
+            logger.warning("inter-op threads already started; keeping %d", torch.get_num_interop_threads())
+
+
+def claim_slot(cpus: List[int], width: int) -> Optional[List[int]]:
+    """First free `width`-core slot of `cpus`, held by a lock file until this process exits."""
+    global _slot_fd
+    slots = [cpus[i:i + width] for i in range(0, len(cpus) - width + 1, width)]
+    for i, slot in enumerate(slots):
+        fd = os.open(SLOT_DIR / f"recovery-cpu-slot-{i}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            continue
+        _slot_fd = fd
+        return slot
+    return None
+
+
+def pin(cpus: List[int]) -> bool:
+    if not hasattr(os, "sched_setaffinity"):
+        return False
+    os.sched_setaffinity(0, cpus)
+    return True
+
+
+def configure():
+    """Apply the settings above to this process; later calls are no-ops."""
+    global _configured
+    if _configured:
+        return
+    _configured = True
+
+    set_threads(INTRA, INTER)
+
+    pinned = None
+    if AFFINITY and AFFINITY != "off" and hasattr(os, "sched_getaffinity"):
+        if AFFINITY == "auto":
+            pinned = claim_slot(sorted(os.sched_getaffinity(0)), CPUS_PER_WORKER)
+            if pinned is None:
+                logger.warning("no free %d-CPU slot; running unpinned", CPUS_PER_WORKER)
+        else:
+            pinned = parse_cpus(AFFINITY)
+        if pinned and not pin(pinned):
+            pinned = None
+    logger.info("torch threads: intra %d, inter-op %d; cpus %s",
+                torch.get_num_threads(), torch.get_num_interop_threads(), pinned or "unpinned")
@@ -0,0 +1,119 @@
+# app/utils/onnx_model.py
+"""
+The recovery model as one ONNX graph: fitted ColumnTransformer (via
+sklearn-onnx) → MLP (torch.onnx) → 0–100 scale, so serving makes a single
+ONNX Runtime call per batch instead of pandas → sklearn → torch.
+
+    inputs   one [N, 1] tensor per raw feature column, named like the
+             preprocessor's feature_names_in_: float for numeric columns
+             (NaN = missing), string for categorical ones
+    output   "recovery": [N] raw global score
+
+The one-hot encoder's fitted NaN category is renamed to MISSING_CATEGORY;
+OnnxPredictor feeds NaN as that string and None as "" (unknown), which is
+what OneHotEncoder does with them.
+
+Exporting needs onnx, skl2onnx and torch; serving needs onnxruntime only.
+The graph is float32 whatever RECOVERY_PRECISION says.
+"""
+import copy
+import io
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+ONNX_FILE = "recovery_model.onnx"
+OUTPUT = "recovery"
+MISSING_CATEGORY = "__missing__"
+
+
+def _is_nan(v) -> bool:
+    return isinstance(v, float) and np.isnan(v)
+
+
+def export_onnx(path: Path, preproc, mlp, y_mean: float, y_std: float):
+    """Write preprocessor + MLP (an nn.Module) + target scaling as one ONNX model."""
+    import onnx
+    import torch
+    from skl2onnx import convert_sklearn
+    from skl2onnx.common.data_types import FloatTensorType, StringTensorType
+    from torch import nn
+
+    num_cols, cat_cols = list(preproc.transformers_[0][2]), list(preproc.transformers_[1][2])
+    pre = copy.deepcopy(preproc)
+    enc = pre.named_transformers_["cat"]
+    enc.categories_ = [
+        np.array([MISSING_CATEGORY if _is_nan(c) else c for c in cats], dtype=object)
+        for cats in enc.categories_
+    ]
+    types = ([(c, FloatTensorType([None, 1])) for c in num_cols]
+             + [(c, StringTensorType([None, 1])) for c in cat_cols])
+    pre_onnx = convert_sklearn(pre, initial_types=types)
+    opset = next(o.version for o in pre_onnx.opset_import if o.domain in ("", "ai.onnx"))
+
+    class Scored(nn.Module):
+        def __init__(self, mlp):
+            super().__init__()
+            self.mlp = mlp
+
+        def forward(self, x):
+            return self.mlp(x) * float(y_std) + float(y_mean)
+
+    mlp = copy.deepcopy(mlp).float().cpu()
+    buf = io.BytesIO()
+    torch.onnx.export(
+        Scored(mlp).eval(), torch.zeros(1, mlp.net[0].in_features), buf,
+        input_names=["x"], output_names=[OUTPUT],
+        dynamic_axes={"x": {0: "n"}, OUTPUT: {0: "n"}},
+        opset_version=opset, dynamo=False,
+    )
+    mlp_onnx = onnx.compose.add_prefix(onnx.load_from_string(buf.getvalue()), "mlp_")
+    # merge_models wants matching IR versions; both graphs only use ops valid in the newer one
+    pre_onnx.ir_version = mlp_onnx.ir_version = max(pre_onnx.ir_version, mlp_onnx.ir_version)
+    model = onnx.compose.merge_models(
+        pre_onnx, mlp_onnx, io_map=[(pre_onnx.graph.output[0].name, "mlp_x")],
+    )
+    for node in model.graph.node:
+        node.output[:] = [OUTPUT if o == "mlp_" + OUTPUT else o for o in node.output]
+    model.graph.output[0].name = OUTPUT
+    onnx.checker.check_model(model)
+
+    path = Path(path)
+    tmp = path.with_suffix(".tmp")
+    onnx.save(model, str(tmp))
+    tmp.replace(path)
+
+
+class OnnxPredictor:
+    """One ONNX Runtime session over an exported graph; predict() takes the model-input frame."""
+
+    def __init__(self, path: Path, intra_threads: int = 1):
+        import onnxruntime as ort
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        if intra_threads > 0:
+            opts.intra_op_num_threads = intra_threads
+        opts.inter_op_num_threads = 1
+        self.path = Path(path)
+        self.session = ort.InferenceSession(str(self.path), opts, providers=["CPUExecutionProvider"])
+        self._inputs = [(i.name, i.type == "tensor(string)") for i in self.session.get_inputs()]
+
+    def _feeds(self, df: pd.DataFrame) -> Dict[str, np.ndarray]:
+        feeds = {}
+        for name, is_cat in self._inputs:
+            if is_cat:
+                values = df[name].to_numpy(dtype=object)
+                col = np.array(["" if v is None else MISSING_CATEGORY if _is_nan(v) else str(v)
+                                for v in values], dtype=object)
+            else:
+                col = df[name].to_numpy(dtype=np.float32, na_value=np.nan)
+            feeds[name] = col.reshape(-1, 1)
+        return feeds
+
+    def predict(self, df: pd.DataFrame) -> np.ndarray:
+        (out,) = self.session.run([OUTPUT], self._feeds(df))
+        return out.reshape(-1).astype(np.float64)
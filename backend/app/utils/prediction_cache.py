@@ -0,0 +1,93 @@
+# app/utils/prediction_cache.py
+"""
+In-process cache for /recovery/predict results.
+
+Two LRU maps:
+
+  scores   (model version, feature hash) → raw score
+           The global model is a pure function of its input row, so an
+           unchanged row — same user re-scored, or any identical vector —
+           skips the preprocessor and the MLP.
+  written  (user, date) → (model version, feature hash, score) last upserted
+           by this worker.  When a request would write exactly that again
+           the recovery_predictions upsert (and its commit) is skipped.
+
+The score written still goes through the user's head, so a head update
+changes the score and the write happens.  Entries in `written` expire after
+RECOVERY_PREDICTION_CACHE_TTL seconds so rows changed by other workers or
+offline jobs (scripts/rescore_recovery.py) are eventually rewritten.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Optional, Tuple
+
+import pandas as pd
+
+MAX_SCORES  = int(os.getenv("RECOVERY_PREDICTION_CACHE_SIZE", "50000"))
+MAX_WRITTEN = int(os.getenv("RECOVERY_PREDICTION_CACHE_WRITTEN", "50000"))
+TTL_S       = float(os.getenv("RECOVERY_PREDICTION_CACHE_TTL", "600"))
+
+Key = Tuple[str, str]                      # (model version, feature hash)
+
+_lock = threading.Lock()
+_scores: "OrderedDict[Key, float]" = OrderedDict()
+_written: "OrderedDict[Tuple[str, date], Tuple[Key, float, float]]" = OrderedDict()
+hits = misses = 0
+
+
+def key(model_version: str, X: pd.DataFrame) -> Key:
+    """Hash of the assembled model input: column names, then values (NaN-stable)."""
+    h = hashlib.sha1("\x1f".join(map(str, X.columns)).encode())
+    h.update(pd.util.hash_pandas_object(X, index=False).to_numpy().tobytes())
+    return model_version, h.hexdigest()
+
+
+def get(k: Key) -> Optional[float]:
+    global hits, misses
+    with _lock:
+        raw = _scores.get(k)
+        if raw is None:
+            misses += 1
+            return None
+        hits += 1
+        _scores.move_to_end(k)
+        return raw
+
+
+def put(k: Key, raw: float) -> None:
+    with _lock:
+        _scores[k] = raw
+        _scores.move_to_end(k)
+        while len(_scores) > MAX_SCORES:
+            _scores.popitem(last=False)
+
+
+def already_written(user_id: str, day: date, k: Key, score: float) -> bool:
+    with _lock:
+        entry = _written.get((user_id, day))
+        if entry is None:
+            return False
+        wk, wscore, stored_at = entry
+        if time.monotonic() - stored_at > TTL_S:
+            del _written[(user_id, day)]
+            return False
+        return wk == k and wscore == score
+
+
+def mark_written(user_id: str, day: date, k: Key, score: float) -> None:
+    with _lock:
+        _written[(user_id, day)] = (k, score, time.monotonic())
+        _written.move_to_end((user_id, day))
+        while len(_written) > MAX_WRITTEN:
+            _written.popitem(last=False)
+
+
+def forget(user_id: str) -> None:
+    """Drop the write records for a user whose predictions were deleted."""
+    with _lock:
+        for uk in [uk for uk in _written if uk[0] == user_id]:
+            del _written[uk]
@@ -0,0 +1,2 @@
+# backend/conftest.py
+# puts backend/ on sys.path so tests can import the app package
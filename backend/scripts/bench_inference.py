@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# backend/scripts/bench_inference.py
+"""
+Throughput of the recovery MLP's forward pass under different worker /
+thread / pinning layouts — the knobs app/utils/inference.py reads from the
+environment (RECOVERY_TORCH_THREADS, RECOVERY_TORCH_INTEROP_THREADS,
+RECOVERY_CPU_AFFINITY).
+
+Each configuration starts --workers processes (like uvicorn workers), each
+with the given intra-op thread count, optionally pinned to its own slice of
+the CPUs, and runs single-request forward passes for --seconds.  Prints
+aggregate requests/s and per-pass latency percentiles.
+
+    python scripts/bench_inference.py                          # default grid
+    python scripts/bench_inference.py --workers 1,4 --threads 1,4 --seconds 5
+    python scripts/bench_inference.py --batch 14               # /recovery/forecast-sized batches
+
+Weights come from the serving model in --model (bundle or legacy .pt);
+without one, a randomly initialised MLP of --in-dim × --hidden is used.
+"""
+import sys
+from pathlib import Path
+
+# allow imports from project root
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import argparse
+import multiprocessing as mp
+import os
+import time
+from itertools import product
+from typing import Dict, List, Optional
+
+import numpy as np
+import torch
+
+from app.utils.artifacts import artifact_path
+from app.utils.bundle import BUNDLE_FILE, load_bundle
+from app.utils.inference import pin, set_threads
+from recovery_training import MLP
+
+
+def load_state(model_dir: Path) -> Optional[Dict[str, torch.Tensor]]:
+    p = artifact_path(model_dir, BUNDLE_FILE)
+    if p is not None:
+        return {k: v.clone() for k, v in load_bundle(p).state_dict().items()}
+    p = artifact_path(model_dir, "recovery_mlp_with_user_bias.pt")
+    if p is not None:
+        return torch.load(p, map_location="cpu")
+    return None
+
+
+def run_worker(state, intra: int, cpus: Optional[List[int]], batch: int, seconds: float,
+               start, out):
+    set_threads(intra, 1)
+    if cpus:
+        pin(cpus)
+    hidden, in_dim = state["net.0.weight"].shape
+    model = MLP(in_dim, hidden)
+    model.load_state_dict(state)
+    model.eval()
+    x = torch.randn(batch, in_dim)
+
+    with torch.no_grad():
+        for _ in range(200):                       # warm-up
+            model(x)
+        start.wait()
+        lat = []
+        t_end = time.perf_counter() + seconds
+        while True:
+            t0 = time.perf_counter()
+            model(x)
+            t1 = time.perf_counter()
+            lat.append(t1 - t0)
+            if t1 >= t_end:
+                break
+    out.put(np.asarray(lat))
+
+
+def bench(state, workers: int, intra: int, pinned: bool, batch: int, seconds: float) -> dict:
+    ctx = mp.get_context("spawn")                  # fresh torch thread pools per worker
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else []
+    start, out = ctx.Barrier(workers), ctx.Queue()
+    procs = []
+    for i in range(workers):
+        slot = cpus[i * intra:(i + 1) * intra] if pinned else None
+        p = ctx.Process(target=run_worker, args=(state, intra, slot or None, batch, seconds, start, out))
+        p.start()
+        procs.append(p)
+    lat = np.concatenate([out.get() for _ in procs])
+    for p in procs:
+        p.join()
+    return {
+        "rps": len(lat) * batch / seconds,
+        "p50_us": np.percentile(lat, 50) * 1e6,
+        "p99_us": np.percentile(lat, 99) * 1e6,
+    }
+
+
+def int_list(s: str) -> List[int]:
+    return sorted({int(x) for x in s.split(",") if x.strip()})
+
+
+def main():
+    ncpu = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Recovery MLP inference throughput by thread layout")
+    parser.add_argument("--model", type=Path, default=Path("models/latest"))
+    parser.add_argument("--in-dim", type=int, default=64, help="without a model: input width")
+    parser.add_argument("--hidden", type=int, default=32, help="without a model: hidden width")
+    parser.add_argument("--workers", type=int_list, default=int_list(f"1,{ncpu}"))
+    parser.add_argument("--threads", type=int_list, default=int_list(f"1,2,{ncpu}"),
+                        help="intra-op threads per worker")
+    parser.add_argument("--batch", type=int, default=1)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--no-pinning", action="store_true", help="skip the pinned variants")
+    args = parser.parse_args()
+
+    state = load_state(args.model)
+    if state is None:
+        print(f"⚠️  no model in {args.model}; random {args.in_dim}×{args.hidden} MLP")
+        state = MLP(args.in_dim, args.hidden).state_dict()
+    hidden, in_dim = state["net.0.weight"].shape
+    print(f"🔧 MLP {in_dim}→{hidden}→1, batch {args.batch}, {ncpu} CPU(s), {args.seconds:.0f}s per config\n")
+
+    print(f"{'workers':>7} {'threads':>7} {'pinned':>6} {'req/s':>12} {'p50 µs':>9} {'p99 µs':>9}")
+    results = []
+    pin_opts = [False] if args.no_pinning or not hasattr(os, "sched_setaffinity") else [False, True]
+    for workers, intra, pinned in product(args.workers, args.threads, pin_opts):
+        if pinned and workers * intra > ncpu:
+            continue                               # not enough CPUs for disjoint slices
+        r = bench(state, workers, intra, pinned, args.batch, args.seconds)
+        results.append(((workers, intra, pinned), r))
+        print(f"{workers:>7} {intra:>7} {'yes' if pinned else 'no':>6} "
+              f"{r['rps']:>12,.0f} {r['p50_us']:>9.1f} {r['p99_us']:>9.1f}")
+
+    (workers, intra, pinned), r = max(results, key=lambda kv: kv[1]["rps"])
+    print(f"\n✅ best: {workers} worker(s) × {intra} thread(s){', pinned' if pinned else ''} "
+          f"→ {r['rps']:,.0f} req/s "
+          f"(RECOVERY_TORCH_THREADS={intra}{', RECOVERY_CPU_AFFINITY=auto' if pinned else ''})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# backend/scripts/check_feature_parity.py
+"""
+Check that the batch feature path (training, rescoring) and the per-day
+serving path (/recovery/predict) produce identical model inputs.
+
+Both go through app.utils.features; this guards against the two drifting
+again — e.g. a caller passing a shorter history than ROLL_WINDOW, or a new
+feature that depends on row order.
+
+  • built-in fixtures cover the awkward rows: sleep past midnight, missing
+    sleep, zero / missing maintenance calories, empty macros, no split
+  • --users N additionally samples N users from the database and compares
+    every logged day
+
+    python scripts/check_feature_parity.py --users 50
+
+Exits non-zero on the first mismatch so it can gate the nightly job.
+
+Both paths here start from the same joined frame; tests/test_feature_parity.py
+builds the serving side from DailyLog / User objects the way the router does.
+Neither covers which logs each side sees: the dataset store holds rated logs
+only, while serving rolls over the last ROLL_WINDOW logs of any kind.
+"""
+import sys
+from pathlib import Path
+
+# allow imports from project root
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from app.utils.features import (
+    LOG_COLUMNS, USER_COLUMNS, ROLL_WINDOW, CAT_FEATS,
+    dataset_rows, features_for_day, model_features, numeric_features,
+)
+
+MUSCLES = ["chest", "back", "legs"]
+
+FIXTURES = pd.DataFrame([
+    # user a: overnight sleep, split every other day, zero maintenance kcal
+    dict(user_id="a", date="2025-03-01", sleep_start="23:30", sleep_end="07:15", sleep_quality=4,
+         soreness=2, stress=3, calories=2100, macros={"protein": 150, "carbs": 0},
+         maintenance_calories=0, macro_targets={"protein": 140, "carbs": 250, "fat": 70},
+         split_type="PPL", muscle_groups=["chest"], trained=True, age=31, sex="male"),
+    dict(user_id="a", date="2025-03-02", sleep_start=None, sleep_end="07:00", sleep_quality=None,
+         soreness=None, stress=4, calories=None, macros=None,
+         maintenance_calories=0, macro_targets={"protein": 140},
+         split_type=None, muscle_groups=None, trained=None, age=31, sex="male"),
+    dict(user_id="a", date="2025-03-04", sleep_start="01:00", sleep_end="08:30", sleep_quality=5,
+         soreness=1, stress=None, calories=1800, macros={"protein": 120, "carbs": 200, "fat": 60},
+         maintenance_calories=0, macro_targets={"protein": 140, "carbs": 250, "fat": 70},
+         split_type="PPL", muscle_groups=["back", "legs"], trained=1, age=31, sex="male"),
+    dict(user_id="a", date="2025-03-05", sleep_start="22:00", sleep_end="06:00", sleep_quality=3,
+         soreness=4, stress=2, calories=2500, macros={},
+         maintenance_calories=0, macro_targets=None,
+         split_type="", muscle_groups='["legs"]', trained=0, age=31, sex="male"),
+    # user b: no user profile at all, a single log
+    dict(user_id="b", date="2025-03-03", sleep_start="7:05", sleep_end="7:05", sleep_quality=2,
+         soreness=3, stress=3, calories=1500, macros={"fat": "50"},
+         maintenance_calories=None, macro_targets={"fat": 0},
+         split_type=None, muscle_groups=[], trained=False),
+])
+
+
+def serving_frame(raw: pd.DataFrame, all_muscles) -> pd.DataFrame:
+    """Per-day path: what /recovery/predict builds for each logged day."""
+    out = []
+    for _, user_rows in raw.groupby("user_id", sort=False):
+        user_rows = user_rows.sort_values("date")
+        for i in range(len(user_rows)):
+            hist = user_rows.iloc[max(0, i + 1 - ROLL_WINDOW): i + 1]
+            out.append(features_for_day(hist, all_muscles))
+    return pd.concat(out)
+
+
+def compare(raw: pd.DataFrame, all_muscles, label: str) -> int:
+    raw = raw.reset_index(drop=True)
+    cols = numeric_features(all_muscles) + CAT_FEATS
+    batch = model_features(dataset_rows(raw), all_muscles)[cols]
+    serve = serving_frame(raw, all_muscles)[cols].reindex(batch.index)
+
+    num = numeric_features(all_muscles)
+    a, b = batch[num].to_numpy(float), serve[num].to_numpy(float)
+    bad_num = ~np.isclose(a, b, equal_nan=True, atol=1e-9)
+    bad_cat = (batch[CAT_FEATS].astype(str) != serve[CAT_FEATS].astype(str)).to_numpy()
+
+    rows, cidx = np.nonzero(np.hstack([bad_num, bad_cat]))
+    if len(rows):
+        r, c = rows[0], cols[cidx[0]]
+        print(f"❌ {label}: {len(set(rows))} row(s) differ — first at "
+              f"user={raw.loc[r, 'user_id']} date={raw.loc[r, 'date']} {c}: "
+              f"batch={batch.loc[r, c]!r} serving={serve.loc[r, c]!r}")
+        return 1
+    print(f"✅ {label}: {len(batch):,} row(s) identical across {len(cols)} feature(s)")
+    return 0
+
+
+def sample_db(n_users: int) -> pd.DataFrame:
+    from sqlalchemy import func, select
+    from app.database import SessionLocal
+    from app.models import DailyLog, SplitSession, SplitTemplate, User
+
+    db = SessionLocal()
+    try:
+        ids = db.execute(select(User.id).order_by(func.random()).limit(n_users)).scalars().all()
+        muscles = (
+            select(SplitSession.muscle_groups)
+            .where(SplitSession.template_id == DailyLog.split_template_id,
+                   SplitSession.name == DailyLog.split)
+            .limit(1)
+            .scalar_subquery()
+        )
+        q = (
+            select(
+                *[getattr(DailyLog, c) for c in LOG_COLUMNS],
+                *[getattr(User, c) for c in USER_COLUMNS],
+                SplitTemplate.type.label("split_type"),
+                muscles.label("muscle_groups"),
+            )
+            .join(User, User.id == DailyLog.user_id)
+            .outerjoin(SplitTemplate, SplitTemplate.id == DailyLog.split_template_id)
+            .where(DailyLog.user_id.in_(ids))
+            .order_by(DailyLog.user_id, DailyLog.date)
+        )
+        return pd.read_sql(q, db.bind)
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch vs. serving feature parity check")
+    parser.add_argument("--users", type=int, default=0, help="also compare N users sampled from the DB")
+    args = parser.parse_args()
+
+    failed = compare(FIXTURES, MUSCLES, "fixtures")
+    if args.users:
+        from app.utils.context import ALL_MUSCLES
+        failed |= compare(sample_db(args.users), ALL_MUSCLES, f"{args.users} sampled user(s)")
+    sys.exit(failed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# backend/scripts/compare_candidate.py
+"""
+Score the active and candidate models against the ratings users actually
+logged, from the pairs the API wrote to recovery_shadow_scores
+(app/utils/candidate.py).
+
+    python scripts/compare_candidate.py --candidate 2026-07-05
+    python scripts/compare_candidate.py --candidate 2026-07-05 --since 2026-07-06 --promote-if-better
+
+Raw (pre-head) scores are compared; both sides see the same users and days.
+"""
+import sys
+from pathlib import Path
+
+# allow imports from project root
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import argparse
+import subprocess
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+
+from app.database import SessionLocal
+from app.models import DailyLog, RecoveryShadowScore
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Active vs. candidate recovery model on live traffic")
+    parser.add_argument("--candidate", required=True, help="candidate version (RECOVERY_CANDIDATE)")
+    parser.add_argument("--since", type=date.fromisoformat, help="only days on/after YYYY-MM-DD")
+    parser.add_argument("--min-pairs", type=int, default=200, help="rated pairs needed before judging")
+    parser.add_argument("--promote-if-better", action="store_true",
+                        help="flip models/latest to the candidate when its MAE is lower")
+    args = parser.parse_args()
+
+    q = (
+        select(
+            RecoveryShadowScore.user_id, RecoveryShadowScore.date, RecoveryShadowScore.served,
+            RecoveryShadowScore.active_version, RecoveryShadowScore.active_raw,
+            RecoveryShadowScore.candidate_raw, DailyLog.recovery_rating,
+        )
+        .join(DailyLog, (DailyLog.user_id == RecoveryShadowScore.user_id)
+                        & (DailyLog.date == RecoveryShadowScore.date), isouter=True)
+        .where(RecoveryShadowScore.candidate_version == args.candidate)
+    )
+    if args.since:
+        q = q.where(RecoveryShadowScore.date >= args.since)
+    db = SessionLocal()
+    try:
+        df = pd.read_sql(q, db.bind)
+    finally:
+        db.close()
+    if df.empty:
+        sys.exit(f"❌ no pairs logged for candidate {args.candidate}")
+
+    diff = df["candidate_raw"] - df["active_raw"]
+    print(f"📊 {len(df):,} pair(s), {df['user_id'].nunique():,} user(s), "
+          f"active version(s): {', '.join(sorted(df['active_version'].unique()))}")
+    print(f"   candidate − active: mean {diff.mean():+.3f}, |Δ| p50 {diff.abs().median():.3f}, "
+          f"p95 {diff.abs().quantile(0.95):.3f}, corr {df['candidate_raw'].corr(df['active_raw']):.3f}")
+
+    rated = df.dropna(subset=["recovery_rating"])
+    if len(rated) < args.min_pairs:
+        print(f"⏳ only {len(rated)} rated pair(s) (< {args.min_pairs}), not judging yet")
+        return
+    y = rated["recovery_rating"].to_numpy(float)
+    mae_a = float(np.mean(np.abs(y - rated["active_raw"])))
+    mae_c = float(np.mean(np.abs(y - rated["candidate_raw"])))
+    print(f"   rated pairs {len(rated):,}: MAE active {mae_a:.3f}, candidate {mae_c:.3f} "
+          f"(Δ {mae_c - mae_a:+.3f})")
+    for served, g in rated.groupby("served"):
+        yy = g["recovery_rating"].to_numpy(float)
+        print(f"     served={served:<9} n={len(g):>5}  active {np.mean(np.abs(yy - g['active_raw'])):.3f}  "
+              f"candidate {np.mean(np.abs(yy - g['candidate_raw'])):.3f}")
+
+    if mae_c < mae_a:
+        print(f"✅ candidate {args.candidate} is better on live traffic")
+        if args.promote_if_better:
+            subprocess.run([sys.executable, str(Path(__file__).with_name("model_store.py")),
+                            "promote", args.candidate], check=True)
+    else:
+        print(f"❌ candidate {args.candidate} is not better; keep the active model")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+# backend/scripts/dataset_store.py
+"""
+Append-only, month-partitioned Parquet store for the recovery training set.
+
+    recovery_dataset/
+      manifest.json
+      month=2025-05/part-20250601T080000-3f2a.parquet
+      month=2025-06/part-…
+
+Every refresh writes one new part file per touched month instead of
+rewriting the whole dataset.  Rows are keyed by (user_id, date); when a key
+shows up again in a newer part, the newer row wins at read time.
+`manifest.json` records the parts per partition and the high-water mark
+(latest `date` ingested) that update_dataset.py resumes from.
+
+Used by update_dataset.py (writer) and train_recovery_lr.py (reader).
+"""
+import hashlib
+import json
+import os
+import sys
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+import pandas as pd
+
+# allow imports from project root
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from app.utils.features import DATASET_DTYPES
+
+STORE_DIR = Path("recovery_dataset")
+LEGACY_CSV = Path("recovery_dataset.csv")
+KEY = ["user_id", "date"]
+
+
+def _manifest_path(root: Path) -> Path:
+    return root / "manifest.json"
+
+
+def read_manifest(root: Path = STORE_DIR) -> dict:
+    p = _manifest_path(root)
+    if not p.exists():
+        return {"version": 1, "high_water_mark": None, "columns": None, "partitions": {}}
+    return json.loads(p.read_text())
+
+
+def _write_manifest(root: Path, manifest: dict):
+    p = _manifest_path(root)
+    tmp = p.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    os.replace(tmp, p)           # atomic: readers never see a half-written manifest
+
+
+def exists(root: Path = STORE_DIR) -> bool:
+    return _manifest_path(root).exists()
+
+
+def high_water_mark(root: Path = STORE_DIR) -> Optional[pd.Timestamp]:
+    hwm = read_manifest(root).get("high_water_mark")
+    return pd.Timestamp(hwm) if hwm else None
+
+
+def arrow_schema(df: pd.DataFrame):
+    """
+    Arrow schema for `df`: DATASET_DTYPES for the dataset's own columns,
+    inferred for anything else (e.g. extra columns of the legacy CSV).
+    Fixed up front so a batch whose column is all null, or holds only
+    whole numbers, does not give its part file a different type.
+    """
+    import pyarrow as pa
+    types = {"datetime64[ns]": pa.timestamp("ns"), "int64": pa.int64(),
+             "string": pa.string(), "float64": pa.float64()}
+    inferred = pa.Schema.from_pandas(df, preserve_index=False)
+    return pa.schema([
+        pa.field(c, types[DATASET_DTYPES[c]]) if c in DATASET_DTYPES else inferred.field(c)
+        for c in df.columns
+    ])
+
+
+def _write_part(df: pd.DataFrame, path: Path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    pq.write_table(pa.Table.from_pandas(df, schema=arrow_schema(df), preserve_index=False), path)
+
+
+def append(df: pd.DataFrame, root: Path = STORE_DIR) -> int:
+    """
+    Write `df` as new part files, one per month it touches, and advance the
+    high-water mark.  Returns the number of rows written.
+    """
+    if df.empty:
+        return 0
+    manifest = read_manifest(root)
+    df = df.copy()
+    df["date"] = pd.to_datetime(df["date"])
+    df = df.drop_duplicates(KEY, keep="last")
+
+    if manifest["columns"] is None:
+        manifest["columns"] = list(df.columns)
+    else:
+        # keep the on-disk schema stable: same columns, same order
+        df = df.reindex(columns=manifest["columns"])
+
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    for month, part in df.groupby(df["date"].dt.strftime("%Y-%m"), sort=True):
+        pdir = root / f"month={month}"
+        pdir.mkdir(parents=True, exist_ok=True)
+        fname = f"part-{stamp}-{uuid.uuid4().hex[:4]}.parquet"
+        _write_part(part.sort_values(KEY), pdir / fname)
+        entry = manifest["partitions"].setdefault(month, {"files": [], "rows": 0})
+        entry["files"].append(fname)
+        entry["rows"] += len(part)
+
+    hwm = df["date"].max()
+    old = manifest.get("high_water_mark")
+    if old is None or hwm > pd.Timestamp(old):
+        manifest["high_water_mark"] = hwm.date().isoformat()
+    manifest["updated_at"] = datetime.utcnow().isoformat(timespec="seconds")
+    _write_manifest(root, manifest)
+    return len(df)
+
+
+def load(root: Path = STORE_DIR, columns: Optional[List[str]] = None,
+         since: Optional[str] = None) -> pd.DataFrame:
+    """
+    Read the dataset (optionally only some columns / months ≥ `since`,
+    'YYYY-MM') with duplicate keys resolved to the most recently written row.
+    """
+    manifest = read_manifest(root)
+    cols = None if columns is None else list(dict.fromkeys(KEY + list(columns)))
+    frames = []
+    for month in sorted(manifest["partitions"]):
+        if since and month < since:
+            continue
+        for fname in manifest["partitions"][month]["files"]:   # oldest → newest
+            frames.append(pd.read_parquet(root / f"month={month}" / fname, columns=cols))
+    if not frames:
+        return pd.DataFrame(columns=cols or manifest.get("columns") or KEY)
+    df = pd.concat(frames, ignore_index=True)
+    df["date"] = pd.to_datetime(df["date"])
+    return df.drop_duplicates(KEY, keep="last").reset_index(drop=True)
+
+
+def compact(root: Path = STORE_DIR, min_files: int = 4) -> int:
+    """
+    Merge partitions that have accumulated ≥ `min_files` parts into a single
+    deduplicated file.  Returns the number of partitions rewritten.
+    """
+    manifest = read_manifest(root)
+    rewritten = 0
+    for month, entry in manifest["partitions"].items():
+        if len(entry["files"]) < min_files:
+            continue
+        pdir = root / f"month={month}"
+        df = pd.concat([pd.read_parquet(pdir / f) for f in entry["files"]], ignore_index=True)
+        df = df.drop_duplicates(KEY, keep="last").sort_values(KEY)
+        fname = f"part-{datetime.utcnow():%Y%m%dT%H%M%S}-compact.parquet"
+        _write_part(df, pdir / fname)
+        old_files, entry["files"], entry["rows"] = entry["files"], [fname], len(df)
+        _write_manifest(root, manifest)
+        for f in old_files:
+            (pdir / f).unlink(missing_ok=True)
+        rewritten += 1
+    return rewritten
+
+
+def bootstrap_from_csv(csv_path: Path = LEGACY_CSV, root: Path = STORE_DIR) -> int:
+    """One-time import of the legacy recovery_dataset.csv into the store."""
+    df = pd.read_csv(csv_path, parse_dates=["date"])
+    return append(df, root)
+
+
+def load_dataset(root: Path = STORE_DIR, csv_path: Path = LEGACY_CSV) -> pd.DataFrame:
+    """Store if present, legacy CSV otherwise — what the trainers should call."""
+    if exists(root):
+        return load(root)
+    df = pd.read_csv(csv_path, parse_dates=["date"])
+    return df.drop_duplicates(KEY, keep="last")
+
+
+def fingerprint(root: Path = STORE_DIR, csv_path: Path = LEGACY_CSV) -> Optional[str]:
+    """
+    sha256 identifying the data load_dataset() would return: the manifest's
+    part list (parts are immutable once written) or the legacy CSV's bytes.
+    """
+    if exists(root):
+        m = read_manifest(root)
+        payload = json.dumps({"partitions": m["partitions"], "hwm": m.get("high_water_mark")}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+    if csv_path.exists():
+        h = hashlib.sha256()
+        with open(csv_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        return h.hexdigest()
+    return None
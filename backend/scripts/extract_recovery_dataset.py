@@ -1,105 +1,156 @@
 # scripts/extract_recovery_dataset.py
+"""
+Extract the recovery training set straight from Postgres.
+
+One joined query over daily_logs ⨝ users ⨝ split_templates (+ the matching
+split_session's muscle groups) for the whole window, streamed in chunks;
+rows are normalised by app.utils.features.dataset_rows — the same code the
+trainer and /recovery/predict use — and written to CSV or Parquet (picked from the --out suffix).
+
+    python scripts/extract_recovery_dataset.py --days 180 --out recovery_dataset.parquet
+
+By default only days with a log are emitted (days without one have no label
+and are dropped by the trainer anyway); --dense emits the full user × day
+grid like the old per-day loop did.
+"""
 import sys
 from pathlib import Path
 
 # allow imports from project root
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
-import csv
-import json
+import argparse
 from datetime import date, timedelta
+
+import pandas as pd
+from sqlalchemy import select
+
 from app.database import SessionLocal
-from app.models import User, DailyLog, SplitSession
-from app.utils.context import build_daily_context
+from app.models import User, DailyLog, SplitSession, SplitTemplate
+from app.utils.features import DATASET_COLUMNS, USER_COLUMNS, dataset_rows
+from dataset_store import arrow_schema
+
+
+
+def build_query(start: date, end: date):
+    muscles = (
+        select(SplitSession.muscle_groups)
+        .where(SplitSession.template_id == DailyLog.split_template_id,
+               SplitSession.name == DailyLog.split)
+        .limit(1)
+        .scalar_subquery()
+    )
+    return (
+        select(
+            DailyLog.user_id, DailyLog.date, DailyLog.trained, DailyLog.split,
+            DailyLog.total_sets, DailyLog.failure_sets, DailyLog.total_rir,
+            DailyLog.sleep_start, DailyLog.sleep_end, DailyLog.sleep_quality,
+            DailyLog.resting_hr, DailyLog.hrv, DailyLog.calories, DailyLog.macros,
+            DailyLog.stress, DailyLog.motivation, DailyLog.soreness,
+            DailyLog.water_intake_l, DailyLog.recovery_rating,
+            *[getattr(User, c) for c in USER_COLUMNS],
+            SplitTemplate.type.label('split_type'),
+            muscles.label('muscle_groups'),
+        )
+        .join(User, User.id == DailyLog.user_id)
+        .outerjoin(SplitTemplate, SplitTemplate.id == DailyLog.split_template_id)
+        .where(DailyLog.date >= start, DailyLog.date <= end)
+        .order_by(DailyLog.user_id, DailyLog.date)
+    )
+
+
+def derive(df: pd.DataFrame) -> pd.DataFrame:
+    """Dataset rows for a chunk of joined log rows (see app.utils.features)."""
+    # split info only when the log names a session, as before
+    no_split = df['split'].isna()
+    df = df.assign(split_type=df['split_type'].where(~no_split),
+                   muscle_groups=df['muscle_groups'].where(~no_split))
+    return dataset_rows(df)
+
+
+def densify(db, df: pd.DataFrame, start: date, end: date) -> pd.DataFrame:
+    """Expand to every user × day in the window, filling no-log days like an empty DailyLog."""
+    users = pd.read_sql(select(User.id.label('user_id'), *[getattr(User, c) for c in USER_COLUMNS]), db.bind)
+    days = pd.date_range(start, end, freq='D')
+    grid = users.merge(pd.DataFrame({'date': days}), how='cross')
+    logged = df[['user_id', 'date']].assign(_logged=True)
+    grid = grid.merge(logged, on=['user_id', 'date'], how='left')
+    empty = dataset_rows(grid[~grid['_logged'].fillna(False).astype(bool)].drop(columns='_logged'))
+    out = pd.concat([df, empty], ignore_index=True)
+    return out.sort_values(['user_id', 'date'], kind='stable')[DATASET_COLUMNS]
+
+
+def parquet_schema():
+    """Arrow schema for DATASET_COLUMNS, from DATASET_DTYPES."""
+    return arrow_schema(pd.DataFrame(columns=DATASET_COLUMNS))
+
+
+class Sink:
+    """Writes chunks incrementally to CSV or Parquet."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.parquet = path.suffix == '.parquet'
+        self.writer = None
+        self.rows = 0
+
+    def write(self, df: pd.DataFrame):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            if self.writer is None:
+                # fixed up front: a chunk whose column is all null would infer `null`
+                self.writer = pq.ParquetWriter(self.path, parquet_schema())
+            table = pa.Table.from_pandas(df[DATASET_COLUMNS], schema=self.writer.schema,
+                                         preserve_index=False)
+            self.writer.write_table(table)
+        else:
+            df.to_csv(self.path, mode='a' if self.rows else 'w', header=not self.rows, index=False)
+        self.rows += len(df)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        elif self.parquet:
+            # no rows: still leave a readable file with the dataset's schema
+            import pyarrow.parquet as pq
+            pq.ParquetWriter(self.path, parquet_schema()).close()
+        elif not self.rows:
+            pd.DataFrame(columns=DATASET_COLUMNS).to_csv(self.path, index=False)
+
 
 def main():
+    parser = argparse.ArgumentParser(description="Set-based export of the recovery training set")
+    parser.add_argument('--days', type=int, default=180, help='window length ending today')
+    parser.add_argument('--end', type=date.fromisoformat, default=date.today())
+    parser.add_argument('--out', type=Path, default=Path('recovery_dataset.csv'), help='.csv or .parquet')
+    parser.add_argument('--chunk-size', type=int, default=50_000, help='rows per fetched chunk')
+    parser.add_argument('--dense', action='store_true', help='emit every user × day, not just logged days')
+    args = parser.parse_args()
+
+    end = args.end
+    start = end - timedelta(days=args.days - 1)
+
     db = SessionLocal()
-    users = db.query(User).all()
-
-    fieldnames = [
-        'user_id', 'date',
-        'sleep_h', 'sleep_quality', 'resting_hr', 'hrv',
-        'trained', 'total_sets', 'failure_sets', 'total_rir',
-        'cal_deficit_pct', 'protein_pct', 'carbs_pct', 'fat_pct',
-        'stress', 'motivation', 'water_intake_l',
-        'split_type', 'muscle_groups',
-        'age', 'sex', 'height', 'weight', 'goal', 'activity_level',
-        'recovery_rating'
-    ]
-
-    with open('recovery_dataset.csv', 'w', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-
-        for u in users:
-            for offset in range(180):
-                day = date.today() - timedelta(days=offset)
-
-                # derived features
-                ctx = build_daily_context(u, day, db)
-
-                # raw log
-                log = (
-                    db.query(DailyLog)
-                      .filter_by(user_id=u.id, date=day)
-                      .first()
-                )
-
-                # split_type from the template itself
-                split_type = None
-                muscle_groups = None
-                if log and log.split and log.split_template_id:
-                    # find the session record by name
-                    sess = (
-                        db.query(SplitSession)
-                          .filter_by(template_id=log.split_template_id,
-                                     name=log.split)
-                          .first()
-                    )
-                    if sess:
-                        muscle_groups = json.dumps(sess.muscle_groups)
-                    # split_type comes from the template (relationship)
-                    split_type = getattr(log.split_template, 'type', None)
-
-                row = {
-                    'user_id': u.id,
-                    'date': day.isoformat(),
-                    # derived features
-                    'sleep_h':           ctx.get('sleep_h'),
-                    # hours you are short of a 7-hour night (0 if you hit 7 h or more)
-                    'sleep_deficit'    : max(0, 7.0 - (ctx.get('sleep_h') or 0)),
-                    'sleep_quality':     ctx.get('sleep_quality'),
-                    'resting_hr':        ctx.get('resting_hr'),
-                    'hrv':               ctx.get('hrv'),
-                    'trained':           ctx.get('trained'),
-                    'total_sets':        ctx.get('total_sets'),
-                    'failure_sets':      ctx.get('failure_sets'),
-                    'total_rir':         ctx.get('total_rir'),
-                    'cal_deficit_pct':   ctx.get('cal_deficit_pct'),
-                    'protein_pct':       ctx.get('protein_pct'),
-                    'carbs_pct':         ctx.get('carbs_pct'),
-                    'fat_pct':           ctx.get('fat_pct'),
-                    'stress':            ctx.get('stress'),
-                    'motivation':        ctx.get('motivation'),
-                    'water_intake_l':    ctx.get('water_intake_l'),
-                    # split info
-                    'split_type':        split_type,
-                    'muscle_groups':     muscle_groups,
-                    # static user fields
-                    'age':               u.age,
-                    'sex':               u.sex,
-                    'height':            u.height,
-                    'weight':            u.weight,
-                    'goal':              u.goal,
-                    'activity_level':    u.activity_level,
-                    # label
-                    'recovery_rating':   (log.recovery_rating if log else None),
-                }
-
-                writer.writerow(row)
-
-    db.close()
+    sink = Sink(args.out)
+    try:
+        conn = db.connection().execution_options(stream_results=True)
+        chunks = pd.read_sql(build_query(start, end), conn, chunksize=args.chunk_size)
+        if args.dense:
+            # the grid needs the whole window at once; fine for the default 180 days
+            frames = [derive(c) for c in chunks]
+            logged = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=DATASET_COLUMNS)
+            sink.write(densify(db, logged, start, end))
+        else:
+            for chunk in chunks:
+                sink.write(derive(chunk))
+                print(f"  … {sink.rows:,} row(s)")
+    finally:
+        sink.close()
+        db.close()
+
+    print(f"✅ Wrote {sink.rows:,} row(s) [{start} → {end}] to {args.out}")
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
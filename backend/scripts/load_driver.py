@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# backend/scripts/load_driver.py
+"""
+Replay realistic app traffic against the FastAPI app in-process.
+
+Pairs with `seed_data.py`: pick seeded users by email prefix, mint access
+tokens for them locally and drive a mix of
+
+  • morning check-in  – POST /daily-log (sleep fields), which schedules a
+                        recovery re-score, then GET /recovery/history
+  • dashboard load    – GET /daily-log/history, /recovery/history,
+                        /digests/daily, /analytics/weekly
+
+from a pool of worker threads.  Prints per-endpoint latency percentiles and
+overall throughput.
+
+    python seed_data.py --users 500 --days 90      # once
+    python scripts/load_driver.py --users 200 --requests 2000 --workers 16
+"""
+import sys
+from pathlib import Path
+
+# allow imports from project root
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import argparse
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from app.auth import create_access_token
+from app.database import SessionLocal
+from app.main import app
+from app.models import User
+
+_local = threading.local()
+_lock = threading.Lock()
+latencies = defaultdict(list)
+statuses = defaultdict(lambda: defaultdict(int))
+
+
+def client() -> TestClient:
+    # TestClient is not safe to share between threads; one per worker
+    if not hasattr(_local, "client"):
+        _local.client = TestClient(app)
+    return _local.client
+
+
+def timed(name: str, method: str, url: str, token: str, **kw):
+    t0 = time.perf_counter()
+    resp = client().request(method, url, headers={"Authorization": f"Bearer {token}"}, **kw)
+    dt = (time.perf_counter() - t0) * 1000
+    with _lock:
+        latencies[name].append(dt)
+        statuses[name][resp.status_code] += 1
+    return resp
+
+
+def morning_checkin(token: str, rng: random.Random):
+    today = date.today()
+    sleep_start = f"{rng.choice([22, 23, 0]):02d}:{rng.randrange(0, 60, 5):02d}"
+    sleep_end = f"{rng.randint(6, 8):02d}:{rng.randrange(0, 60, 5):02d}"
+    timed("POST /daily-log", "POST", "/daily-log", token, json={
+        "date": today.isoformat(),
+        "sleep_start": sleep_start,
+        "sleep_end": sleep_end,
+        "sleep_quality": rng.randint(1, 5),
+        "resting_hr": rng.randint(48, 72),
+        "hrv": round(rng.uniform(35, 95), 1),
+        "soreness": rng.randint(1, 5),
+        "stress": rng.randint(1, 5),
+        "motivation": rng.randint(1, 5),
+    })
+    timed("GET /recovery/history", "GET", "/recovery/history", token,
+          params={"start": (today - timedelta(days=29)).isoformat(), "days": 30})
+
+
+def dashboard(token: str, rng: random.Random):
+    today = date.today()
+    timed("GET /daily-log/history", "GET", "/daily-log/history", token,
+          params={"start": (today - timedelta(days=6)).isoformat(), "days": 7})
+    timed("GET /recovery/history", "GET", "/recovery/history", token,
+          params={"start": (today - timedelta(days=29)).isoformat(), "days": 30})
+    timed("GET /digests/daily", "GET", "/digests/daily", token,
+          params={"day": (today - timedelta(days=1)).isoformat()})
+    timed("GET /analytics/weekly", "GET", "/analytics/weekly", token,
+          params={"end_date": today.isoformat()})
+
+
+SCENARIOS = {"checkin": morning_checkin, "dashboard": dashboard}
+
+
+def load_tokens(prefix: str, limit: int):
+    db = SessionLocal()
+    try:
+        ids = [
+            uid for (uid,) in db.query(User.id)
+                                .filter(User.email.like(f"{prefix}+%"))
+                                .limit(limit)
+                                .all()
+        ]
+    finally:
+        db.close()
+    return [create_access_token(str(uid)) for uid in ids]
+
+
+def report(wall_s: float):
+    total = sum(len(v) for v in latencies.values())
+    print("\n================= LOAD TEST RESULTS =================")
+    print(f"{'endpoint':<26}{'n':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}   status")
+    for name in sorted(latencies):
+        arr = np.asarray(latencies[name])
+        p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+        codes = ", ".join(f"{c}×{n}" for c, n in sorted(statuses[name].items()))
+        print(f"{name:<26}{len(arr):>7}{p50:>8.1f}ms{p95:>7.1f}ms{p99:>7.1f}ms{arr.max():>7.1f}ms   {codes}")
+    for name in sorted(set(statuses) - set(latencies)):
+        codes = ", ".join(f"{c}×{n}" for c, n in statuses[name].items())
+        print(f"{name:<26} {codes}")
+    print(f"\n{total:,} requests in {wall_s:.1f}s → {total / wall_s:.1f} req/s")
+    print("=====================================================\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-process load test against seeded users")
+    parser.add_argument("--email-prefix", default="loadtest")
+    parser.add_argument("--users", type=int, default=100, help="distinct users to simulate")
+    parser.add_argument("--requests", type=int, default=1000, help="scenario runs (not HTTP calls)")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent worker threads")
+    parser.add_argument("--checkin-ratio", type=float, default=0.3,
+                        help="fraction of scenario runs that are morning check-ins")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    tokens = load_tokens(args.email_prefix, args.users)
+    if not tokens:
+        print(f"⚠️  no users matching '{args.email_prefix}+*' — run seed_data.py first")
+        sys.exit(1)
+    print(f"👥 Simulating {len(tokens)} user(s), {args.requests} scenario runs, {args.workers} worker(s)")
+
+    rng = random.Random(args.seed)
+    plan = [
+        ("checkin" if rng.random() < args.checkin_ratio else "dashboard", rng.choice(tokens), rng.random())
+        for _ in range(args.requests)
+    ]
+
+    def run(item):
+        scenario, token, seed = item
+        try:
+            SCENARIOS[scenario](token, random.Random(seed))
+        except Exception as e:
+            with _lock:
+                statuses[f"{scenario} (exception)"][type(e).__name__] += 1
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        list(pool.map(run, plan))
+    report(time.perf_counter() - t0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+# backend/scripts/model_store.py
+"""
+Content-addressed store for recovery-model versions (layout in
+app/utils/artifacts.py).  Each artifact is stored once under its sha256, so
+a retrain that leaves e.g. recovery_all_muscles.pkl unchanged adds a
+manifest and only the blobs that actually changed.
+
+    python scripts/model_store.py commit              # app/recovery_* → models/<today>, flip latest
+    python scripts/model_store.py migrate             # fold legacy dated dirs into the store
+    python scripts/model_store.py prune --dry-run     # apply the retention policy, GC objects
+    python scripts/model_store.py list
+    python scripts/model_store.py export 2026-06-28 /tmp/model   # plain files, for debugging
+    python scripts/model_store.py pin 2026-06-28      # never pruned
+    python scripts/model_store.py promote 2026-07-05  # flip latest, e.g. after a candidate run
+
+Manifest per version: files (name → sha256, bytes), metrics and feature
+list (from app/recovery_metrics.json, written by train_recovery_lr.py),
+the training-data fingerprint, the parent version and creation time.
+
+Retention (prune): the newest --keep-last versions, the newest version of
+each of the last --keep-monthly months, whatever `latest` points at and its
+parent, and pinned versions.  Objects no remaining manifest references are
+deleted.
+"""
+import sys
+from pathlib import Path
+
+# allow imports from project root
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from app.utils.artifacts import MANIFEST, object_path, read_manifest
+
+MODELS_DIR = Path("models")
+ARTIFACT_GLOBS = ("recovery_*.pt", "recovery_*.joblib", "recovery_*.pkl", "recovery_*.bundle", "recovery_*.onnx")
+METRICS_FILE = "recovery_metrics.json"
+
+
+def sha256_of(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def artifact_files(src: Path) -> List[Path]:
+    return sorted({p for g in ARTIFACT_GLOBS for p in src.glob(g) if p.is_file()})
+
+
+def put_object(root: Path, path: Path) -> Tuple[str, bool]:
+    """Store `path` under its hash; returns (sha256, newly written)."""
+    digest = sha256_of(path)
+    dest = object_path(root / "objects", digest)
+    if dest.exists():
+        return digest, False
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_suffix(".tmp")
+    shutil.copyfile(path, tmp)
+    os.replace(tmp, dest)
+    return digest, True
+
+
+def write_manifest(version_dir: Path, manifest: dict):
+    version_dir.mkdir(parents=True, exist_ok=True)
+    p = version_dir / MANIFEST
+    tmp = p.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    os.replace(tmp, p)
+
+
+def versions(root: Path) -> Dict[str, dict]:
+    """Every version with a manifest, oldest first."""
+    out = {}
+    for d in sorted(root.iterdir()):
+        if d.is_dir() and not d.is_symlink():
+            m = read_manifest(d)
+            if m is not None:
+                out[d.name] = m
+    return out
+
+
+def latest_version(root: Path) -> Optional[str]:
+    link = root / "latest"
+    return os.readlink(link) if link.is_symlink() else None
+
+
+def set_latest(root: Path, version: str):
+    tmp = root / "latest.tmp"
+    tmp.unlink(missing_ok=True)
+    tmp.symlink_to(version)
+    os.replace(tmp, root / "latest")          # atomic flip; readers see old or new
+
+
+def features_of(files: Dict[str, Path]) -> Optional[dict]:
+    """Feature list from the fitted preprocessor, for versions without a metrics file."""
+    p = files.get("recovery_preproc_with_user_bias.joblib")
+    if p is None:
+        return None
+    try:
+        import joblib
+        import warnings
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")        # old sklearn pickles; we only read column names
+            pre = joblib.load(p)
+        num, cat = pre.transformers_[0][2], pre.transformers_[1][2]
+        return {"numeric": list(num), "categorical": list(cat)}
+    except Exception:
+        return None
+
+
+def store_version(root: Path, version: str, files: List[Path], parent: Optional[str],
+                  extra: dict) -> Tuple[dict, int]:
+    entries, new = {}, 0
+    for p in files:
+        digest, written = put_object(root, p)
+        entries[p.name] = {"sha256": digest, "bytes": p.stat().st_size}
+        new += written
+    manifest = {
+        "version": version,
+        "parent": parent,
+        "files": entries,
+        **extra,
+    }
+    write_manifest(root / version, manifest)
+    return manifest, new
+
+
+# ── commands ─────────────────────────────────────────────────────────────────
+
+def cmd_commit(args):
+    from dataset_store import fingerprint
+
+    root, src = args.root, args.src
+    files = artifact_files(src)
+    if not files:
+        sys.exit(f"❌ no recovery_* artifacts in {src}")
+    metrics_path = src / METRICS_FILE
+    metrics = json.loads(metrics_path.read_text()) if metrics_path.exists() else {}
+    features = metrics.pop("features", None) or features_of({p.name: p for p in files})
+
+    prev = latest_version(root)
+    current = (read_manifest(root / prev) or {}).get("files", {}) if prev else {}
+    if current and {p.name: sha256_of(p) for p in files} == {n: e["sha256"] for n, e in current.items()}:
+        print(f"✅ artifacts identical to {prev}, nothing to store")
+        return
+    parent = prev if prev != args.version else (read_manifest(root / prev) or {}).get("parent")
+    _, new = store_version(root, args.version, files, parent, {
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "metrics": metrics,
+        "features": features,
+        "training_data_sha256": fingerprint(),
+        "pinned": False,
+    })
+    # a dated dir from before the store: its plain copies are now objects
+    for p in files:
+        (root / args.version / p.name).unlink(missing_ok=True)
+    if args.no_promote:
+        print(f"✅ {args.version}: {len(files)} artifact(s), {new} new object(s), "
+              f"{len(files) - new} deduplicated; latest stays {prev} (serve it as RECOVERY_CANDIDATE)")
+        return
+    set_latest(root, args.version)
+    print(f"✅ {args.version}: {len(files)} artifact(s), {new} new object(s), "
+          f"{len(files) - new} deduplicated; latest → {args.version}")
+
+
+def cmd_migrate(args):
+    """Turn every manifest-less dated dir into a manifest + objects."""
+    root = args.root
+    migrated = new_total = 0
+    prev = None
+    for d in sorted(root.iterdir()):
+        if d.is_symlink() or not d.is_dir() or d.name == "objects":
+            continue
+        if (d / MANIFEST).exists():
+            prev = d.name
+            continue
+        files = artifact_files(d)
+        if not files:
+            continue
+        _, new = store_version(root, d.name, files, prev, {
+            "created_at": None,                    # unknown; the dir name is the training date
+            "metrics": {},
+            "features": features_of({p.name: p for p in files}),
+            "training_data_sha256": None,
+            "pinned": False,
+            "migrated": True,
+        })
+        if not args.dry_run:
+            for p in files:
+                p.unlink()
+        migrated, new_total, prev = migrated + 1, new_total + new, d.name
+    print(f"✅ migrated {migrated} version(s) into {new_total} distinct object(s)")
+
+
+def retained(all_versions: Dict[str, dict], latest: Optional[str], keep_last: int, keep_monthly: int) -> set:
+    names = list(all_versions)                     # oldest → newest
+    keep = set(names[-keep_last:]) if keep_last else set()
+    monthly = {}
+    for name in names:                             # newest of each month wins
+        monthly[name[:7]] = name
+    keep |= set(sorted(monthly.values())[-keep_monthly:]) if keep_monthly else set()
+    keep |= {n for n, m in all_versions.items() if m.get("pinned")}
+    if latest in all_versions:
+        keep.add(latest)
+        parent = all_versions[latest].get("parent")
+        if parent:
+            keep.add(parent)                       # warm-start source / rollback target
+    return keep
+
+
+def cmd_prune(args):
+    root = args.root
+    all_versions = versions(root)
+    keep = retained(all_versions, latest_version(root), args.keep_last, args.keep_monthly)
+    drop = [n for n in all_versions if n not in keep]
+
+    referenced = {e["sha256"] for n in keep for e in all_versions[n]["files"].values()}
+    objects = [p for p in (root / "objects").glob("*/*") if p.is_file()]
+    garbage = [p for p in objects if p.name not in referenced]
+    freed = sum(p.stat().st_size for p in garbage)
+
+    verb = "would drop" if args.dry_run else "dropped"
+    print(f"🧹 keeping {len(keep)} version(s), {verb} {len(drop)}: {', '.join(drop) or '—'}")
+    print(f"   {verb} {len(garbage)} unreferenced object(s), {freed / 1024:.0f} KiB")
+    if args.dry_run:
+        return
+    for n in drop:
+        shutil.rmtree(root / n)
+    for p in garbage:
+        p.unlink()
+        if not any(p.parent.iterdir()):
+            p.parent.rmdir()
+
+
+def cmd_list(args):
+    root = args.root
+    latest = latest_version(root)
+    seen = set()
+    for name, m in versions(root).items():
+        digests = {e["sha256"] for e in m["files"].values()}
+        mae = m.get("metrics", {}).get("val_mae")
+        flags = "".join([" ← latest" if name == latest else "", " 📌" if m.get("pinned") else ""])
+        print(f"{name}  {len(digests):>2} file(s), {len(digests - seen):>2} new  "
+              f"MAE {'—' if mae is None else f'{mae:.3f}'}{flags}")
+        seen |= digests
+
+
+def cmd_export(args):
+    m = read_manifest(args.root / args.version)
+    if m is None:
+        sys.exit(f"❌ no manifest for {args.version}")
+    args.dest.mkdir(parents=True, exist_ok=True)
+    for name, e in m["files"].items():
+        shutil.copyfile(object_path(args.root / "objects", e["sha256"]), args.dest / name)
+    print(f"✅ exported {len(m['files'])} file(s) → {args.dest}")
+
+
+def cmd_promote(args):
+    if read_manifest(args.root / args.version) is None:
+        sys.exit(f"❌ no manifest for {args.version}")
+    prev = latest_version(args.root)
+    set_latest(args.root, args.version)
+    print(f"✅ latest → {args.version} (was {prev})")
+
+
+def cmd_pin(args):
+    d = args.root / args.version
+    m = read_manifest(d)
+    if m is None:
+        sys.exit(f"❌ no manifest for {args.version}")
+    m["pinned"] = not args.unpin
+    write_manifest(d, m)
+    print(f"📌 {args.version} {'unpinned' if args.unpin else 'pinned'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Content-addressed recovery model store")
+    parser.add_argument("--root", type=Path, default=MODELS_DIR)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("commit", help="store the trainer's artifacts as a new version and flip latest")
+    p.add_argument("--from", dest="src", type=Path, default=Path("app"))
+    p.add_argument("--version", default=date.today().isoformat())
+    p.add_argument("--no-promote", action="store_true", help="store the version but leave latest alone")
+    p.set_defaults(fn=cmd_commit)
+
+    p = sub.add_parser("migrate", help="convert legacy dated dirs (plain copies) into manifests")
+    p.add_argument("--dry-run", action="store_true", help="write objects/manifests but keep the copies")
+    p.set_defaults(fn=cmd_migrate)
+
+    p = sub.add_parser("prune", help="apply the retention policy and delete unreferenced objects")
+    p.add_argument("--keep-last", type=int, default=8)
+    p.add_argument("--keep-monthly", type=int, default=12)
+    p.add_argument("--dry-run", action="store_true")
+    p.set_defaults(fn=cmd_prune)
+
+    p = sub.add_parser("list", help="versions with their new-object counts and VAL MAE")
+    p.set_defaults(fn=cmd_list)
+
+    p = sub.add_parser("export", help="materialise a version as plain files")
+    p.add_argument("version")
+    p.add_argument("dest", type=Path)
+    p.set_defaults(fn=cmd_export)
+
+    p = sub.add_parser("promote", help="point latest at a stored version (e.g. a validated candidate)")
+    p.add_argument("version")
+    p.set_defaults(fn=cmd_promote)
+
+    p = sub.add_parser("pin", help="exempt a version from pruning")
+    p.add_argument("version")
+    p.add_argument("--unpin", action="store_true")
+    p.set_defaults(fn=cmd_pin)
+
+    args = parser.parse_args()
+    args.fn(args)
+
+
+if __name__ == "__main__":
+    main()
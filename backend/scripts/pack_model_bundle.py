@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# backend/scripts/pack_model_bundle.py
+"""
+Pack an existing model version's separate artifacts (preprocessor .joblib,
+MLP .pt, the .pkl scalars) into the single-file bundle serving loads
+(app/utils/bundle.py), and check the bundle predicts exactly what the
+separate files do.  train_recovery_lr.py writes bundles itself; this is for
+versions trained before it did.  --onnx also exports the ONNX graph
+(app/utils/onnx_model.py) and checks it the same way.
+
+    python scripts/pack_model_bundle.py                      # models/latest → app/recovery_model.bundle
+    python scripts/pack_model_bundle.py --from models/2026-06-28 --out /tmp/recovery_model.bundle
+    python scripts/pack_model_bundle.py --onnx app/recovery_model.onnx
+"""
+import sys
+from pathlib import Path
+
+# allow imports from project root
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import argparse
+
+import joblib
+import numpy as np
+import torch
+
+from app.utils.artifacts import artifact_path
+from app.utils.bundle import BUNDLE_FILE, load_bundle, write_bundle
+from app.utils.features import model_input
+from app.utils.onnx_model import OnnxPredictor, export_onnx
+from recovery_training import MLP, load_training_frame, predict_state
+
+
+def load_artifact(src: Path, name: str):
+    path = artifact_path(src, name)
+    if path is None:
+        sys.exit(f"❌ {name} not found in {src}")
+    return torch.load(path, map_location="cpu") if name.endswith(".pt") else joblib.load(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack a model version into one bundle file")
+    parser.add_argument("--from", dest="src", type=Path, default=Path("models/latest"))
+    parser.add_argument("--out", type=Path, default=Path("app") / BUNDLE_FILE)
+    parser.add_argument("--check-rows", type=int, default=2000,
+                        help="dataset rows to compare bundle vs. separate-file predictions on (0 = skip)")
+    parser.add_argument("--onnx", type=Path, help="also export preprocessor + MLP as one ONNX graph here")
+    args = parser.parse_args()
+
+    preproc = load_artifact(args.src, "recovery_preproc_with_user_bias.joblib")
+    state = load_artifact(args.src, "recovery_mlp_with_user_bias.pt")
+    all_muscles = load_artifact(args.src, "recovery_all_muscles.pkl")
+    y_mean = load_artifact(args.src, "recovery_y_mean.pkl")
+    y_std = load_artifact(args.src, "recovery_y_std.pkl")
+    global_mean = load_artifact(args.src, "recovery_global_mean.pkl")
+    tt = artifact_path(args.src, "recovery_trained_through.pkl")
+    trained_through = joblib.load(tt) if tt is not None else None
+
+    write_bundle(args.out, preproc, state, all_muscles, y_mean, y_std, global_mean, trained_through)
+    print(f"📦 {args.src} → {args.out} ({args.out.stat().st_size / 1024:.1f} KiB)")
+    if args.onnx:
+        mlp = MLP(state["net.0.weight"].shape[1], state["net.0.weight"].shape[0])
+        mlp.load_state_dict(state)
+        export_onnx(args.onnx, preproc, mlp, y_mean, y_std)
+        print(f"📦 {args.src} → {args.onnx} ({args.onnx.stat().st_size / 1024:.1f} KiB)")
+
+    if args.check_rows:
+        df, _ = load_training_frame(all_muscles)
+        X = model_input(df.head(args.check_rows), preproc.feature_names_in_)
+        bundle = load_bundle(args.out)
+        model = MLP(bundle.meta["in_dim"], bundle.meta["hidden"])
+        model.load_state_dict(bundle.state_dict(), assign=True)
+        model.eval()
+        with torch.no_grad():
+            packed = model(torch.as_tensor(bundle.preprocessor.transform(X), dtype=torch.float32)).numpy()
+        packed = packed * bundle.meta["y_std"] + bundle.meta["y_mean"]
+        separate = predict_state(state, preproc.transform(X), y_mean, y_std)
+        err = float(np.max(np.abs(packed - separate))) if len(X) else 0.0
+        if err > 1e-4:
+            sys.exit(f"❌ bundle predictions differ by up to {err:.2e}")
+        print(f"✅ {len(X):,} row(s): bundle matches the separate artifacts (max |Δ| {err:.1e})")
+        if args.onnx:
+            err = float(np.max(np.abs(OnnxPredictor(args.onnx).predict(X) - separate))) if len(X) else 0.0
+            if err > 1e-3:
+                sys.exit(f"❌ ONNX predictions differ by up to {err:.2e}")
+            print(f"✅ {len(X):,} row(s): ONNX graph matches the separate artifacts (max |Δ| {err:.1e})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+# backend/scripts/recovery_training.py
+"""
+Pieces shared by the recovery-model training scripts
+(train_recovery_lr.py, tune_recovery_model.py): loading the training frame,
+the de-biased target, the preprocessor and the MLP with its training loop.
+"""
+import sys
+from pathlib import Path
+
+# allow imports from project root
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import time
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import torch
+from torch import nn
+from sklearn.pipeline import Pipeline
+from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
+from sklearn.preprocessing import StandardScaler, OneHotEncoder
+
+from dataset_store import load_dataset
+from app.utils.artifacts import artifact_path
+from app.utils.features import model_features, muscle_vocabulary, numeric_features, CAT_FEATS
+
+TARGET = "recovery_rating"
+
+# current production MLP; tune_recovery_model.py searches around it
+MLP_DEFAULTS = dict(hidden=32, dropout=0.2, lr=1e-3, weight_decay=1e-4, batch_size=32)
+
+
+def load_training_frame(all_muscles: Optional[list] = None) -> Tuple[pd.DataFrame, list]:
+    """
+    Labelled rows with model features, sorted by (user_id, date), and the
+    muscle vocabulary (derived from the data unless one is passed in).
+    `date` and `muscle_groups` are kept for callers that need them.
+    """
+    df = load_dataset()
+    df = df.drop_duplicates(["user_id", "date"], keep="last")
+    if all_muscles is None:
+        all_muscles = muscle_vocabulary(df["muscle_groups"])
+    # same feature code /recovery/predict runs.  The store only holds rated logs, so
+    # rolling windows here skip unrated days that serving's last-ROLL_WINDOW-logs query counts
+    df = model_features(df, all_muscles)
+    df = df[
+        (df["protein_pct"].lt(300) | df["protein_pct"].isna()) &
+        (df["carbs_pct"].lt(300)   | df["carbs_pct"].isna()) &
+        (df["fat_pct"].lt(300)     | df["fat_pct"].isna())
+    ]
+    df = df.dropna(subset=[TARGET])
+    return df.sort_values(["user_id", "date"]), all_muscles
+
+
+def feature_columns(all_muscles) -> Tuple[list, list]:
+    return numeric_features(all_muscles), list(CAT_FEATS)
+
+
+def debias(df_tr: pd.DataFrame, df_va: pd.DataFrame) -> Tuple[pd.Series, float]:
+    """
+    Add `y_obj`, the label with each training user's mean swapped for the
+    global mean, so the global model learns day-to-day variation and the
+    per-user heads carry the offset.  Returns (user_means, global_mean).
+    """
+    user_means = df_tr.groupby("user_id")[TARGET].mean()
+    global_mean = df_tr[TARGET].mean()
+    df_tr["y_obj"] = df_tr[TARGET] - df_tr["user_id"].map(user_means) + global_mean
+    df_va["y_obj"] = df_va[TARGET] - df_va["user_id"].map(user_means).fillna(global_mean) + global_mean
+    return user_means, global_mean
+
+
+def make_preprocessor(num_feats, cat_feats) -> ColumnTransformer:
+    numeric_pipe = Pipeline([("impute", SimpleImputer(strategy="median")), ("scale", StandardScaler())])
+    return ColumnTransformer([
+        ("num", numeric_pipe, num_feats),
+        ("cat", OneHotEncoder(handle_unknown="ignore", sparse_output=False), cat_feats),
+    ])
+
+
+class MLP(nn.Module):
+    def __init__(self, dim, h, dropout=0.2):
+        super().__init__()
+        self.net = nn.Sequential(
+            nn.Linear(dim, h),
+            nn.ReLU(),
+            nn.Dropout(dropout),
+            nn.Linear(h, 1),
+        )
+    def forward(self, x):
+        return self.net(x).squeeze(1)
+
+
+def set_threads(intra: Optional[int] = None, inter: Optional[int] = None):
+    """torch CPU thread pools; inter-op can only be set before any parallel work runs."""
+    if intra:
+        torch.set_num_threads(intra)
+    if inter:
+        try:
+            torch.set_num_interop_threads(inter)
+        except RuntimeError:
+            pass
+
+
+def train_mlp(
+    X_tr: np.ndarray, y_tr_norm: np.ndarray,
+    X_va: np.ndarray, y_va: np.ndarray,
+    y_mean: float, y_std: float,
+    hidden: int = 32, dropout: float = 0.2, lr: float = 1e-3,
+    weight_decay: float = 1e-4, batch_size: int = 32,
+    max_epochs: int = 200, eval_every: int = 10, patience: int = 5,
+    device: Optional[torch.device] = None,
+    on_eval: Optional[Callable[[int, float], None]] = None,
+    on_epoch: Optional[Callable[[int, float, float], None]] = None,
+    init_state: Optional[dict] = None,
+) -> Tuple[MLP, float]:
+    """
+    Adam + MSE on the normalised target with early stopping on validation
+    MAE (original scale).  Returns the model loaded with its best weights
+    and that MAE.
+
+    The whole training set stays resident on `device` as two tensors; each
+    epoch draws one randperm and walks it in slices of `batch_size`
+    (0 = full batch), so there is no DataLoader / collate overhead per
+    step.  `on_epoch(epoch, seconds, train_loss)` is called after every
+    epoch, `on_eval(epoch, mae)` after every validation pass; either may
+    raise to abort (e.g. optuna pruning).  `init_state` warm-starts from
+    existing weights (its hidden width wins over `hidden`).
+    """
+    device = device or torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    X = torch.as_tensor(X_tr, dtype=torch.float32, device=device)
+    y = torch.as_tensor(y_tr_norm, dtype=torch.float32, device=device)
+    X_va_t = torch.as_tensor(X_va, dtype=torch.float32, device=device)
+    n = X.shape[0]
+    bs = n if not batch_size or batch_size >= n else batch_size
+
+    if init_state is not None:
+        hidden = init_state["net.0.weight"].shape[0]
+    model = MLP(X.shape[1], h=hidden, dropout=dropout).to(device)
+    if init_state is not None:
+        model.load_state_dict(init_state)
+    opt = torch.optim.Adam(model.parameters(), lr=lr, weight_decay=weight_decay)
+    loss_fn = nn.MSELoss()
+
+    best_mae, best_state, no_imp = float("inf"), None, 0
+    for epoch in range(1, max_epochs + 1):
+        t0 = time.perf_counter()
+        model.train()
+        perm = torch.randperm(n, device=device)
+        total = torch.zeros((), device=device)
+        for i in range(0, n, bs):
+            idx = perm[i:i + bs]
+            opt.zero_grad(set_to_none=True)
+            loss = loss_fn(model(X[idx]), y[idx])
+            loss.backward()
+            opt.step()
+            total += loss.detach() * len(idx)
+        if on_epoch:
+            on_epoch(epoch, time.perf_counter() - t0, float(total) / n)
+
+        if epoch % eval_every == 0:
+            model.eval()
+            with torch.no_grad():
+                preds = model(X_va_t).cpu().numpy() * y_std + y_mean
+            mae = float(np.mean(np.abs(y_va - preds)))
+            if on_eval:
+                on_eval(epoch, mae)
+            if mae < best_mae:
+                best_mae, no_imp = mae, 0
+                best_state = {k: v.detach().clone() for k, v in model.state_dict().items()}
+            else:
+                no_imp += 1
+                if no_imp >= patience:
+                    break
+
+    if best_state is not None:
+        model.load_state_dict(best_state)
+    model.eval()
+    return model, best_mae
+
+
+# ── warm start ───────────────────────────────────────────────────────────────
+
+PREVIOUS_ARTIFACTS = {
+    "preproc":         "recovery_preproc_with_user_bias.joblib",
+    "state":           "recovery_mlp_with_user_bias.pt",
+    "y_mean":          "recovery_y_mean.pkl",
+    "y_std":           "recovery_y_std.pkl",
+    "all_muscles":     "recovery_all_muscles.pkl",
+    "trained_through": "recovery_trained_through.pkl",
+}
+
+
+def load_previous(*dirs: Path) -> Optional[dict]:
+    """The first directory holding a complete previous model, as a dict; None if there is none."""
+    import joblib
+    for d in dirs:
+        paths = {k: artifact_path(Path(d), f) for k, f in PREVIOUS_ARTIFACTS.items()}
+        required = {k: p for k, p in paths.items() if k != "trained_through"}
+        if any(p is None for p in required.values()):
+            continue
+        prev = {k: (torch.load(p, map_location="cpu") if k == "state" else joblib.load(p))
+                for k, p in required.items()}
+        tt = paths["trained_through"]
+        prev["trained_through"] = pd.Timestamp(joblib.load(tt)) if tt is not None else None
+        prev["dir"] = Path(d)
+        return prev
+    return None
+
+
+def scaler_of(preproc):
+    return preproc.named_transformers_["num"].named_steps["scale"]
+
+
+def update_scaler(preproc, X_new: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fold `X_new` into the fitted StandardScaler's running mean / variance
+    (StandardScaler.partial_fit); imputer medians and one-hot categories
+    stay as fitted.  Returns the (mean, scale) in force before the update.
+    """
+    num = preproc.named_transformers_["num"]
+    scale = num.named_steps["scale"]
+    before = scale.mean_.copy(), scale.scale_.copy()
+    if len(X_new):
+        cols = preproc.transformers_[0][2]
+        scale.partial_fit(num.named_steps["impute"].transform(X_new[cols]))
+    return before
+
+
+def rescale_first_layer(state: dict, before, after) -> dict:
+    """
+    Adjust the first Linear layer so the MLP computes the same function
+    under the updated scaler: with z_old = (x - m) / s and
+    z_new = (x - m') / s',  z_old = z_new · s'/s + (m' - m)/s.
+    Only the leading numeric columns are affected; one-hot columns follow.
+    """
+    (m, s), (m2, s2) = before, after
+    k = len(m)
+    W = state["net.0.weight"].clone()
+    b = state["net.0.bias"].clone()
+    ratio = torch.as_tensor(s2 / s, dtype=W.dtype)
+    shift = torch.as_tensor((m2 - m) / s, dtype=W.dtype)
+    b += W[:, :k] @ shift
+    W[:, :k] *= ratio
+    return {**state, "net.0.weight": W, "net.0.bias": b}
+
+
+def predict_state(state: dict, X: np.ndarray, y_mean: float, y_std: float,
+                  dtype: torch.dtype = torch.float32) -> np.ndarray:
+    """CPU predictions of `state`; dtype=torch.float16 scores the way a float16 bundle is served."""
+    model = MLP(X.shape[1], h=state["net.0.weight"].shape[0]).to(dtype)
+    model.load_state_dict(state)
+    model.eval()
+    with torch.no_grad():
+        out = model(torch.as_tensor(X, dtype=dtype)).float().numpy().astype(np.float64)
+    return out * y_std + y_mean
@@ -1,12 +1,13 @@
 #!/usr/bin/env python3
 # backend/scripts/train_recovery_lr.py
-import json, numpy as np, pandas as pd
+import sys
 from pathlib import Path
+
+# allow imports from project root
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import argparse, json, time, numpy as np, pandas as pd
 from sklearn.model_selection import GroupShuffleSplit
-from sklearn.pipeline import Pipeline
-from sklearn.compose import ColumnTransformer
-from sklearn.impute import SimpleImputer
-from sklearn.preprocessing import StandardScaler, OneHotEncoder
 from sklearn.metrics import mean_absolute_error, r2_score, mean_squared_error
 try:
     from scipy.stats import spearmanr
@@ -15,40 +16,76 @@ except Exception:
     HAVE_SCIPY = False
 import joblib
 import torch
-from torch import nn
-from torch.utils.data import TensorDataset, DataLoader
-
-df = pd.read_csv("recovery_dataset.csv", parse_dates=["date"])
-df.drop_duplicates(['user_id','date'], keep='last', inplace=True)
-df = df[
-    (df["protein_pct"].lt(300) | df["protein_pct"].isna()) &
-    (df["carbs_pct"].lt(300)   | df["carbs_pct"].isna()) &
-    (df["fat_pct"].lt(300)     | df["fat_pct"].isna())
-]
-df = df.dropna(subset=["recovery_rating"])
-df.sort_values(["user_id","date"], inplace=True)
-for f in ("soreness","stress","sleep_quality"):
-    df[f"{f}_roll3"] = df.groupby("user_id")[f].transform(lambda x: x.rolling(3,min_periods=1).mean())
-df["dow"] = df["date"].dt.dayofweek
-df["moy"] = df["date"].dt.month - 1
-df["dow_sin"] = np.sin(2*np.pi*df["dow"]/7)
-df["dow_cos"] = np.cos(2*np.pi*df["dow"]/7)
-df["moy_sin"] = np.sin(2*np.pi*df["moy"]/12)
-df["moy_cos"] = np.cos(2*np.pi*df["moy"]/12)
-all_muscles = sorted({m for grp in df["muscle_groups"].dropna() for m in json.loads(grp)})
-joblib.dump(all_muscles, Path("app/recovery_all_muscles.pkl"))
-for m in all_muscles:
-    df[m] = df["muscle_groups"].apply(lambda s: 1 if pd.notnull(s) and m in json.loads(s) else 0)
-df.drop(columns=["muscle_groups","date","dow","moy"], inplace=True)
-
-target = "recovery_rating"
-num_feats = [
-    "sleep_h","sleep_quality","resting_hr","hrv",
-    "total_sets","failure_sets","total_rir",
-    "cal_deficit_pct","protein_pct","carbs_pct","fat_pct",
-    "stress","motivation","water_intake_l","age","height","weight"
-] + [f"{f}_roll3" for f in ("soreness","stress","sleep_quality")] + ["dow_sin","dow_cos","moy_sin","moy_cos"] + all_muscles
-cat_feats = ["sex","goal","activity_level","split_type"]
+from recovery_training import (
+    MLP_DEFAULTS, TARGET, debias, feature_columns, load_previous, load_training_frame, make_preprocessor,
+    predict_state, rescale_first_layer, scaler_of, set_threads, train_mlp, update_scaler,
+)
+from app.utils.features import CAT_FEATS, muscle_vocabulary
+from app.utils.bundle import BUNDLE_FILE, bundle_file, write_bundle
+from app.utils.heads import fit_heads
+from app.utils.onnx_model import ONNX_FILE, OnnxPredictor, export_onnx
+
+# exit codes the nightly workflow branches on; both keep the previous model
+EXIT_GATE_FAILED = 3        # --incremental update regressed VAL MAE
+EXIT_NOTHING_NEW = 4        # --incremental: no rows after the previous model's data
+
+parser = argparse.ArgumentParser(description="Train the global recovery MLP")
+parser.add_argument("--hparams", type=Path, help="JSON of MLP hyper-parameters (e.g. from tune_recovery_model.py)")
+parser.add_argument("--batch-size", type=int, help="mini-batch size; 0 = full batch (overrides --hparams)")
+parser.add_argument("--lr", type=float, help="learning rate (overrides --hparams)")
+parser.add_argument("--max-epochs", type=int, default=200)
+parser.add_argument("--eval-every", type=int, default=10, help="epochs between validation passes")
+parser.add_argument("--patience", type=int, default=5, help="validation passes without improvement before stopping")
+parser.add_argument("--threads", type=int, help="torch intra-op threads (default: torch's choice)")
+parser.add_argument("--interop-threads", type=int, help="torch inter-op threads")
+parser.add_argument("--incremental", action="store_true",
+                    help="warm-start from the previous model instead of training from scratch")
+parser.add_argument("--from", dest="prev_dirs", type=Path, action="append",
+                    help="previous model dir for --incremental (default: models/latest, then app/)")
+parser.add_argument("--since", type=pd.Timestamp,
+                    help="rows after this date count as new (default: the previous model's trained-through date)")
+parser.add_argument("--replay-ratio", type=float, default=2.0,
+                    help="old rows replayed per new row while fine-tuning")
+parser.add_argument("--es-fraction", type=float, default=0.1,
+                    help="--incremental: share of the fine-tuning rows' users held out for early stopping")
+parser.add_argument("--gate-tolerance", type=float, default=0.01,
+                    help="max relative VAL MAE regression vs. the previous model before the update is rejected")
+args = parser.parse_args()
+set_threads(args.threads, args.interop_threads)
+hparams = dict(MLP_DEFAULTS)
+if args.hparams:
+    hparams.update({k: v for k, v in json.loads(args.hparams.read_text()).items() if k in MLP_DEFAULTS})
+    print(f"🎛️  hyper-parameters from {args.hparams}: {hparams}")
+if args.batch_size is not None:
+    hparams["batch_size"] = args.batch_size
+if args.lr is not None:
+    hparams["lr"] = args.lr
+
+prev = None
+if args.incremental:
+    prev = load_previous(*(args.prev_dirs or [Path("models/latest"), Path("app")]))
+    if prev is None:
+        print("⚠️  --incremental: no previous model found, training from scratch")
+    elif (args.since or prev["trained_through"]) is None:
+        print(f"⚠️  --incremental: {prev['dir']} has no trained-through date and no --since, training from scratch")
+        prev = None
+
+df, all_muscles = load_training_frame(prev["all_muscles"] if prev else None)
+trained_through = df["date"].max()
+
+if prev:
+    # new rows the frozen vocabulary / encoder cannot represent need a full retrain
+    since = args.since or prev["trained_through"]
+    fresh = df[df["date"] > since]
+    new_muscles = set(muscle_vocabulary(fresh["muscle_groups"])) - set(all_muscles)
+    if new_muscles:
+        print(f"⚠️  --incremental: new muscle groups {sorted(new_muscles)}, training from scratch")
+        prev = None
+        df, all_muscles = load_training_frame()
+df = df.drop(columns=["muscle_groups"])
+
+target = TARGET
+num_feats, cat_feats = feature_columns(all_muscles)
 
 X = df[num_feats + cat_feats]
 y = df[target].values
@@ -59,88 +96,112 @@ train_idx, val_idx = next(gss.split(X, y, groups))
 df_tr = df.iloc[train_idx].copy()
 df_va = df.iloc[val_idx].copy()
 
-user_means = df_tr.groupby("user_id")[target].mean()
-global_mean = df_tr[target].mean()
-joblib.dump(global_mean, Path("app/recovery_global_mean.pkl"))
+user_means, global_mean = debias(df_tr, df_va)
 # keep user_bias ONLY for building user_heads later; do NOT feed it to the model 
 df_tr["user_bias"] = df_tr["user_id"].map(user_means)
 df_va["user_bias"] = df_va["user_id"].map(user_means).fillna(global_mean)
 
-df_tr["y_obj"] = df_tr[target] - df_tr["user_id"].map(user_means) + global_mean
-df_va["y_obj"] = df_va[target] - df_va["user_id"].map(user_means).fillna(global_mean) + global_mean
-
 num_feats2 = num_feats
 Xtr = df_tr[num_feats2 + cat_feats]
 ytr = df_tr["y_obj"].values
 Xva = df_va[num_feats2 + cat_feats]
 yva = df_va["y_obj"].values
 
-numeric_pipe = Pipeline([("impute", SimpleImputer(strategy="median")), ("scale", StandardScaler())])
-preproc = ColumnTransformer([
-    ("num", numeric_pipe, num_feats2),
-    ("cat", OneHotEncoder(handle_unknown="ignore", sparse_output=False), cat_feats),
-])
-preproc.fit(Xtr)
-X_tr_np = preproc.transform(Xtr).astype(np.float32)
-X_va_np = preproc.transform(Xva).astype(np.float32)
+fit_idx, init_state = slice(None), None
+if prev:
+    # categories the frozen one-hot encoder has never seen, among rows we would train on
+    is_new = (df_tr["date"] > since).to_numpy()
+    cat_enc = prev["preproc"].named_transformers_["cat"]
+    new_cats = {c: set(df_tr.loc[is_new, c].astype(str)) - set(map(str, cats))
+                for c, cats in zip(CAT_FEATS, cat_enc.categories_)}
+    new_cats = {c: sorted(v) for c, v in new_cats.items() if v}
+    if new_cats:
+        print(f"⚠️  --incremental: new categories {new_cats}, training from scratch")
+        prev = None
 
-y_mean, y_std = ytr.mean(), ytr.std()
-joblib.dump(y_mean, Path("app/recovery_y_mean.pkl"))
-joblib.dump(y_std,  Path("app/recovery_y_std.pkl"))
-y_tr_norm = (ytr - y_mean) / y_std
+if prev:
+    # ── warm start: same encoder, scaler moments updated with the new rows ──
+    if not is_new.any():
+        print(f"✅ --incremental: no new training rows after {since.date()}, nothing to do")
+        sys.exit(EXIT_NOTHING_NEW)
 
-class MLP(nn.Module):
-    def __init__(self, dim, h):
-        super().__init__()
-        self.net = nn.Sequential(
-            nn.Linear(dim, h),
-            nn.ReLU(),
-            nn.Dropout(0.2),
-            nn.Linear(h, 1),
-        )
-    def forward(self, x):
-        return self.net(x).squeeze(1)
+    preproc = prev["preproc"]
+    before = update_scaler(preproc, Xtr[is_new])
+    after = scaler_of(preproc).mean_, scaler_of(preproc).scale_
+    X_tr_np = preproc.transform(Xtr).astype(np.float32)
+    X_va_np = preproc.transform(Xva).astype(np.float32)
+    y_mean, y_std = prev["y_mean"], prev["y_std"]
+    init_state = rescale_first_layer(prev["state"], before, after)
+
+    # the bar to clear: both models on validation rows dated after the previous
+    # model's training data, which it cannot have fitted (today's validation
+    # users may have been in its training split); all of VAL when there are none
+    va_new = (df_va["date"] > since).to_numpy()
+    gate_rows = va_new if va_new.any() else np.ones(len(df_va), dtype=bool)
+    prev_mae = mean_absolute_error(yva[gate_rows], predict_state(init_state, X_va_np[gate_rows], y_mean, y_std))
+
+    new_idx, old_idx = np.flatnonzero(is_new), np.flatnonzero(~is_new)
+    n_replay = min(len(old_idx), int(round(args.replay_ratio * len(new_idx))))
+    replay = np.random.default_rng(42).choice(old_idx, size=n_replay, replace=False)
+    fit_idx = np.concatenate([new_idx, replay])
+    # early-stop on a user-grouped slice of the fine-tuning rows so VAL only scores the gate
+    fit_users = df_tr["user_id"].to_numpy()[fit_idx]
+    es_groups = fit_users if len(set(fit_users)) > 1 else np.arange(len(fit_idx))
+    if len(fit_idx) > 1:
+        inner = GroupShuffleSplit(n_splits=1, test_size=args.es_fraction, random_state=42)
+        keep, es = next(inner.split(fit_idx, groups=es_groups))
+        fit_idx, es_idx = fit_idx[keep], fit_idx[es]
+    else:
+        es_idx = fit_idx                        # a single row: nothing to hold out
+    X_es_np, y_es = X_tr_np[es_idx], ytr[es_idx]
+    if args.lr is None:
+        hparams["lr"] = hparams["lr"] * 0.3       # fine-tune gently unless told otherwise
+    print(f"🔁 Incremental from {prev['dir']}: {len(new_idx):,} new + {n_replay:,} replayed row(s) "
+          f"after {since.date()}; previous model MAE {prev_mae:.3f} on {int(gate_rows.sum()):,} "
+          f"{'new ' if va_new.any() else ''}VAL row(s); early stopping on {len(es_idx):,} held-out row(s)")
+else:
+    preproc = make_preprocessor(num_feats2, cat_feats)
+    preproc.fit(Xtr)
+    X_tr_np = preproc.transform(Xtr).astype(np.float32)
+    X_va_np = preproc.transform(Xva).astype(np.float32)
+    y_mean, y_std = ytr.mean(), ytr.std()
+    X_es_np, y_es = X_va_np, yva
+
+y_tr_norm = (ytr - y_mean) / y_std
 
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-ds = TensorDataset(torch.from_numpy(X_tr_np), torch.from_numpy(y_tr_norm.astype(np.float32)))
-loader = DataLoader(ds, batch_size=32, shuffle=True)
-
-model = MLP(X_tr_np.shape[1], h=32).to(device)
-opt = torch.optim.Adam(model.parameters(), lr=1e-3, weight_decay=1e-4)
-loss_fn = nn.MSELoss()
-
-best_mae, no_imp = float("inf"), 0
-for epoch in range(1, 201):
-    model.train()
-    for xb, yb in loader:
-        xb, yb = xb.to(device), yb.to(device)
-        opt.zero_grad()
-        loss_fn(model(xb), yb).backward()
-        opt.step()
-    if epoch % 10 == 0:
-        model.eval()
-        with torch.no_grad():
-            preds = model(torch.from_numpy(X_va_np).to(device)).cpu().numpy()
-        preds = preds * y_std + y_mean
-        mae = mean_absolute_error(yva, preds)
-        print(f"Epoch {epoch:03d} → VAL MAE: {mae:.3f}")
-        if mae < best_mae:
-            best_mae, no_imp, best_state = mae, 0, model.state_dict()
-        else:
-            no_imp += 1
-            if no_imp >= 5:
-                break
-
-model.load_state_dict(best_state)
-model.eval()
+epoch_s = []
+t_train = time.perf_counter()
+model, best_mae = train_mlp(
+    X_tr_np[fit_idx], y_tr_norm[fit_idx], X_es_np, y_es, y_mean, y_std, device=device, init_state=init_state,
+    max_epochs=args.max_epochs, eval_every=args.eval_every, patience=args.patience,
+    on_epoch=lambda epoch, secs, loss: epoch_s.append(secs),
+    on_eval=lambda epoch, mae: print(
+        f"Epoch {epoch:03d} → {'early-stop' if prev else 'VAL'} MAE: {mae:.3f}  ({np.mean(epoch_s[-args.eval_every:]) * 1000:.1f} ms/epoch)"),
+    **hparams,
+)
+best_state = model.state_dict()
+print(f"⏱️  {len(epoch_s)} epoch(s) in {time.perf_counter() - t_train:.1f}s "
+      f"(median {np.median(epoch_s) * 1000:.1f} ms/epoch, batch "
+      f"{hparams['batch_size'] or 'full'}, {torch.get_num_threads()} thread(s))")
+
+if prev:
+    limit = prev_mae * (1 + args.gate_tolerance)
+    gate_mae = mean_absolute_error(
+        yva[gate_rows], predict_state(model.state_dict(), X_va_np[gate_rows], y_mean, y_std))
+    if gate_mae > limit:
+        print(f"❌ Regression gate: MAE {gate_mae:.3f} > {limit:.3f} "
+              f"(previous {prev_mae:.3f} + {args.gate_tolerance:.0%}); keeping the previous model")
+        sys.exit(EXIT_GATE_FAILED)
+    print(f"✅ Regression gate: MAE {gate_mae:.3f} ≤ {limit:.3f} (previous {prev_mae:.3f})")
+
 with torch.no_grad():
     # ------- final train preds (for heads) -------
     tr_pred_norm = model(torch.from_numpy(X_tr_np).to(device)).cpu().numpy()
     tr_pred = tr_pred_norm * y_std + y_mean
-    df_tr["residual"] = df_tr[target].values - tr_pred
 
 
-    # ------- final val preds (for metrics) -------
+    # ------- final val preds (for metrics and heads) -------
     va_pred_norm = model(torch.from_numpy(X_va_np).to(device)).cpu().numpy()
     va_pred = va_pred_norm * y_std + y_mean
 
@@ -188,18 +249,69 @@ print("\n---- Per-user MAE distribution ----")
 print(f"median={per_user_mae.median():.3f}, IQR=({per_user_mae.quantile(0.25):.3f}, {per_user_mae.quantile(0.75):.3f})")
 print("============================================================\n")
 # ==========================================================
-# 2.  For now we only learn a bias (average residual).  Slope = 1.0.
-user_heads = (
-    df_tr.groupby("user_id")["residual"]
-         .mean()
-         .reset_index(name="bias")
-         .assign(slope=1.0)                    # placeholder column
-)
+# 2.  Per-user (slope, bias) for EVERY labelled user (train and val split),
+#     ridge-shrunk toward the global model — same solver the API uses online.
+user_heads = fit_heads(
+    np.concatenate([df_tr["user_id"].values, df_va["user_id"].values]),
+    np.concatenate([tr_pred, va_pred]),
+    np.concatenate([df_tr[target].values, df_va[target].values]),
+    center=df_tr[target].mean(), scale=y_std,
+).assign(fitted_through=trained_through.date().isoformat())
+print(f"Heads: slope median {user_heads['slope'].median():.3f} "
+      f"IQR ({user_heads['slope'].quantile(0.25):.3f}, {user_heads['slope'].quantile(0.75):.3f}); "
+      f"bias median {user_heads['bias'].median():.3f}")
 
 # 3.  Save to CSV so the GH Action can upsert into Supabase
 heads_path = Path("user_recovery_heads.csv")
 user_heads.to_csv(heads_path, index=False)
 print(f"✨ wrote {len(user_heads)} per-user heads → {heads_path}")
 
+joblib.dump(all_muscles, Path("app/recovery_all_muscles.pkl"))
+joblib.dump(df_tr[target].mean(), Path("app/recovery_global_mean.pkl"))
+joblib.dump(y_mean, Path("app/recovery_y_mean.pkl"))
+joblib.dump(y_std,  Path("app/recovery_y_std.pkl"))
+joblib.dump(trained_through.date().isoformat(), Path("app/recovery_trained_through.pkl"))
 joblib.dump(preproc, Path("app/recovery_preproc_with_user_bias.joblib"))
-torch.save(best_state, Path("app/recovery_mlp_with_user_bias.pt"))
\ No newline at end of file
+torch.save(best_state, Path("app/recovery_mlp_with_user_bias.pt"))
+# the same model packed into one mmap-able file; serving prefers it
+write_bundle(Path("app") / BUNDLE_FILE, preproc, best_state, all_muscles, y_mean, y_std,
+             df_tr[target].mean(), trained_through.date().isoformat())
+# float16 variant: halved weights, scored the way serving runs it; serving
+# only switches to it (RECOVERY_PRECISION=float16) within its MAE tolerance
+cpu_state = {k: v.detach().cpu() for k, v in best_state.items()}
+va_pred16 = predict_state({k: v.half() for k, v in cpu_state.items()}, X_va_np, y_mean, y_std,
+                          dtype=torch.float16)
+val_mae16 = float(mean_absolute_error(yva, va_pred16))
+print(f"float16 variant VAL MAE: {val_mae16:.3f} (float32 {val_mae:.3f}, Δ {val_mae16 - val_mae:+.4f}, "
+      f"max |Δpred| {np.abs(va_pred16 - va_pred).max():.3f})")
+write_bundle(Path("app") / bundle_file("float16"), preproc, cpu_state, all_muscles, y_mean, y_std,
+             df_tr[target].mean(), trained_through.date().isoformat(), precision="float16",
+             validation={"val_mae": val_mae16, "val_mae_float32": float(val_mae)})
+# preprocessor + MLP as one ONNX graph (RECOVERY_BACKEND=onnx); kept only if it
+# reproduces the validation predictions
+onnx_path = Path("app") / ONNX_FILE
+onnx_path.unlink(missing_ok=True)            # never commit a previous run's graph
+try:
+    export_onnx(onnx_path, preproc, model, y_mean, y_std)
+    onnx_err = float(np.abs(OnnxPredictor(onnx_path).predict(Xva) - va_pred).max())
+except ImportError as e:
+    onnx_err = None
+    print(f"⚠️  ONNX export skipped ({e.name} not installed)")
+if onnx_err is not None and onnx_err > 1e-3:
+    onnx_path.unlink()
+    print(f"❌ ONNX graph differs from torch by up to {onnx_err:.2e} on VAL; not shipped")
+elif onnx_err is not None:
+    print(f"✅ ONNX graph → {onnx_path} (max |Δ| vs torch on VAL {onnx_err:.1e})")
+# read by scripts/model_store.py into the version manifest
+Path("app/recovery_metrics.json").write_text(json.dumps({
+    "mode": "incremental" if prev else "full",
+    "warm_start_from": str(prev["dir"]) if prev else None,
+    "hparams": hparams,
+    "rows": {"train": int(len(df_tr)), "val": int(len(df_va)), "fit": int(len(X_tr_np[fit_idx]))},
+    "val_mae": float(val_mae), "val_rmse": val_rmse, "val_r2": float(val_r2),
+    "val_spearman": None if val_rho is None else float(val_rho),
+    "baseline_mae": {"global_mean": float(mae_global), "user_mean": float(mae_usermean)},
+    "per_user_mae_median": float(per_user_mae.median()),
+    "variants": {"float16": {"val_mae": val_mae16, "delta_mae": val_mae16 - float(val_mae)}},
+    "features": {"numeric": num_feats, "categorical": cat_feats},
+}, indent=2))
\ No newline at end of file
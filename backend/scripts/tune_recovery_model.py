@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# backend/scripts/tune_recovery_model.py
+"""
+Hyper-parameter search / model selection for the global recovery model.
+
+  • one optuna study over three families — the MLP we serve, ridge and
+    LightGBM — with a conditional search space per family
+  • every trial is scored by grouped K-fold CV (a user's rows never sit in
+    both train and validation) on the same de-biased target
+    train_recovery_lr.py fits; the preprocessor is fitted once per fold and
+    shared by all trials
+  • the MLP and LightGBM early-stop on --es-fraction of each training
+    fold's users, never on the rows they are scored on
+  • the running CV MAE is reported after each fold so the median pruner can
+    drop hopeless trials early
+  • trials run in parallel threads (--jobs, all cores by default), each
+    model single-threaded so the cores are not oversubscribed
+  • afterwards the best trials are timed one by one on single-row inference
+    (preprocess + predict, as /recovery/predict does) and the best MAE
+    within --latency-budget-ms wins
+  • the winner is refitted on train_recovery_lr.py's 80/20 user split and
+    written with its metrics to tuning/<date>/ (kept out of models/, which
+    model_store.py manages)
+
+    python scripts/tune_recovery_model.py --trials 80 --latency-budget-ms 20
+
+Outputs (in --out):
+  recovery_search.json        winner, holdout metrics, every trial
+  recovery_hparams.json       best MLP config → train_recovery_lr.py --hparams
+  recovery_candidate_mlp.pt   winner weights, when an MLP wins
+  recovery_candidate.joblib   preprocessor + estimator, when ridge/LightGBM wins
+"""
+import os
+
+# one thread per trial; parallelism comes from running trials side by side
+for _v in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+    os.environ.setdefault(_v, "1")
+
+import sys
+from pathlib import Path
+
+# allow imports from project root
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import argparse
+import json
+import time
+import warnings
+from datetime import date, datetime
+
+import joblib
+import numpy as np
+import optuna
+import torch
+from sklearn.linear_model import Ridge
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from sklearn.model_selection import GroupKFold, GroupShuffleSplit
+from sklearn.pipeline import Pipeline
+
+from recovery_training import (
+    MLP_DEFAULTS, debias, feature_columns, load_training_frame, make_preprocessor, train_mlp,
+)
+
+FAMILIES = ("mlp", "ridge", "lgbm")
+ES_FRACTION = 0.1                      # share of a training fold's users held out for early stopping
+
+
+# ── data ─────────────────────────────────────────────────────────────────────
+
+class Fold:
+    """
+    Train/validation arrays for one split, preprocessed once.  X_va is only
+    ever scored; models that early-stop use the es_idx rows of the training
+    set (a user-grouped slice of it) and fit on fit_idx.
+    """
+
+    def __init__(self, df, tr_idx, va_idx, num_feats, cat_feats, es_fraction=ES_FRACTION, seed=42):
+        df_tr, df_va = df.iloc[tr_idx].copy(), df.iloc[va_idx].copy()
+        debias(df_tr, df_va)
+        cols = num_feats + cat_feats
+        self.preproc = make_preprocessor(num_feats, cat_feats).fit(df_tr[cols])
+        self.X_tr = self.preproc.transform(df_tr[cols]).astype(np.float32)
+        self.X_va = self.preproc.transform(df_va[cols]).astype(np.float32)
+        self.y_tr = df_tr["y_obj"].to_numpy(float)
+        self.y_va = df_va["y_obj"].to_numpy(float)
+        self.y_mean, self.y_std = self.y_tr.mean(), self.y_tr.std()
+        self.sample = df_va[cols].iloc[[0]]          # one raw row for latency timing
+
+        # a single training user can't be split by user; fall back to rows
+        users = df_tr["user_id"].to_numpy()
+        groups = users if len(set(users)) > 1 else np.arange(len(users))
+        gss = GroupShuffleSplit(n_splits=1, test_size=es_fraction, random_state=seed)
+        self.fit_idx, self.es_idx = next(gss.split(self.X_tr, groups=groups))
+
+
+# ── models ───────────────────────────────────────────────────────────────────
+
+def suggest(trial: optuna.Trial, families) -> dict:
+    family = trial.suggest_categorical("family", list(families))
+    if family == "mlp":
+        return dict(
+            family=family,
+            hidden=trial.suggest_categorical("hidden", [16, 32, 64, 128]),
+            dropout=trial.suggest_float("dropout", 0.0, 0.5),
+            lr=trial.suggest_float("lr", 1e-4, 1e-2, log=True),
+            weight_decay=trial.suggest_float("weight_decay", 1e-6, 1e-2, log=True),
+            batch_size=trial.suggest_categorical("batch_size", [32, 128, 512]),
+        )
+    if family == "ridge":
+        return dict(family=family, alpha=trial.suggest_float("alpha", 1e-3, 1e3, log=True))
+    return dict(
+        family=family,
+        n_estimators=2000,
+        learning_rate=trial.suggest_float("learning_rate", 0.01, 0.2, log=True),
+        num_leaves=trial.suggest_int("num_leaves", 8, 128, log=True),
+        min_child_samples=trial.suggest_int("min_child_samples", 5, 100, log=True),
+        subsample=trial.suggest_float("subsample", 0.5, 1.0),
+        subsample_freq=1,
+        colsample_bytree=trial.suggest_float("colsample_bytree", 0.5, 1.0),
+        reg_lambda=trial.suggest_float("reg_lambda", 1e-3, 10.0, log=True),
+    )
+
+
+class Fitted:
+    """A model fitted on one fold, with a uniform predict on preprocessed X."""
+
+    def __init__(self, family, model, y_mean=0.0, y_std=1.0):
+        self.family, self.model, self.y_mean, self.y_std = family, model, y_mean, y_std
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        if self.family == "mlp":
+            with torch.no_grad():
+                return self.model(torch.from_numpy(X)).numpy() * self.y_std + self.y_mean
+        return self.model.predict(X)
+
+
+def fit(params: dict, fold: Fold) -> Fitted:
+    family = params["family"]
+    kw = {k: v for k, v in params.items() if k != "family"}
+    if family == "ridge":
+        return Fitted(family, Ridge(**kw).fit(fold.X_tr, fold.y_tr))
+
+    X_fit, y_fit = fold.X_tr[fold.fit_idx], fold.y_tr[fold.fit_idx]
+    X_es, y_es = fold.X_tr[fold.es_idx], fold.y_tr[fold.es_idx]
+    if family == "mlp":
+        model, _ = train_mlp(
+            X_fit, (y_fit - fold.y_mean) / fold.y_std, X_es, y_es,
+            fold.y_mean, fold.y_std, device=torch.device("cpu"), **kw,
+        )
+        return Fitted(family, model, fold.y_mean, fold.y_std)
+
+    import lightgbm as lgb
+    model = lgb.LGBMRegressor(objective="l1", n_jobs=1, verbose=-1, **kw)
+    model.fit(X_fit, y_fit, eval_set=[(X_es, y_es)], eval_metric="l1",
+              callbacks=[lgb.early_stopping(50, verbose=False)])
+    return Fitted(family, model)
+
+
+def latency_ms(fitted: Fitted, fold: Fold, reps: int = 200) -> float:
+    """p95 wall time of one request's preprocess + predict, in ms."""
+    for _ in range(10):
+        fitted.predict(fold.preproc.transform(fold.sample).astype(np.float32))
+    times = []
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        fitted.predict(fold.preproc.transform(fold.sample).astype(np.float32))
+        times.append(time.perf_counter() - t0)
+    return float(np.percentile(times, 95) * 1000)
+
+
+# ── search ───────────────────────────────────────────────────────────────────
+
+def run_search(folds, families, n_trials, jobs, timeout, seed):
+    def objective(trial):
+        params = suggest(trial, families)
+        maes = []
+        for k, fold in enumerate(folds):
+            fitted = fit(params, fold)
+            maes.append(mean_absolute_error(fold.y_va, fitted.predict(fold.X_va)))
+            trial.report(float(np.mean(maes)), k)
+            if trial.should_prune():
+                raise optuna.TrialPruned()
+        trial.set_user_attr("fold_mae", [float(m) for m in maes])
+        return float(np.mean(maes))
+
+    study = optuna.create_study(
+        direction="minimize",
+        sampler=optuna.samplers.TPESampler(seed=seed, multivariate=True, group=True),
+        pruner=optuna.pruners.MedianPruner(n_startup_trials=8, n_warmup_steps=1),
+    )
+    study.optimize(objective, n_trials=n_trials, n_jobs=jobs, timeout=timeout, gc_after_trial=True)
+    return study
+
+
+def pick_winner(study, fold, budget_ms, latencies, max_timed=15):
+    """
+    Best CV MAE whose single-row latency fits the budget.  Each candidate is
+    refitted on `fold` and timed here, one trial at a time, so parallel
+    trials do not skew the numbers and the search keeps no models around.
+    """
+    done = sorted(
+        (t for t in study.trials if t.state == optuna.trial.TrialState.COMPLETE),
+        key=lambda t: t.value,
+    )
+    for t in done[:max_timed]:
+        lat = latency_ms(fit(params_of(t), fold), fold)
+        latencies[t.number] = lat
+        ok = lat <= budget_ms
+        print(f"  ⏱️  trial {t.number:3d} {t.params['family']:5s} "
+              f"MAE {t.value:.3f}  p95 {lat:6.2f} ms {'✅' if ok else '❌'}")
+        if ok:
+            return t
+    return None
+
+
+def params_of(trial) -> dict:
+    return suggest(optuna.trial.FixedTrial(trial.params), FAMILIES)
+
+
+# ── refit + write ────────────────────────────────────────────────────────────
+
+def refit_holdout(df, params, num_feats, cat_feats, es_fraction=ES_FRACTION, seed=42):
+    """
+    Refit on train_recovery_lr.py's split and score the 20% held-out users;
+    early stopping uses a slice of the 80%, as in the search.
+    """
+    gss = GroupShuffleSplit(n_splits=1, test_size=0.2, random_state=seed)
+    tr_idx, va_idx = next(gss.split(df, groups=df["user_id"].values))
+    fold = Fold(df, tr_idx, va_idx, num_feats, cat_feats, es_fraction, seed)
+    fitted = fit(params, fold)
+    pred = fitted.predict(fold.X_va)
+    metrics = {
+        "mae":  float(mean_absolute_error(fold.y_va, pred)),
+        "rmse": float(np.sqrt(mean_squared_error(fold.y_va, pred))),
+        "r2":   float(r2_score(fold.y_va, pred)),
+        "latency_ms": latency_ms(fitted, fold),
+        "n_train": int(len(tr_idx)), "n_val": int(len(va_idx)),
+    }
+    return fold, fitted, metrics
+
+
+def trial_summary(t, latencies) -> dict:
+    return {
+        "number": t.number,
+        "state": t.state.name,
+        "params": t.params,
+        "cv_mae": t.value,
+        "fold_mae": t.user_attrs.get("fold_mae"),
+        "latency_ms": latencies.get(t.number),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search model families / hyper-parameters for the recovery model")
+    parser.add_argument("--trials", type=int, default=60)
+    parser.add_argument("--timeout", type=int, default=None, help="seconds; stop starting new trials after this")
+    parser.add_argument("--folds", type=int, default=5, help="grouped-by-user CV folds")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="parallel trials")
+    parser.add_argument("--families", default=",".join(FAMILIES), help="comma-separated subset of mlp,ridge,lgbm")
+    parser.add_argument("--latency-budget-ms", type=float, default=25.0, help="p95 single-row inference budget")
+    parser.add_argument("--out", type=Path, default=Path("tuning") / date.today().isoformat())
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--es-fraction", type=float, default=ES_FRACTION,
+                        help="share of each training fold's users the MLP / LightGBM early-stop on")
+    args = parser.parse_args()
+
+    families = [f for f in args.families.split(",") if f]
+    unknown = set(families) - set(FAMILIES)
+    if unknown:
+        parser.error(f"unknown families: {', '.join(sorted(unknown))}")
+
+    torch.set_num_threads(1)
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    warnings.filterwarnings("ignore", category=optuna.exceptions.ExperimentalWarning)
+    # eval_set= still works everywhere; newer LightGBM only nags about it
+    warnings.filterwarnings("ignore", message=".*'eval_set' is deprecated")
+
+    df, all_muscles = load_training_frame()
+    num_feats, cat_feats = feature_columns(all_muscles)
+    n_users = df["user_id"].nunique()
+    n_folds = min(args.folds, n_users)
+    print(f"📊 {len(df):,} labelled row(s) from {n_users:,} user(s); {n_folds}-fold grouped CV")
+
+    t0 = time.perf_counter()
+    folds = [
+        Fold(df, tr, va, num_feats, cat_feats, args.es_fraction, args.seed)
+        for tr, va in GroupKFold(n_splits=n_folds).split(df, groups=df["user_id"].values)
+    ]
+    print(f"🔧 Preprocessed folds in {time.perf_counter() - t0:.1f}s")
+
+    t0 = time.perf_counter()
+    study = run_search(folds, families, args.trials, args.jobs, args.timeout, args.seed)
+    states = {s.name: sum(t.state == s for t in study.trials) for s in optuna.trial.TrialState}
+    print(f"🔍 {len(study.trials)} trial(s) in {time.perf_counter() - t0:.0f}s on {args.jobs} worker(s): "
+          + ", ".join(f"{n.lower()} {c}" for n, c in states.items() if c))
+
+    latencies = {}
+    winner = pick_winner(study, folds[0], args.latency_budget_ms, latencies)
+    if winner is None:
+        print(f"❌ No completed trial met the {args.latency_budget_ms} ms latency budget")
+        sys.exit(1)
+
+    params = params_of(winner)
+    print(f"🏆 Winner: trial {winner.number} ({params['family']}) CV MAE {winner.value:.3f}")
+    fold, fitted, holdout = refit_holdout(df, params, num_feats, cat_feats, args.es_fraction)
+    print(f"   hold-out MAE {holdout['mae']:.3f}, RMSE {holdout['rmse']:.3f}, "
+          f"R² {holdout['r2']:.3f}, p95 {holdout['latency_ms']:.2f} ms")
+
+    args.out.mkdir(parents=True, exist_ok=True)
+    if params["family"] == "mlp":
+        torch.save(fitted.model.state_dict(), args.out / "recovery_candidate_mlp.pt")
+    else:
+        joblib.dump(Pipeline([("pre", fold.preproc), ("model", fitted.model)]),
+                    args.out / "recovery_candidate.joblib")
+
+    # serving runs an MLP, so always hand the best MLP config to the nightly trainer
+    mlp_trials = [t for t in study.trials
+                  if t.state == optuna.trial.TrialState.COMPLETE and t.params["family"] == "mlp"]
+    if mlp_trials:
+        best_mlp = params_of(min(mlp_trials, key=lambda t: t.value))
+        hp = {k: best_mlp[k] for k in MLP_DEFAULTS}
+        (args.out / "recovery_hparams.json").write_text(json.dumps(hp, indent=2))
+
+    report = {
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "rows": int(len(df)),
+        "users": int(n_users),
+        "folds": n_folds,
+        "latency_budget_ms": args.latency_budget_ms,
+        "winner": {**trial_summary(winner, latencies), "family": params["family"], "holdout": holdout},
+        "trials": [trial_summary(t, latencies) for t in study.trials],
+    }
+    (args.out / "recovery_search.json").write_text(json.dumps(report, indent=2, default=str))
+    print(f"✨ wrote winner + metrics → {args.out}/")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,21 @@
 #!/usr/bin/env python3
-import os
-import json
-import os, json, pprint, argparse
+import os, sys, pprint, argparse
 import pandas as pd
-from datetime import datetime
 from pathlib import Path
 from supabase import create_client, Client
 from dotenv import load_dotenv
+import dataset_store
+
+# allow imports from project root
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from app.utils.features import dataset_rows, USER_COLUMNS
+
 load_dotenv()
 
 # CLI flag
-parser = argparse.ArgumentParser(description="Append new daily-log rows to recovery_dataset.csv")
+parser = argparse.ArgumentParser(description="Append new daily-log rows to the recovery dataset store")
 parser.add_argument("--debug", action="store_true", help="verbose logging")
+parser.add_argument("--compact", action="store_true", help="merge partitions with many part files")
 args, unknown = parser.parse_known_args()
 DEBUG = args.debug
 
@@ -20,14 +24,23 @@ def dbg(*msg, **kw):
     if DEBUG:
         print(*msg, **kw)
 
-# Load current CSV
-csv_path = Path("recovery_dataset.csv")
-if not csv_path.exists():
-    raise FileNotFoundError("recovery_dataset.csv not found in backend.")
-
-df = pd.read_csv(csv_path, parse_dates=["date"])
-last_date = df["date"].max()
-dbg(f"🟢 recovery_dataset.csv has {len(df):,} rows (through {last_date.date()})")
+def compact_if_asked():
+    """--compact runs whether or not this run appended anything"""
+    if args.compact:
+        n = dataset_store.compact()
+        print(f"🗜️  Compacted {n} partition(s)")
+
+# Open the partitioned store (bootstrapping it from the legacy CSV once)
+if not dataset_store.exists():
+    if not dataset_store.LEGACY_CSV.exists():
+        raise FileNotFoundError("Neither recovery_dataset/ nor recovery_dataset.csv found in backend.")
+    n = dataset_store.bootstrap_from_csv()
+    print(f"📦 Bootstrapped {dataset_store.STORE_DIR}/ from {dataset_store.LEGACY_CSV} ({n:,} rows)")
+
+manifest = dataset_store.read_manifest()
+last_date = dataset_store.high_water_mark()
+dbg(f"🟢 dataset store has {sum(p['rows'] for p in manifest['partitions'].values()):,} "
+    f"row(s) in {len(manifest['partitions'])} partition(s) (through {last_date.date()})")
 print(f"🕐 Last training date: {last_date.date()}")
 
 # Connect to Supabase
@@ -39,189 +52,108 @@ if not url or not key:
 
 supabase: Client = create_client(url, key)
 
-# Fetch new daily logs with recovery_rating after last date
-response = (
-    supabase.table("daily_logs")
-    .select("*")
-    .gt("date", last_date.isoformat())
-    .not_.is_("recovery_rating", "null")
-    .execute()
+PAGE_SIZE = 1000     # PostgREST default max-rows
+IN_CHUNK  = 150      # ids per in_() filter, keeps the URL well under limits
+
+LOG_COLS = (
+    "id,user_id,date,sleep_start,sleep_end,sleep_quality,resting_hr,hrv,trained,"
+    "total_sets,failure_sets,total_rir,calories,macros,stress,motivation,soreness,"
+    "water_intake_l,split,split_template_id,recovery_rating"
 )
 
-new_logs = response.data
+def fetch_new_logs(since: str) -> list:
+    """Keyset-page through daily_logs on (date, id) instead of one unbounded select."""
+    rows, cursor = [], None
+    while True:
+        q = (
+            supabase.table("daily_logs")
+            .select(LOG_COLS)
+            .not_.is_("recovery_rating", "null")
+            .order("date").order("id")
+            .limit(PAGE_SIZE)
+        )
+        if cursor is None:
+            q = q.gt("date", since)
+        else:
+            d, i = cursor
+            q = q.or_(f"date.gt.{d},and(date.eq.{d},id.gt.{i})")
+        page = q.execute().data or []
+        rows.extend(page)
+        dbg(f"📄 fetched page of {len(page)} log(s), {len(rows):,} total")
+        if len(page) < PAGE_SIZE:
+            return rows
+        cursor = (page[-1]["date"], page[-1]["id"])
+
+def fetch_in(table: str, cols: str, column: str, values) -> list:
+    """Bulk lookup with in_(), chunked so each request stays small."""
+    values = sorted({v for v in values if v})
+    out = []
+    for i in range(0, len(values), IN_CHUNK):
+        out.extend(
+            supabase.table(table).select(cols).in_(column, values[i:i + IN_CHUNK]).execute().data or []
+        )
+    return out
+
+# Fetch new daily logs with recovery_rating after last date
+new_logs = fetch_new_logs(last_date.date().isoformat())
 if not new_logs:
     print("No new logs found.")
+    compact_if_asked()
     exit(0)
 
 print(f"Found {len(new_logs)} new log(s)")
 dbg("🔎 Example raw log:", pprint.pformat(new_logs[0])[:300] + " …")
 
 # Convert json to DataFrame
-new_df = pd.DataFrame(new_logs)
-
-unique_ids = list({row["user_id"] for row in new_logs})
-
-user_rows = (
-    supabase.table("users")
-    .select(
-        "id, age, sex, height, weight, goal, activity_level,"
-        "maintenance_calories, macro_targets"
-    )
-    .in_("id", unique_ids)
-    .execute()
-).data or []
+logs = pd.DataFrame(new_logs)
 
-user_cache = {u["id"]: u for u in user_rows}
-dbg(f"👥 Pulled static attrs for {len(user_cache)} user(s):", list(user_cache)[:5])
+# ---------------------------------------------------------------------
+# Prefetch everything the logs reference: 1 round trip per ≤150 ids
+# ---------------------------------------------------------------------
+users = pd.DataFrame(fetch_in(
+    "users",
+    ",".join(["id", *USER_COLUMNS]),
+    "id", logs["user_id"],
+))
+tpl_ids = logs["split_template_id"] if "split_template_id" in logs else []
+templates = pd.DataFrame(fetch_in("split_templates", "id,type", "id", tpl_ids))
+sessions = pd.DataFrame(fetch_in("split_sessions", "template_id,name,muscle_groups", "template_id", tpl_ids))
+dbg(f"👥 Pulled {len(users)} user(s), {len(templates)} template(s), {len(sessions)} session(s)")
 
 # ---------------------------------------------------------------------
-# 2⃣  Small helpers to resolve split_type & muscle_groups
-#     (cached so we only hit Supabase once per template / session)
+# Join logs → user → template → session, then normalise in one pass
 # ---------------------------------------------------------------------
-tpl_cache, sess_cache = {}, {}
-
-def lookup_split_info(tpl_id: str, session_name: str):
-    # Template → type  ("strength" / "cardio" / "mixed")
-    if tpl_id and tpl_id not in tpl_cache:
-        rec = (
-            supabase.table("split_templates")
-            .select("id,type")
-            .eq("id", tpl_id)
-            .single()
-            .execute()
-        )
-        rec = (
-            supabase.table("split_templates")
-            .select("id,type")
-            .eq("id", tpl_id)
-            .limit(1)   # ← safer than .single()
-            .execute()
-        )
-        tpl_cache[tpl_id] = (rec.data[0] if rec.data else {}).get("type", "")
-    t_type = tpl_cache.get(tpl_id, "")
-
-    # Session → muscle_groups  (list[str])
-    key = (tpl_id, session_name or "")
-    if key not in sess_cache:
-        rec = (
-            supabase.table("split_sessions")
-            .select("muscle_groups")
-            .eq("template_id", tpl_id)
-            .eq("name", session_name or "")
-            .limit(1)
-            .execute()
-        )
-        sess_cache[key] = (rec.data[0] if rec.data else {}).get("muscle_groups", [])
-    muscles = sess_cache[key]
-
-    dbg(f"→ tpl {tpl_id} session {session_name!r} → type={t_type!r} muscles={muscles[:3]}…")
-
-    return t_type, muscles
-
-# Flatten nested columns
-def normalize_log(row):
-    # ---------- 0️⃣  static skeleton (no duplicates) ------------------
-    base = {
-        "user_id":        row["user_id"],
-        "date":           pd.to_datetime(row["date"]),
-        "sleep_h":        None,          # ← we’ll fill below
-        "sleep_quality":  row.get("sleep_quality"),
-        "resting_hr":     row.get("resting_hr"),
-        "hrv":            row.get("hrv"),
-        "trained":        row.get("trained"),
-        "total_sets":     row.get("total_sets"),
-        "failure_sets":   row.get("failure_sets"),
-        "total_rir":      row.get("total_rir"),
-        # macros / energy – filled later
-        "cal_deficit_pct": None,
-        "protein_pct":     None,
-        "carbs_pct":       None,
-        "fat_pct":         None,
-        # subjective
-        "stress":        row.get("stress"),
-        "motivation":    row.get("motivation"),
-        "soreness":      row.get("soreness"),
-        "water_intake_l":row.get("water_intake_l"),
-        # placeholder; will be resolved by lookup_split_info
-        "split_type":    "",
-        "muscle_groups": "[]",
-        # static user attrs – will be patched from user_cache
-        "age":            None,
-        "sex":            None,
-        "height":         None,
-        "weight":         None,
-        "goal":           None,
-        "activity_level": None,
-        # label
-        "recovery_rating": row.get("recovery_rating"),
-    }
-
-    # ---------- 1️⃣  pull static user attributes ----------------------
-    u = user_cache.get(row["user_id"], {})
-    base.update(
-        age=u.get("age"),
-        sex=u.get("sex"),
-        height=u.get("height"),
-        weight=u.get("weight"),
-        goal=u.get("goal"),
-        activity_level=u.get("activity_level"),
-    )
-
-    # ---------- 2️⃣  split type & muscle groups -----------------------
-    tpl_id       = row.get("split_template_id")
-    session_name = row.get("split")                 # e.g. "Legs & Shoulders"
-    t_type, mg   = lookup_split_info(tpl_id, session_name)
-    base["split_type"]    = t_type or ""            # blank safer than wrong
-    base["muscle_groups"] = json.dumps(mg)
-
-    # ---------- 3️⃣  sleep hours --------------------------------------
-    sh, eh = row.get("sleep_start"), row.get("sleep_end")
-    try:
-        if sh and eh:
-            shh, shm = map(int, sh.split(":"))
-            ehh, ehm = map(int, eh.split(":"))
-            mins = (ehh*60+ehm) - (shh*60+shm)
-            if mins < 0:
-                mins += 24*60
-            base["sleep_h"] = mins / 60.0
-    except Exception:
-        pass                                             # keep None
-
-    # ---------- 4️⃣  macro percentages -------------------------------
-    macros   = row.get("macros") or {}
-    targets_from_log  = row.get("macro_targets") or {}            # almost always {}
-    targets_from_user = (user_cache.get(row["user_id"], {}) or {}).get("macro_targets", {})
-    targets = {**targets_from_user, **targets_from_log}           # log overrides user
-
-    # ❷ helper to avoid huge numbers / div-by-zero        
-    def pct(actual, target):
-        return (actual / target) * 100 if actual not in (None, 0) and target else None
-
-    base["protein_pct"] = pct(macros.get("protein"), targets.get("protein"))
-    base["carbs_pct"]   = pct(macros.get("carbs"),   targets.get("carbs"))
-    base["fat_pct"]     = pct(macros.get("fat"),     targets.get("fat"))
-
-    # ---------- 5️⃣  calorie deficit ---------------------------------
-    cals  = row.get("calories")
-    maint = row.get("maintenance_calories") or u.get("maintenance_calories") or 2000
-    if cals is not None:
-        base["cal_deficit_pct"] = (cals - maint) / maint
-
-    dbg("📝 Row normalised:", {k: base[k] for k in
-         ("user_id","date","split_type","muscle_groups","sleep_h","cal_deficit_pct")})
-    return base
-
-# Apply normalization
-processed = [normalize_log(row) for row in new_logs]
-new_df_flat = pd.DataFrame(processed)
-dbg("📄 First 3 processed rows:\n" + new_df_flat.head(3).to_string(index=False))
-
-# Ensure same columns and types
-new_df_flat = new_df_flat[df.columns]
-
-# Append to dataset
-df = pd.concat([df, new_df_flat], ignore_index=True)
-df.drop_duplicates(subset=["user_id", "date"], keep="last", inplace=True)
-dbg(f"💾 New total rows in CSV: {len(df):,}")
-df.to_csv(csv_path, index=False)
-print(f"Appended {len(new_df_flat)} new row(s) to recovery_dataset.csv")
\ No newline at end of file
+def _frame(df: pd.DataFrame, cols) -> pd.DataFrame:
+    return df if not df.empty else pd.DataFrame(columns=cols)
+
+users     = _frame(users, ["id", *USER_COLUMNS])
+templates = _frame(templates, ["id", "type"])
+sessions  = _frame(sessions, ["template_id", "name", "muscle_groups"])
+for c in ("split", "split_template_id"):
+    if c not in logs:
+        logs[c] = None
+
+df = (
+    logs
+    .merge(users.rename(columns={"id": "user_id"}), on="user_id", how="left")
+    .merge(templates.rename(columns={"id": "split_template_id", "type": "split_type"}),
+           on="split_template_id", how="left")
+    .merge(sessions.drop_duplicates(["template_id", "name"])
+                   .rename(columns={"template_id": "split_template_id", "name": "split"}),
+           on=["split_template_id", "split"], how="left")
+)
+
+# same normalisation the trainer and /recovery/predict use
+out = dataset_rows(df)
+
+dbg("📄 First 3 processed rows:\n" + out.head(3).to_string(index=False))
+
+# Ensure same columns; dataset_store writes them with the DATASET_DTYPES schema
+new_df_flat = out[manifest["columns"]]
+
+# Append only the new rows as fresh part files; nothing already on disk is rewritten
+written = dataset_store.append(new_df_flat)
+dbg(f"💾 New high-water mark: {dataset_store.high_water_mark().date()}")
+print(f"Appended {written} new row(s) to {dataset_store.STORE_DIR}/")
+
+compact_if_asked()
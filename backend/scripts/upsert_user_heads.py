@@ -1,59 +1,214 @@
 #!/usr/bin/env python3
+"""
+Upload user_recovery_heads.csv (written by train_recovery_lr.py) as the
+heads of one model version (--version, default: what models/latest points
+at, so run it after `model_store.py commit`).  Workers serving another
+version keep reading that version's heads.  --prune drops the heads of
+versions no longer in the model store.
+
+Two writers, picked by what the environment provides:
+
+  DATABASE_URL set   stream the CSV in chunks with COPY into a temp staging
+                     table, then ONE  INSERT … SELECT … JOIN users …
+                     ON CONFLICT DO UPDATE.  Heads for deleted users are
+                     dropped by the join; nothing is sent per row.
+  otherwise          PostgREST: existence check with chunked in_() lookups,
+                     then upserts of --chunk-size rows, each retried with
+                     backoff.
+"""
+import sys
+from pathlib import Path
+
+# allow imports from project root
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import argparse
+import io
 import os
+import time
+from datetime import datetime
+
 import pandas as pd
-from supabase import create_client, Client
-from pathlib import Path
 from dotenv import load_dotenv
 
+from app.utils.artifacts import read_manifest, version_of
+from app.utils.heads import LEGACY_VERSION
+
 load_dotenv()
 
-# ----- locate the CSV wherever the trainer wrote it -----
-ROOT = Path(__file__).resolve().parents[2]  # repo root
-candidates = [
-    ROOT / "user_recovery_heads.csv",
-    ROOT / "backend" / "user_recovery_heads.csv",
-]
-csv_path = next((p for p in candidates if p.exists()), None)
-
-if not csv_path:
-    print("⚠️  no heads CSV, skipping")
-    exit(0)
-
-print(f"📄 Using heads CSV at: {csv_path}")
-df = pd.read_csv(csv_path)
-print(f"Upserting {len(df)} heads…")
-
-# ----- ALWAYS use the service key for writes -----
-url = os.getenv("SUPABASE_URL")
-key = os.getenv("SUPABASE_SERVICE_KEY") or os.getenv("SUPABASE_KEY")
-if not url or not key:
-     raise EnvironmentError("Missing SUPABASE_URL or SUPABASE_SERVICE_KEY/KEY")
-
-supabase: Client = create_client(url, key)
-
-# ----- filter to existing users -----
-all_heads = df.to_dict(orient="records")
-user_ids = [h["user_id"] for h in all_heads]
-resp = supabase.table("users").select("id").in_("id", user_ids).execute()
-existing_ids = {u["id"] for u in (resp.data or [])}
-filtered = [h for h in all_heads if h["user_id"] in existing_ids]
-filtered_out = len(all_heads) - len(filtered)
-if filtered_out:
-    print(f"⚠️ Filtered out {filtered_out} head(s) for missing users")
-if not filtered:
-    print("⚠️ No valid heads to upsert, exiting")
-    exit(0)
-
-# ----- upsert -----
-upsert_resp = (
-    supabase
-    .table("user_recovery_heads")
-    .upsert(filtered, on_conflict="user_id")
-    .execute()
-)
-
-data = getattr(upsert_resp, "data", None)
-if not data:
-    print(f"❌ Upsert failed. Raw response: {upsert_resp}")
-else:
-    print(f"✅ Upsert succeeded, wrote {len(data)} row(s).")
\ No newline at end of file
+MODELS_DIR = Path("models")
+HEAD_COLS = ["user_id", "model_version", "bias", "slope", "n", "sum_r", "sum_rr", "sum_e", "sum_re", "fitted_through"]
+DEFAULTS = {"slope": 1.0, "n": 0.0, "sum_r": 0.0, "sum_rr": 0.0, "sum_e": 0.0, "sum_re": 0.0}
+IN_CHUNK = 150       # ids per in_() filter, keeps the URL well under limits
+
+
+def find_csv() -> Path:
+    """Locate the CSV wherever the trainer wrote it."""
+    root = Path(__file__).resolve().parents[2]  # repo root
+    candidates = [root / "user_recovery_heads.csv", root / "backend" / "user_recovery_heads.csv"]
+    return next((p for p in candidates if p.exists()), None)
+
+
+def read_chunks(csv_path: Path, chunk_size: int, version: str):
+    """CSV → bounded DataFrames with every head column present (older CSVs lack the sums)."""
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_size):
+        chunk = chunk.assign(model_version=version).reindex(columns=HEAD_COLS)
+        yield chunk.fillna(DEFAULTS)
+
+
+def stored_versions(root: Path = MODELS_DIR) -> list:
+    """Versions the model store still holds, plus the legacy heads' ''."""
+    names = [d.name for d in root.iterdir()
+             if d.is_dir() and not d.is_symlink() and read_manifest(d) is not None]
+    return sorted(names) + [LEGACY_VERSION]
+
+
+# ── Postgres: COPY → staging → INSERT … SELECT ───────────────────────────────
+
+def upsert_sql(csv_path: Path, chunk_size: int, version: str, keep=None):
+    from app.database import engine
+
+    cols = ", ".join(HEAD_COLS)
+    updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in HEAD_COLS if c not in ("user_id", "model_version"))
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            CREATE TEMP TABLE heads_stage (
+                user_id text, model_version text, bias float8, slope float8,
+                n float8, sum_r float8, sum_rr float8, sum_e float8, sum_re float8,
+                fitted_through date
+            ) ON COMMIT DROP
+        """)
+        staged = 0
+        for chunk in read_chunks(csv_path, chunk_size, version):
+            buf = io.StringIO()
+            chunk.to_csv(buf, index=False, header=False)
+            buf.seek(0)
+            cur.copy_expert(f"COPY heads_stage ({cols}) FROM STDIN WITH (FORMAT csv)", buf)
+            staged += len(chunk)
+            print(f"  … staged {staged:,} head(s)")
+
+        # the join is the existence filter; DISTINCT ON keeps one row per user
+        cur.execute(f"""
+            INSERT INTO user_recovery_heads ({cols}, updated_at)
+            SELECT DISTINCT ON (s.user_id) {", ".join("s." + c for c in HEAD_COLS)}, now()
+            FROM heads_stage s
+            JOIN users u ON u.id = s.user_id
+            ORDER BY s.user_id
+            ON CONFLICT (user_id, model_version) DO UPDATE SET {updates}, updated_at = now()
+        """)
+        written = cur.rowcount
+        dropped = 0
+        if keep is not None:
+            cur.execute("DELETE FROM user_recovery_heads WHERE NOT (model_version = ANY(%s))", (list(keep),))
+            dropped = cur.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    if staged - written:
+        print(f"⚠️ Skipped {staged - written} head(s) for missing or duplicate users")
+    print(f"✅ Upsert succeeded, wrote {written:,} row(s) for {version}.")
+    if dropped:
+        print(f"🧹 Dropped {dropped:,} head(s) of pruned model versions")
+
+
+# ── PostgREST fallback ───────────────────────────────────────────────────────
+
+def with_retries(fn, attempts: int = 4, base_delay: float = 1.0):
+    for i in range(attempts):
+        try:
+            return fn()
+        except Exception as e:
+            if i == attempts - 1:
+                raise
+            delay = base_delay * 2 ** i
+            print(f"⚠️ {type(e).__name__}: {e} — retrying in {delay:.0f}s")
+            time.sleep(delay)
+
+
+def upsert_postgrest(csv_path: Path, chunk_size: int, version: str, keep=None):
+    from supabase import create_client, Client
+
+    # ----- ALWAYS use the service key for writes -----
+    url = os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_SERVICE_KEY") or os.getenv("SUPABASE_KEY")
+    if not url or not key:
+        raise EnvironmentError("Missing SUPABASE_URL or SUPABASE_SERVICE_KEY/KEY")
+    supabase: Client = create_client(url, key)
+
+    written = skipped = 0
+    for chunk in read_chunks(csv_path, chunk_size, version):
+        chunk = chunk.drop_duplicates("user_id", keep="last")
+        ids = chunk["user_id"].tolist()
+        existing = set()
+        for i in range(0, len(ids), IN_CHUNK):
+            resp = with_retries(
+                lambda: supabase.table("users").select("id").in_("id", ids[i:i + IN_CHUNK]).execute()
+            )
+            existing.update(u["id"] for u in (resp.data or []))
+        rows = chunk[chunk["user_id"].isin(existing)]
+        skipped += len(chunk) - len(rows)
+        if rows.empty:
+            continue
+        records = rows.astype(object).where(rows.notna(), None).to_dict(orient="records")
+        # the ORM's onupdate doesn't run here; serving caches probe this column
+        stamp = datetime.utcnow().isoformat()          # naive UTC, like the ORM default
+        for r in records:
+            r["updated_at"] = stamp
+        resp = with_retries(
+            lambda: supabase.table("user_recovery_heads").upsert(records, on_conflict="user_id,model_version").execute()
+        )
+        if not getattr(resp, "data", None):
+            raise RuntimeError(f"Upsert failed. Raw response: {resp}")
+        written += len(resp.data)
+        print(f"  … wrote {written:,} head(s)")
+
+    if skipped:
+        print(f"⚠️ Filtered out {skipped} head(s) for missing users")
+    print(f"✅ Upsert succeeded, wrote {written:,} row(s) for {version}.")
+    if keep is not None:
+        resp = with_retries(
+            lambda: supabase.table("user_recovery_heads").delete()
+            .not_.in_("model_version", list(keep)).execute()
+        )
+        if resp.data:
+            print(f"🧹 Dropped {len(resp.data):,} head(s) of pruned model versions")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upload per-user recovery heads")
+    parser.add_argument("--csv", type=Path, help="heads CSV (default: wherever the trainer wrote it)")
+    parser.add_argument("--chunk-size", type=int, default=None,
+                        help="rows per COPY chunk / PostgREST request (default 50000 / 1000)")
+    parser.add_argument("--postgrest", action="store_true", help="use PostgREST even if DATABASE_URL is set")
+    parser.add_argument("--version", help="model version the heads were fitted on (default: models/latest)")
+    parser.add_argument("--prune", action="store_true",
+                        help="also delete heads of versions no longer in models/")
+    args = parser.parse_args()
+
+    version = args.version or version_of(MODELS_DIR / "latest")
+    if not version:
+        sys.exit("❌ no --version and no models/latest; commit the model first")
+    keep = stored_versions() if args.prune else None
+    if keep is not None and version not in keep:
+        sys.exit(f"❌ --prune: {version} is not in {MODELS_DIR}/, refusing to drop its heads")
+
+    csv_path = args.csv or find_csv()
+    if not csv_path or not csv_path.exists():
+        print("⚠️  no heads CSV, skipping")
+        return
+    print(f"📄 Using heads CSV at: {csv_path}")
+
+    if os.getenv("DATABASE_URL") and not args.postgrest:
+        upsert_sql(csv_path, args.chunk_size or 50_000, version, keep)
+    else:
+        upsert_postgrest(csv_path, args.chunk_size or 1_000, version, keep)
+
+
+if __name__ == "__main__":
+    main()
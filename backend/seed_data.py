@@ -1,64 +1,381 @@
 # backend/seed_data.py
+"""
+Seed the database with synthetic users and daily logs at production scale.
 
-from datetime import date, timedelta
-from app.models import Base, User, DailyLog
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+    python seed_data.py --users 1000 --days 180
+
+Every synthetic user gets a custom split template, a profile, `--days` of
+daily logs ending today, a per-user recovery head and (optionally) a
+recovery prediction per logged day.  A handful of rule templates are
+upserted once so the digest / analytics endpoints have something to match.
+
+All rows are written with bulk `INSERT`s in batches of `--batch-size`, so
+seeding 10k × 365 logs is a few minutes instead of hours.  Seeded users all
+share the `--email-prefix` so they can be found (or wiped with `--reset`).
+"""
+
+import argparse
 import os
+import uuid
+from datetime import date, datetime, timedelta
+
+import numpy as np
 from dotenv import load_dotenv
+from sqlalchemy import create_engine, delete, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from app.models import (
+    Base, User, DailyLog, SplitTemplate, SplitSession, RuleTemplate,
+    UserRecoveryHead, RecoveryPrediction, DailyDigest, pwd_context,
+)
 
 # Load .env
 load_dotenv()
 
-# Connect
-engine = create_engine(os.getenv("DATABASE_URL"), echo=True)
-Session = sessionmaker(bind=engine)
+SPLIT_LIBRARY = [
+    ("Push/Pull/Legs", "strength", [
+        ("Push", ["Chest", "Shoulders", "Triceps"]),
+        ("Pull", ["Back", "Biceps", "Forearms"]),
+        ("Legs", ["Quads", "Glutes", "Hamstrings"]),
+    ]),
+    ("Upper/Lower", "strength", [
+        ("Upper", ["Chest", "Back", "Shoulders", "Arms"]),
+        ("Lower", ["Quads", "Hamstrings", "Glutes", "Calves"]),
+    ]),
+    ("Full-Body", "strength", [
+        ("Full Body", ["Chest", "Back", "Legs", "Arms", "Shoulders"]),
+    ]),
+    ("3×/week Run", "cardio", [
+        ("Run", ["Cardio"]),
+    ]),
+    ("Strength + Cardio Mix", "mixed", [
+        ("Upper", ["Chest", "Back", "Shoulders"]),
+        ("Cycle", ["Cardio"]),
+        ("Lower", ["Quads", "Hamstrings", "Glutes"]),
+        ("Run", ["Cardio"]),
+    ]),
+]
+
+SEED_RULES = [
+    {
+        "id": "seed-short-sleep",
+        "description": "Short sleep",
+        "conditions": [{"field": "sleep_h", "operator": "<", "value": 6}],
+        "advice": "You slept under 6 h — keep today's session light.",
+        "for_goals": None,
+        "timeframe": "daily",
+    },
+    {
+        "id": "seed-high-stress",
+        "description": "High stress",
+        "conditions": [{"field": "stress", "operator": ">=", "value": 4}],
+        "advice": "Stress is high — prioritise a wind-down routine tonight.",
+        "for_goals": None,
+        "timeframe": "daily",
+    },
+    {
+        "id": "seed-cut-deficit",
+        "description": "Aggressive deficit while cutting",
+        "conditions": [{"field": "cal_deficit_pct", "operator": "<", "value": -0.25}],
+        "advice": "Your deficit is steep — consider a refeed day.",
+        "for_goals": ["cutting"],
+        "timeframe": "daily",
+    },
+    {
+        "id": "seed-weekly-volume",
+        "description": "Low weekly volume",
+        "conditions": [{"field": "weekly_total_sets", "operator": "<", "value": 30}],
+        "advice": "Weekly volume was low — add a set or two per session.",
+        "for_goals": ["bulking", "performance"],
+        "timeframe": "weekly",
+    },
+]
+
+GOALS = ["cutting", "bulking", "performance", "maintenance"]
+ACTIVITY = ["low", "moderate", "high"]
+
+
+def gen_id() -> str:
+    return str(uuid.uuid4())
+
+
+def _fmt_hhmm(minutes: np.ndarray) -> list:
+    minutes = np.mod(minutes.astype(int), 24 * 60)
+    return [f"{m // 60:02d}:{m % 60:02d}" for m in minutes]
+
+
+def make_user(i: int, prefix: str, password_hash: str, rng: np.random.Generator) -> dict:
+    sex = "Male" if rng.random() < 0.5 else "Female"
+    height = float(rng.normal(178 if sex == "Male" else 165, 7))
+    weight = float(rng.normal(82 if sex == "Male" else 64, 10))
+    maintenance = int(rng.normal(2600 if sex == "Male" else 2100, 200))
+    return {
+        "id": gen_id(),
+        "email": f"{prefix}+{i}@example.com",
+        "password_hash": password_hash,
+        "first_name": f"Load{i}",
+        "age": int(rng.integers(18, 60)),
+        "sex": sex,
+        "height": round(height, 1),
+        "height_unit": "cm",
+        "weight": round(weight, 1),
+        "weight_unit": "kg",
+        "goal": GOALS[int(rng.integers(len(GOALS)))],
+        "activity_level": ACTIVITY[int(rng.integers(len(ACTIVITY)))],
+        "maintenance_calories": maintenance,
+        "macro_targets": {
+            "protein": int(weight * 2.0),
+            "carbs": int(weight * 3.5),
+            "fat": int(weight * 0.9),
+        },
+        "auto_nutrition": True,
+        "has_completed_onboarding": True,
+        "created_at": datetime.utcnow(),
+    }
+
+
+def make_split(user_id: str, rng: np.random.Generator):
+    name, kind, sessions = SPLIT_LIBRARY[int(rng.integers(len(SPLIT_LIBRARY)))]
+    tpl = {
+        "id": gen_id(),
+        "user_id": user_id,
+        "name": name,
+        "type": kind,
+        "is_preset": 0,
+        "created_at": datetime.utcnow(),
+    }
+    sess = [
+        {"id": gen_id(), "template_id": tpl["id"], "name": s, "muscle_groups": mg}
+        for s, mg in sessions
+    ]
+    return tpl, sess
+
+
+def make_logs(user: dict, tpl: dict, sessions: list, days: int, rng: np.random.Generator):
+    """
+    Vectorised generator for one user's history: a latent per-user baseline plus
+    day-level noise, with training days following the split rotation the same
+    way `upsert_daily_log` infers it (weekday % len(sessions)).
+    """
+    today = date.today()
+    dates = [today - timedelta(days=d) for d in range(days - 1, -1, -1)]
+    n = len(dates)
+
+    base_sleep = rng.normal(7.2, 0.6)
+    base_rhr = rng.normal(58, 6)
+    base_hrv = rng.normal(65, 12)
+
+    trained = (rng.random(n) < 0.6).astype(int)
+    sleep_h = np.clip(rng.normal(base_sleep, 0.9, n), 3.5, 10.5)
+    sleep_start = rng.normal(23 * 60, 45, n)
+    sleep_end = sleep_start + sleep_h * 60
+    sleep_q = np.clip(np.rint(1 + (sleep_h - 4) * 0.6 + rng.normal(0, 0.7, n)), 1, 5).astype(int)
+    stress = np.clip(rng.integers(1, 6, n), 1, 5)
+    motivation = np.clip(rng.integers(1, 6, n), 1, 5)
+    soreness = np.clip(np.rint(1 + trained * rng.integers(0, 4, n)), 1, 5).astype(int)
+    total_sets = np.where(trained == 1, rng.integers(10, 28, n), 0)
+    failure_sets = np.where(trained == 1, rng.integers(0, 5, n), 0)
+    total_rir = np.where(trained == 1, rng.integers(5, 40, n), 0)
+    calories = np.rint(rng.normal(user["maintenance_calories"], 250, n)).astype(int)
+    water = np.round(np.clip(rng.normal(2.6, 0.6, n), 0.5, 5.0), 1)
+    rhr = np.rint(base_rhr + rng.normal(0, 3, n) + stress).astype(int)
+    hrv = np.round(base_hrv + rng.normal(0, 8, n) - 2 * stress, 1)
+
+    rating = (
+        55
+        + 4.0 * (sleep_h - 7)
+        + 3.0 * (sleep_q - 3)
+        - 2.5 * (stress - 3)
+        - 2.0 * (soreness - 1)
+        + 0.3 * (hrv - base_hrv)
+        + rng.normal(0, 6, n)
+    )
+    rating = np.clip(np.rint(rating), 0, 100).astype(int)
+
+    t = user["macro_targets"]
+    prot = np.rint(t["protein"] * rng.normal(0.95, 0.15, n)).astype(int)
+    carb = np.rint(t["carbs"] * rng.normal(0.95, 0.2, n)).astype(int)
+    fat = np.rint(t["fat"] * rng.normal(1.0, 0.2, n)).astype(int)
+
+    starts = _fmt_hhmm(sleep_start)
+    ends = _fmt_hhmm(sleep_end)
+    now = datetime.utcnow()
 
-def seed():
+    logs = []
+    for i, d in enumerate(dates):
+        is_trained = bool(trained[i])
+        logs.append({
+            "id": gen_id(),
+            "user_id": user["id"],
+            "date": d,
+            "trained": int(trained[i]),
+            "split": sessions[d.weekday() % len(sessions)]["name"] if is_trained else None,
+            "split_template_id": tpl["id"] if is_trained else None,
+            "total_sets": int(total_sets[i]),
+            "failure_sets": int(failure_sets[i]),
+            "total_rir": int(total_rir[i]),
+            "sleep_start": starts[i],
+            "sleep_end": ends[i],
+            "sleep_quality": int(sleep_q[i]),
+            "resting_hr": int(rhr[i]),
+            "hrv": float(hrv[i]),
+            "soreness": int(soreness[i]),
+            "calories": int(calories[i]),
+            "macros": {"protein": int(prot[i]), "carbs": int(carb[i]), "fat": int(fat[i])},
+            "weight": user["weight"],
+            "weight_unit": "kg",
+            "stress": int(stress[i]),
+            "motivation": int(motivation[i]),
+            "recovery_rating": int(rating[i]),
+            "water_intake_l": float(water[i]),
+            "created_at": now,
+        })
+    return logs
+
+
+class BulkWriter:
+    """Buffers rows per model and flushes them with one executemany INSERT."""
+
+    def __init__(self, session, batch_size: int):
+        self.session = session
+        self.batch_size = batch_size
+        self.buffers = {}
+        self.counts = {}
+
+    def add(self, model, rows):
+        buf = self.buffers.setdefault(model, [])
+        buf.extend(rows)
+        if len(buf) >= self.batch_size:
+            self.flush(model)
+
+    def flush(self, model=None):
+        # parents before children so foreign keys are always satisfied
+        order = [User, SplitTemplate, SplitSession, DailyLog, UserRecoveryHead, RecoveryPrediction]
+        for m in ([model] if model else order):
+            rows = self.buffers.get(m)
+            if not rows:
+                continue
+            if model is not None:
+                # flushing a child early would violate FKs: push parents first
+                for parent in order[:order.index(m)]:
+                    self.flush(parent)
+            self.session.execute(insert(m), rows)
+            self.counts[m.__tablename__] = self.counts.get(m.__tablename__, 0) + len(rows)
+            self.buffers[m] = []
+
+
+def reset(session, prefix: str):
+    ids = select(User.id).where(User.email.like(f"{prefix}+%"))
+    session.execute(delete(RecoveryPrediction).where(RecoveryPrediction.user_id.in_(ids)))
+    session.execute(delete(UserRecoveryHead).where(UserRecoveryHead.user_id.in_(ids)))
+    session.execute(delete(DailyDigest).where(DailyDigest.user_id.in_(ids)))
+    session.execute(delete(DailyLog).where(DailyLog.user_id.in_(ids)))
+    tpl_ids = select(SplitTemplate.id).where(SplitTemplate.user_id.in_(ids))
+    session.execute(
+        User.__table__.update().where(User.id.in_(ids)).values(split_template_id=None)
+    )
+    session.execute(delete(SplitSession).where(SplitSession.template_id.in_(tpl_ids)))
+    session.execute(delete(SplitTemplate).where(SplitTemplate.id.in_(tpl_ids)))
+    session.execute(delete(User).where(User.email.like(f"{prefix}+%")))
+    session.commit()
+
+
+def seed_rules(session):
+    existing = set(session.scalars(select(RuleTemplate.id)).all())
+    new = [r for r in SEED_RULES if r["id"] not in existing]
+    if new:
+        session.execute(insert(RuleTemplate), new)
+    return len(new)
+
+
+def seed(users: int = 1, days: int = 3, batch_size: int = 5000, prefix: str = "loadtest",
+         seed_value: int = 42, with_predictions: bool = True, do_reset: bool = False,
+         echo: bool = False):
+    engine = create_engine(os.getenv("DATABASE_URL"), echo=echo)
+    Session = sessionmaker(bind=engine)
     Base.metadata.create_all(engine)  # ensures tables exist
 
     session = Session()
-    # 1) Create dummy user
-    user = User(
-        email="testuser@example.com",
-        age=25,
-        sex="other",
-        height=175.0,
-        weight=70.0,
-        goal="bulking",
-        split_template="Upper/Lower",
-        maintenance_calories=2500,
-        macro_targets={"protein":150, "carbs":250, "fat":70},
-    )
-    session.add(user)
-    session.commit()  # need ID for foreign keys
-
-    # 2) Create 3 days of logs
-    for i in range(3):
-        log = DailyLog(
-            user_id=user.id,
-            date=date.today() - timedelta(days=i),
-            trained=1 if i % 2 == 0 else 0,
-            split="Upper" if i % 2 == 0 else None,
-            total_sets=12 if i % 2 == 0 else 0,
-            failure_sets=2 if i % 2 == 0 else 0,
-            total_rir=20 if i % 2 == 0 else 0,
-            sleep_start="23:00",
-            sleep_end="07:00",
-            sleep_quality=4,
-            resting_hr=60,
-            hrv=45.5,
-            soreness={"Upper":"Low", "Lower":"High"} if i % 2 == 0 else {"Upper":"Med"},
-            calories=2600,
-            macros={"protein":140, "carbs":260, "fat":80},
-            stress=3,
-            motivation=8,
-        )
-        session.add(log)
+    if do_reset:
+        reset(session, prefix)
+        print(f"🧹 Removed previous '{prefix}+*' users")
+
+    rng = np.random.default_rng(seed_value)
+    # bcrypt is deliberately slow: hash once, every seeded user gets the same password
+    password_hash = pwd_context.hash("password123")
+    start_idx = session.query(User).filter(User.email.like(f"{prefix}+%")).count()
+
+    n_rules = seed_rules(session)
+    writer = BulkWriter(session, batch_size)
+
+    for i in range(start_idx, start_idx + users):
+        user = make_user(i, prefix, password_hash, rng)
+        tpl, sessions = make_split(user["id"], rng)
+        logs = make_logs(user, tpl, sessions, days, rng)
+
+        # users ↔ split_templates reference each other; link the template afterwards
+        writer.add(User, [user])
+        writer.add(SplitTemplate, [tpl])
+        writer.add(SplitSession, sessions)
+        writer.add(DailyLog, logs)
+
+        ratings = np.array([l["recovery_rating"] for l in logs], dtype=float)
+        writer.add(UserRecoveryHead, [{
+            "user_id": user["id"],
+            "bias": float(rng.normal(0, 3)),
+            "slope": 1.0,
+            "updated_at": datetime.utcnow(),
+        }])
+        if with_predictions:
+            noisy = np.clip(ratings + rng.normal(0, 5, len(ratings)), 0, 100)
+            writer.add(RecoveryPrediction, [
+                {"user_id": user["id"], "date": l["date"], "score": float(s)}
+                for l, s in zip(logs, noisy)
+            ])
 
+        if (i - start_idx + 1) % 100 == 0:
+            writer.flush()
+            session.commit()
+            print(f"  … {i - start_idx + 1:,}/{users:,} users")
+
+    writer.flush()
+    # point each seeded user at their own template in one statement
+    session.execute(
+        User.__table__.update()
+        .where(User.email.like(f"{prefix}+%"), User.split_template_id.is_(None))
+        .values(split_template_id=select(SplitTemplate.id)
+                .where(SplitTemplate.user_id == User.id)
+                .limit(1)
+                .scalar_subquery())
+    )
     session.commit()
     session.close()
+
     print("Seed complete.")
+    for table, n in writer.counts.items():
+        print(f"   • {table:<22} {n:>10,}")
+    print(f"   • {'rule_templates':<22} {n_rules:>10,}")
+
 
 if __name__ == "__main__":
-    seed()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Seed synthetic users + daily logs")
+    parser.add_argument("--users", type=int, default=1, help="number of users to create")
+    parser.add_argument("--days", type=int, default=3, help="days of history per user")
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows per INSERT batch")
+    parser.add_argument("--email-prefix", default="loadtest", help="emails become <prefix>+N@example.com")
+    parser.add_argument("--seed", type=int, default=42, help="RNG seed")
+    parser.add_argument("--no-predictions", action="store_true", help="skip recovery_predictions rows")
+    parser.add_argument("--reset", action="store_true", help="delete previously seeded users first")
+    parser.add_argument("--echo", action="store_true", help="echo SQL")
+    args = parser.parse_args()
+
+    seed(
+        users=args.users,
+        days=args.days,
+        batch_size=args.batch_size,
+        prefix=args.email_prefix,
+        seed_value=args.seed,
+        with_predictions=not args.no_predictions,
+        do_reset=args.reset,
+        echo=args.echo,
+    )